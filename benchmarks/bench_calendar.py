@@ -0,0 +1,105 @@
+"""
+Replays meeting extractions (several per email, some emails processed twice,
+some meetings clashing with the user's own events) against a fake Calendar
+service: one unchecked insert per meeting (the original behaviour) versus
+`create_calendar_events` with the synced local cache and batched inserts.
+
+Usage:
+    python benchmarks/bench_calendar.py [--emails 100] [--reprocess 0.3] [--latency 0.01]
+"""
+import argparse
+import datetime
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Measure round trips, not the Calendar quota the rate limiter would otherwise enforce
+os.environ.setdefault("RATE_CALENDAR", "1000000")
+
+from benchmarks.fake_calendar import FakeCalendarService
+from src.db import database
+from src.utils import calender_api
+
+TIMEZONE = "Asia/Kolkata"
+
+
+def synthetic_extractions(emails, reprocess):
+    base = datetime.date.today() + datetime.timedelta(days=7)
+    extractions = []
+    for index in range(emails):
+        meetings = []
+        for n in range(random.randint(1, 3)):
+            day = base + datetime.timedelta(days=random.randrange(20))
+            meetings.append({"title": f"Project sync {index}-{n}", "date": day.isoformat(),
+                             "time": f"{random.randrange(9, 18):02d}:00:00", "timezone": TIMEZONE})
+        extractions.append(meetings)
+        if random.random() < reprocess:
+            extractions.append([dict(m) for m in meetings])  # The same email handled again
+    return extractions
+
+
+def busy_calendar(service, count):
+    base = datetime.date.today() + datetime.timedelta(days=7)
+    for index in range(count):
+        day = base + datetime.timedelta(days=random.randrange(20))
+        service.add_busy(f"Focus block {index}", f"{day.isoformat()}T{random.randrange(9, 18):02d}:30:00")
+
+
+def original(service, meetings):
+    # The original create_calender_event: one insert per meeting, no checks
+    for details in meetings:
+        start = datetime.datetime.strptime(f"{details['date']} {details['time']}", "%Y-%m-%d %H:%M:%S")
+        end = start + datetime.timedelta(hours=1)
+        service.events().insert(calendarId="primary", body={
+            "summary": details["title"],
+            "start": {"dateTime": start.isoformat(), "timeZone": details["timezone"]},
+            "end": {"dateTime": end.isoformat(), "timeZone": details["timezone"]},
+            "extendedProperties": {"private": {}},
+        }).execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--reprocess", type=float, default=0.3, help="Share of emails processed a second time")
+    parser.add_argument("--busy", type=int, default=40, help="Events already in the calendar")
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    # Keep the per-meeting duplicate/overlap logs out of the table
+    logging.getLogger("src").setLevel(logging.ERROR)
+    random.seed(11)
+    extractions = synthetic_extractions(args.emails, args.reprocess)
+    meetings = sum(len(m) for m in extractions)
+    unique = len({(m["title"], m["date"], m["time"]) for e in extractions for m in e})
+    print(f"{len(extractions)} extraction(s), {meetings} meeting(s), {unique} distinct")
+
+    print(f"{'path':<12} {'inserted':>9} {'duplicates':>11} {'tentative':>10} {'round trips':>12} {'seconds':>8}")
+    for label in ("original", "synced"):
+        random.seed(5)
+        service = FakeCalendarService(latency=args.latency)
+        busy_calendar(service, args.busy)
+        database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+        database.init_db()
+
+        tentative = 0
+        start = time.perf_counter()
+        for extraction in extractions:
+            if label == "original":
+                original(service, extraction)
+            else:
+                calender_api.create_calendar_events(extraction, service=service)
+        elapsed = time.perf_counter() - start
+
+        created = [e for e in service.stored.values() if "extendedProperties" in e]
+        tentative = sum(1 for e in created if e.get("status") == "tentative")
+        print(f"{label:<12} {len(created):>9} {len(created) - unique:>11} {tentative:>10} "
+              f"{service.round_trips:>12} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
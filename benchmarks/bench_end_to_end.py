@@ -0,0 +1,216 @@
+"""
+Runs `process_and_respond_to_email` end to end over a synthetic mailbox, with
+every external service (Gmail, People, Calendar, OpenAI, Slack, Custom Search)
+replaced by a local fake with configurable latency and error rates, and
+reports emails/sec, p50/p99 per-email latency, API calls per email and peak
+memory. Nothing leaves the machine and no credentials are needed.
+
+Latencies default to realistic per-call means (see `service_profile`) scaled
+by --time-scale, so large mailboxes finish in minutes; the API quotas of the
+rate limiter are lifted unless --keep-quotas is given.
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--messages 10000] [--time-scale 0.01] [--seed 1]
+        [--latency openai=0.02] [--errors gmail=0.01] [--rate-limits openai=0.05] [--jitter 0.5]
+        [--tracemalloc] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+QUOTA_VARIABLES = ("RATE_GMAIL_UNITS", "RATE_CALENDAR", "RATE_PEOPLE", "RATE_SLACK", "RATE_SEARCH",
+                   "OPENAI_REQUESTS_PER_MINUTE", "OPENAI_TOKENS_PER_MINUTE")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10_000, help="Size of the synthetic mailbox (10k-1M)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Multiplier on the default service latencies")
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SECONDS",
+                        help="Mean latency of one service (not scaled)")
+    parser.add_argument("--errors", action="append", default=[], metavar="SERVICE=RATE",
+                        help="Share of calls failing with a 5xx")
+    parser.add_argument("--rate-limits", action="append", default=[], metavar="SERVICE=RATE",
+                        help="Share of calls answered with a 429")
+    parser.add_argument("--jitter", type=float, help="Sigma of the log-normal latency of every service (default 0.5)")
+    parser.add_argument("--keep-quotas", action="store_true", help="Keep the real per-service rate limits")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python heap peak (slower)")
+    parser.add_argument("--json", help="Write the results, with the metrics run report, to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's INFO logs")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    # Read at import time by the modules below, so set before importing them
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["FULL_SYNC_LIMIT"] = str(args.messages)
+    os.environ.setdefault("SLACK_CHANNEL_ID", "C-BENCH")
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ.setdefault("SEARCH_ENGINE_ID", "bench")
+    if not args.keep_quotas:
+        for name in QUOTA_VARIABLES:
+            os.environ.setdefault(name, "1e9")
+
+
+_MEETING_RE = re.compile(r"meet on (\d{4}-\d{2}-\d{2}) at (\d{1,2}):00")
+
+
+def fake_analysis(prompt):
+    """
+    A plausible analysis of the prompt's email, so urgent alerts, meetings and auto-replies all get exercised.
+    """
+    lowered = prompt.lower()
+    meetings = [{"title": "Meeting", "date": date, "time": f"{int(hour):02d}:00:00", "timezone": "Asia/Kolkata"}
+                for date, hour in _MEETING_RE.findall(prompt)[:1]]
+    return {
+        "reply": "Dear Sender,\n\nThank you for your email. I will look into it and get back to you shortly.\n\n"
+                 "Best Regards,\nYour Name",
+        "summary": "The sender asks for a follow-up.",
+        "urgency": "high" if "urgent" in lowered or "asap" in lowered else "normal",
+        "category": "simple" if "confirmation" in lowered else "complex",
+        "meetings": meetings,
+    }
+
+
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+
+    from benchmarks.fake_calendar import FakeCalendarService
+    from benchmarks.fake_clients import FakeSlackClient, FakeSearchSession
+    from benchmarks.fake_openai import FakeOpenAI
+    from benchmarks.service_profile import build_profiles, parse_overrides
+    from benchmarks.synthetic_mailbox import SyntheticMailbox, FakeMailboxService, FakePeopleService
+    from src.authentication import gmail_auth
+    from src.db import database
+    from src.models import llm_service
+    from src.services import gmail_service
+    from src.utils import metrics, slack_notifier, web_search
+    from src.utils.log import configure_logging
+
+    if args.verbose:
+        configure_logging()
+    else:
+        # Injected failures are logged as warnings; keep them out of the report
+        logging.getLogger("src").setLevel(logging.CRITICAL)
+
+    profiles = build_profiles(args.time_scale, parse_overrides(args.latency, args.errors, args.rate_limits,
+                                                               args.jitter), seed=args.seed)
+    mailbox = SyntheticMailbox(args.messages, seed=args.seed)
+    fakes = {
+        "gmail": FakeMailboxService(mailbox, profiles["gmail"]),
+        "people": FakePeopleService(profile=profiles["people"]),
+        "calendar": FakeCalendarService(profile=profiles["calendar"]),
+    }
+    gmail_auth.set_service_factory(lambda name, version: fakes[name])
+    openai_client = llm_service.client = FakeOpenAI(profile=profiles["openai"], responder=fake_analysis)
+    slack_client = slack_notifier.client = FakeSlackClient(profiles["slack"])
+    search_session = web_search._session = FakeSearchSession(profiles["search"])
+
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.init_db()
+
+    latencies = array("d")
+    process_email = gmail_service.process_email
+
+    def timed_process_email(email, *a, **kw):
+        start = time.perf_counter()
+        try:
+            return process_email(email, *a, **kw)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    gmail_service.process_email = timed_process_email
+
+    if args.tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+    rss_before = peak_rss_mb()
+
+    print(f"Mailbox: {args.messages} message(s), seed {args.seed}, latencies x{args.time_scale}")
+    start = time.perf_counter()
+    gmail_service.process_and_respond_to_email(interactive=False)
+    elapsed = time.perf_counter() - start
+
+    processed = len(latencies)
+    ordered = sorted(latencies)
+    rss_peak = peak_rss_mb()
+    heap_peak = None
+    if args.tracemalloc:
+        heap_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    calls = {
+        "gmail": (sum(fakes["gmail"].requests.values()), fakes["gmail"].round_trips),
+        "people": (sum(fakes["people"].requests.values()), fakes["people"].round_trips),
+        "calendar": (fakes["calendar"].inserts, fakes["calendar"].round_trips),
+        "openai": (openai_client.totals()["calls"], openai_client.totals()["calls"]),
+        "slack": (slack_client.requests, slack_client.requests),
+        "search": (search_session.requests, search_session.requests),
+    }
+    results = {
+        "messages": args.messages,
+        "processed": processed,
+        "seconds": round(elapsed, 3),
+        "emails_per_second": round(processed / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {"p50": round(percentile(ordered, 0.50) * 1000, 3),
+                       "p99": round(percentile(ordered, 0.99) * 1000, 3),
+                       "max": round(ordered[-1] * 1000, 3) if ordered else 0.0},
+        "calls": {service: {"requests": requests, "round_trips": trips,
+                            "per_email": round(requests / processed, 4) if processed else 0.0}
+                  for service, (requests, trips) in calls.items()},
+        "gmail_requests": dict(fakes["gmail"].requests),
+        "injected_failures": {service: dict(profile.failures) for service, profile in profiles.items()},
+        "replies_sent": fakes["gmail"].sent,
+        "slack_messages": slack_client.messages,
+        "llm_tokens": openai_client.totals(),
+        "peak_rss_mb": round(rss_peak, 1),
+        "rss_growth_mb": round(rss_peak - rss_before, 1),
+        "python_heap_peak_mb": round(heap_peak, 1) if heap_peak is not None else None,
+    }
+
+    print(f"Processed {processed} email(s) in {elapsed:.2f}s: {results['emails_per_second']} emails/s")
+    print(f"Per-email latency: p50 {results['latency_ms']['p50']:.2f}ms, p99 {results['latency_ms']['p99']:.2f}ms, "
+          f"max {results['latency_ms']['max']:.2f}ms")
+    print(f"{'service':<10} {'requests':>10} {'round trips':>12} {'per email':>10} {'5xx':>6} {'429':>6}")
+    for service, entry in results["calls"].items():
+        failures = results["injected_failures"][service]
+        print(f"{service:<10} {entry['requests']:>10} {entry['round_trips']:>12} {entry['per_email']:>10.3f} "
+              f"{failures['error']:>6} {failures['rate_limited']:>6}")
+    memory = f"Peak RSS {results['peak_rss_mb']} MB (+{results['rss_growth_mb']} MB during the run)"
+    if heap_peak is not None:
+        memory += f", Python heap peak {results['python_heap_peak_mb']} MB"
+    print(memory)
+
+    if args.json:
+        results["metrics"] = metrics.run_report()
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
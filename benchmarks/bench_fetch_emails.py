@@ -0,0 +1,53 @@
+"""
+Compares the serial `fetch_emails` loop against `fetch_emails_batched` on a
+fake Gmail transport, for growing backlog sizes.
+
+Usage:
+    python benchmarks/bench_fetch_emails.py [--latency 0.01] [--batch-size 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Measure round trips, not the Gmail quota the rate limiter would otherwise enforce
+os.environ.setdefault("RATE_GMAIL_UNITS", "1000000")
+
+from benchmarks.fake_gmail import FakeGmailService
+from src.controllers.email_controller import fetch_emails, fetch_emails_batched
+
+
+def run(backlog, latency, batch_size):
+    service = FakeGmailService(backlog, latency=latency)
+    start = time.perf_counter()
+    serial = fetch_emails(max_results=backlog, service=service)
+    serial_time = time.perf_counter() - start
+    serial_trips = service.round_trips
+
+    service = FakeGmailService(backlog, latency=latency)
+    start = time.perf_counter()
+    batched = list(fetch_emails_batched(max_messages=backlog, batch_size=batch_size, service=service))
+    batched_time = time.perf_counter() - start
+    batched_trips = service.round_trips
+
+    assert [e["id"] for e in serial] == [e["id"] for e in batched]
+    return serial_time, serial_trips, batched_time, batched_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per simulated round-trip")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 250, 500])
+    args = parser.parse_args()
+
+    print(f"{'backlog':>8} {'serial s':>9} {'trips':>6} {'batched s':>10} {'trips':>6} {'speedup':>8}")
+    for backlog in args.sizes:
+        serial_time, serial_trips, batched_time, batched_trips = run(backlog, args.latency, args.batch_size)
+        print(f"{backlog:>8} {serial_time:>9.3f} {serial_trips:>6} {batched_time:>10.3f} {batched_trips:>6} "
+              f"{serial_time / batched_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Microbenchmark of keyword classification as rule sets grow: one whole-word
+regex search per keyword (same results as the matcher, every rule scored)
+against the compiled KeywordMatcher. The old raw substring checks, which
+stop at a rule's first hit and also match inside words, are timed for reference.
+
+Usage:
+    python benchmarks/bench_keyword_matcher.py [--bodies 10] [--body-kb 32]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.keyword_matcher import KeywordMatcher
+
+
+def random_word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+
+def make_rules(rng, keyword_count, rule_count=3):
+    rules, earlier = {}, []
+    for r in range(rule_count):
+        keywords = {}
+        while len(keywords) < keyword_count // rule_count:
+            if earlier and rng.random() < 0.2:
+                # Overlapping keywords: another rule's keyword with a word before or after it
+                word = random_word(rng)
+                phrase = rng.choice((f"{rng.choice(earlier)} {word}", f"{word} {rng.choice(earlier)}"))
+            else:
+                phrase = " ".join(random_word(rng) for _ in range(rng.choice((1, 1, 2))))
+            keywords[phrase] = rng.choice((1, 2))
+        earlier.extend(keywords)
+        rules[f"rule{r}"] = {"threshold": 1, "keywords": keywords}
+    return rules
+
+
+def make_corpus(rng, count, size_kb, vocabulary):
+    bodies = []
+    for _ in range(count):
+        words = []
+        length = 0
+        while length < size_kb * 1024:
+            # Mostly noise, with the occasional real keyword
+            word = rng.choice(vocabulary) if rng.random() < 0.0001 else random_word(rng)
+            words.append(word.capitalize() if rng.random() < 0.1 else word)
+            length += len(word) + 1
+        bodies.append(" ".join(words))
+    return bodies
+
+
+def naive_patterns(rules):
+    """
+    One whole-word pattern per keyword, {rule: [(pattern, weight), ...]}, compiled up front.
+    """
+    return {name: [(re.compile(r"\b" + r"\s+".join(map(re.escape, keyword.lower().split())) + r"\b"), weight)
+                   for keyword, weight in rule["keywords"].items()]
+            for name, rule in rules.items()}
+
+
+def substring_classify(rules, body):
+    # The original approach: one lowercase + substring scan per keyword, first hit wins
+    matched = set()
+    for name, rule in rules.items():
+        for keyword in rule["keywords"]:
+            if keyword.lower() in body.lower():
+                matched.add(name)
+                break
+    return matched
+
+
+def naive_scores(patterns, body):
+    # The per-keyword approach with the matcher's semantics: whole words, every keyword of every rule scored
+    text = body.lower()
+    return {name: sum(weight for pattern, weight in keywords if pattern.search(text))
+            for name, keywords in patterns.items()}
+
+
+def naive_classify(rules, patterns, body):
+    scores = naive_scores(patterns, body)
+    return {name for name, score in scores.items() if score >= rules[name].get("threshold", 1)}
+
+
+def best_ms_per_body(classify, bodies, repeat):
+    # Best of `repeat` runs, to keep scheduler noise out of the comparison
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            classify(body)
+        best = min(best, time.perf_counter() - start)
+    return best / len(bodies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bodies", type=int, default=10)
+    parser.add_argument("--body-kb", type=int, default=32)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[15, 60, 150, 300, 600, 1200, 2400])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'keywords':>9} {'substring ms/body':>18} {'per-keyword ms/body':>20} {'matcher ms/body':>16} "
+          f"{'vs substring':>13} {'vs per-keyword':>15}")
+    for size in args.sizes:
+        rules = make_rules(rng, size)
+        vocabulary = [k for rule in rules.values() for k in rule["keywords"]]
+        bodies = make_corpus(rng, args.bodies, args.body_kb, vocabulary)
+        matcher = KeywordMatcher(rules)
+        patterns = naive_patterns(rules)
+        # Each keyword alone (overlapping ones contain another rule's keyword), then all of them run together
+        checks = bodies + vocabulary + [" ".join(rng.sample(vocabulary, len(vocabulary)))]
+        assert all(naive_scores(patterns, text) == matcher.scores(text) for text in checks), \
+            "the two classifiers disagree"
+
+        substring = best_ms_per_body(lambda body: substring_classify(rules, body), bodies, args.repeat)
+        naive = best_ms_per_body(lambda body: naive_classify(rules, patterns, body), bodies, args.repeat)
+        compiled = best_ms_per_body(matcher.classify, bodies, args.repeat)
+
+        print(f"{size:>9} {substring:>18.2f} {naive:>20.2f} {compiled:>16.2f} "
+              f"{substring / compiled:>12.1f}x {naive / compiled:>14.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares the old two-request LLM path (separate reply and meeting-extraction
+prompts) with the single structured `analyze_email` call, on a stubbed OpenAI client.
+
+Usage:
+    python benchmarks/bench_llm_calls.py [--emails 20] [--latency-per-token 0.0005]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Measure the LLM calls, not the OpenAI quota the rate limiter would otherwise enforce
+os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("OPENAI_TOKENS_PER_MINUTE", "1000000000")
+
+from benchmarks.fake_openai import FakeOpenAI
+from src.models import llm_service
+
+# The prompts the pipeline used to send, one request each, before analyze_email
+LEGACY_REPLY_SYSTEM = "You are an AI assistant that summarizes emails and generates professional replies."
+LEGACY_MEETING_PROMPT = """
+    Extract structured meeting details from the following email and in timezone field write Asia/Kolkata:
+
+    "{email_text}"
+
+    Output as JSON:
+    {{
+      "title": "<Meeting Title>",
+      "date": "YYYY-MM-DD",
+      "time": "HH:MM:SS",
+      "timezone": "<TimeZone>"
+    }}
+    """
+
+
+def legacy_two_calls(client, body):
+    client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": LEGACY_REPLY_SYSTEM},
+            {"role": "user", "content": f"Summarize this email and generate a polite reply:\n\n{body}"},
+        ],
+        max_tokens=300,
+    )
+    client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are an AI that extracts structured meeting data."},
+            {"role": "user", "content": LEGACY_MEETING_PROMPT.format(email_text=body)},
+        ],
+    )
+
+
+def synthetic_body(index, paragraphs):
+    paragraph = ("Following up on last week's discussion, I have attached the revised plan and budget. "
+                 "Could we meet on Tuesday at 10am to go through the open items before the deadline? ")
+    return f"Hi,\n\n{paragraph * paragraphs}\n\nRegards,\nSender {index}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=8, help="size of each synthetic body")
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--latency-per-token", type=float, default=0.0005)
+    args = parser.parse_args()
+
+    bodies = [synthetic_body(i, args.paragraphs) for i in range(args.emails)]
+
+    legacy = FakeOpenAI(args.base_latency, args.latency_per_token)
+    start = time.perf_counter()
+    for body in bodies:
+        legacy_two_calls(legacy, body)
+    legacy_time = time.perf_counter() - start
+
+    merged = FakeOpenAI(args.base_latency, args.latency_per_token)
+    llm_service.client = merged
+    llm_service.LLM_CACHE_ENABLED = False  # measure the API path, not the response cache
+    start = time.perf_counter()
+    for body in bodies:
+        llm_service.analyze_email(body)
+    merged_time = time.perf_counter() - start
+
+    print(f"{'path':<12} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} {'seconds':>8}")
+    for name, client, elapsed in (("two calls", legacy, legacy_time), ("one call", merged, merged_time)):
+        totals = client.totals()
+        print(f"{name:<12} {totals['calls']:>6} {totals['prompt_tokens']:>11} {totals['completion_tokens']:>10} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
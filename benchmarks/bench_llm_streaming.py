@@ -0,0 +1,77 @@
+"""
+Runs `analyze_email` through the real `openai` client against the local fake
+OpenAI-compatible server, and reports how soon the streamed reply text shows
+up, and how retries and the fallback model behave under a deadline.
+
+Usage:
+    python benchmarks/bench_llm_streaming.py [--token-delay 0.03] [--deadline 3]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import openai
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# llm_service builds its client at import time and needs some key to do so
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from src.models import llm_service
+
+EMAIL = "Hi,\n\nCould we meet on Tuesday at 10am to review the project plan?\n\nRegards,\nSender"
+
+
+def run_scenario(name, server, streaming, deadline):
+    llm_service.client = openai.OpenAI(base_url=server.url, api_key="test")
+    llm_service.LLM_DEADLINE = deadline
+    first_text = []
+    start = time.perf_counter()
+
+    def on_reply_text(text):
+        if text and not first_text:
+            first_text.append(time.perf_counter() - start)
+
+    try:
+        analysis = llm_service.analyze_email(EMAIL, on_reply_text=on_reply_text if streaming else None)
+        outcome = "ok" if analysis["summary"] != "Summary not available" else "invalid"
+    except Exception as e:
+        outcome = type(e).__name__
+    total = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    models = ",".join(request["model"] for request in server.requests)
+    first = f"{first_text[0]:.2f}s" if first_text else "-"
+    print(f"{name:<34} {first:>11} {total:>8.2f}s {len(server.requests):>9}  {outcome:<8} {models}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    args = parser.parse_args()
+
+    # Every scenario must reach the fake server
+    llm_service.LLM_CACHE_ENABLED = False
+    # The retries and fallbacks show up in the table; keep their log lines out of it
+    logging.getLogger("src").setLevel(logging.ERROR)
+    delays = {"first_token_delay": args.first_token_delay, "token_delay": args.token_delay}
+
+    print(f"{'scenario':<34} {'first text':>11} {'total':>9} {'requests':>9}  {'outcome':<8} models")
+    run_scenario("blocking", FakeOpenAIServer(**delays).start(), False, args.deadline)
+    run_scenario("streaming", FakeOpenAIServer(**delays).start(), True, args.deadline)
+    run_scenario("streaming, 2x 429 then ok", FakeOpenAIServer(fail_first=2, fail_status=429, **delays).start(),
+                 True, args.deadline)
+    run_scenario("streaming, 5xx on every attempt", FakeOpenAIServer(fail_first=100, fail_status=503, **delays).start(),
+                 True, args.deadline)
+    run_scenario("streaming, primary model stalls",
+                 FakeOpenAIServer(slow_models=[llm_service.ANALYSIS_MODEL], slow_delay=args.deadline * 2, **delays).start(),
+                 True, args.deadline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares fetching every new message in full against the two-phase fetch
+(headers first, full bodies only for what triage can't skip on headers) over a
+synthetic mailbox of mostly bulk mail, and checks both give every email the
+same triage route.
+
+Reports messages and bytes downloaded, body decoding time and round trips,
+plus an estimated network time from --latency and --bandwidth.
+
+Usage:
+    python benchmarks/bench_metadata_fetch.py [--messages 5000] [--bulk-share 0.8] [--bulk-html-kib 40]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Measure transfer and decoding, not the Gmail quota the rate limiter would otherwise enforce
+os.environ.setdefault("RATE_GMAIL_UNITS", "1000000")
+
+from benchmarks.synthetic_mailbox import MESSAGE_MIX, FakeMailboxService, SyntheticMailbox
+from src.controllers.email_controller import fetch_emails_by_ids, get_fetch_stats
+from src.services.triage import triage_email, needs_full_body, get_triage_stats
+from src.utils.keyword_matcher import get_matcher
+
+BULK_KINDS = ("newsletter", "notification")
+
+
+def bulk_heavy_mix(bulk_share):
+    """
+    MESSAGE_MIX reweighted so newsletters and notifications make up `bulk_share` of the mailbox.
+    """
+    bulk = sum(weight for kind, weight in MESSAGE_MIX if kind in BULK_KINDS)
+    other = sum(weight for kind, weight in MESSAGE_MIX if kind not in BULK_KINDS)
+    return tuple((kind, weight * bulk_share / bulk if kind in BULK_KINDS else weight * (1 - bulk_share) / other)
+                 for kind, weight in MESSAGE_MIX)
+
+
+def run(mailbox, batch_size, needs_body):
+    service = FakeMailboxService(mailbox)
+    ids = [mailbox.message_id(mailbox.size - 1 - n) for n in range(mailbox.size)]
+    get_fetch_stats(reset=True)
+    start = time.perf_counter()
+    emails = list(fetch_emails_by_ids(service, ids, batch_size=batch_size, needs_body=needs_body))
+    seconds = time.perf_counter() - start
+    return emails, get_fetch_stats(reset=True), service.round_trips, seconds
+
+
+def routes(emails):
+    matcher = get_matcher()
+    result = {email["id"]: triage_email(email, matcher.classify(email["body"], email["subject"]))
+              for email in emails}
+    get_triage_stats(reset=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--bulk-share", type=float, default=0.8, help="share of newsletters and notifications")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--bulk-html-kib", type=float, default=40, help="size of the HTML of bulk messages")
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per batch round trip")
+    parser.add_argument("--bandwidth", type=float, default=20, help="Mbit/s for the transfer time estimate")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    mailbox = SyntheticMailbox(args.messages, seed=args.seed, mix=bulk_heavy_mix(args.bulk_share),
+                               bulk_html_kib=args.bulk_html_kib)
+    bulk = sum(mailbox.kind(i) in BULK_KINDS for i in range(mailbox.size))
+    print(f"Mailbox: {mailbox.size} message(s), {bulk / mailbox.size:.0%} bulk")
+
+    full_emails, full, full_trips, full_seconds = run(mailbox, args.batch_size, None)
+    two_emails, two, two_trips, two_seconds = run(mailbox, args.batch_size, needs_full_body)
+
+    full_routes, two_routes = routes(full_emails), routes(two_emails)
+    assert full_routes == two_routes, "the two-phase fetch changed a triage route"
+    by_id = {email["id"]: email for email in full_emails}
+    assert all(email["body"] == by_id[email["id"]]["body"] for email in two_emails if not email.get("partial"))
+    skipped = sum(route == "skip" for route, _ in two_routes.values())
+
+    print(f"Same triage route for all {len(two_routes)} email(s); {skipped} skipped, "
+          f"{two['full']} needed their body")
+    print(f"{'fetch':<12} {'metadata':>9} {'full':>7} {'KiB':>10} {'decode ms':>10} {'round trips':>12} "
+          f"{'est. network s':>15} {'wall s':>8}")
+    for name, stats, trips, seconds in (("full only", full, full_trips, full_seconds),
+                                        ("two-phase", two, two_trips, two_seconds)):
+        size = stats["metadata_bytes"] + stats["full_bytes"]
+        network = trips * args.latency + size * 8 / (args.bandwidth * 1e6)
+        print(f"{name:<12} {stats['metadata']:>9} {stats['full']:>7} {size / 1024:>10.1f} "
+              f"{stats['decode_seconds'] * 1000:>10.1f} {trips:>12} {network:>15.2f} {seconds:>8.2f}")
+    full_size = full["metadata_bytes"] + full["full_bytes"]
+    two_size = two["metadata_bytes"] + two["full_bytes"]
+    print(f"Bytes: -{1 - two_size / full_size:.0%}, body decoding: "
+          f"-{1 - two['decode_seconds'] / full['decode_seconds']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Drives a simulated quota-enforcing API from many threads, once with no
+coordination (retry on 429 after a short sleep) and once through the shared
+token-bucket limiter, and reports throughput, 429s and per-lane wait times
+(a call that never got through counts with the whole time it waited).
+
+Usage:
+    python benchmarks/bench_rate_limiter.py [--quota 20] [--threads 16] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.rate_limiter import TokenBucket, URGENT, NORMAL, RATE_HEADROOM
+
+
+class QuotaError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.retry_after = retry_after
+
+
+class FakeQuotaApi:
+    """
+    Accepts at most `quota` calls in any sliding one-second window and answers the rest with 429.
+    """
+
+    def __init__(self, quota, latency=0.01):
+        self.quota = quota
+        self.latency = latency
+        self.window = deque()
+        self.lock = threading.Lock()
+        self.ok = 0
+        self.rejected = 0
+
+    def call(self):
+        time.sleep(self.latency)
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] >= 1.0:
+                self.window.popleft()
+            if len(self.window) >= self.quota:
+                self.rejected += 1
+                raise QuotaError(retry_after=1.0 - (now - self.window[0]))
+            self.window.append(now)
+            self.ok += 1
+
+
+def run(api, seconds, threads, bucket=None):
+    if bucket is not None:
+        # Start empty: the opening burst would serve every lane at once and hide the queueing
+        bucket.acquire(bucket.capacity)
+    stop = time.monotonic() + seconds
+    waits = {URGENT: [], NORMAL: []}
+
+    def worker(index):
+        priority = URGENT if index % 8 == 0 else NORMAL
+        while time.monotonic() < stop:
+            start = time.monotonic()
+            while time.monotonic() < stop:
+                if bucket is not None and not bucket.acquire(1, priority, timeout=stop - time.monotonic()):
+                    # A starved caller waited the whole timeout; leaving it out would flatter its lane
+                    waits[priority].append(time.monotonic() - start)
+                    return
+                try:
+                    api.call()
+                except QuotaError as e:
+                    if bucket is not None:
+                        bucket.throttle(e.retry_after)
+                    else:
+                        time.sleep(0.05)
+                    continue
+                if bucket is not None:
+                    bucket.record_success()
+                waits[priority].append(time.monotonic() - start)
+                break
+            else:
+                waits[priority].append(time.monotonic() - start)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return waits
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quota", type=int, default=20, help="Calls per second the fake API allows")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<14} {'ok/s':>7} {'429s':>6} {'urgent p50':>11} {'normal p50':>11} {'normal p99':>11}")
+    for mode in ("uncoordinated", "token bucket"):
+        api = FakeQuotaApi(args.quota)
+        rate = args.quota * RATE_HEADROOM
+        bucket = TokenBucket("bench", rate, max(1.0, rate)) if mode == "token bucket" else None
+        waits = run(api, args.seconds, args.threads, bucket)
+        print(f"{mode:<14} {api.ok / args.seconds:>7.1f} {api.rejected:>6} "
+              f"{percentile(waits[URGENT], 0.5):>10.3f}s {percentile(waits[NORMAL], 0.5):>10.3f}s "
+              f"{percentile(waits[NORMAL], 0.99):>10.3f}s")
+        if bucket is not None:
+            assert percentile(waits[URGENT], 0.5) < percentile(waits[NORMAL], 0.5), \
+                "urgent callers should wait less than normal ones"
+
+
+if __name__ == "__main__":
+    main()
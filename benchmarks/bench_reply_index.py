@@ -0,0 +1,153 @@
+"""
+Benchmark of near-duplicate reply reuse: how often templated emails find the
+reply sent to an earlier variant (and unrelated ones don't), and how long a
+lookup takes once hundreds of thousands of answered emails are indexed,
+against scanning every stored email.
+
+Usage:
+    python benchmarks/bench_reply_index.py [--entries 300000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.db import database
+from src.services import reply_index
+from src.services.reply_index import BANDS, band_keys, jaccard, normalize_tokens, shingle_hashes
+
+FIRST_NAMES = ["Alice", "Bob", "Chen", "Dana", "Emeka", "Farah", "Goran", "Hana", "Ivan", "Jun"]
+PRODUCTS = ["standing desk", "monitor arm", "office chair", "keyboard", "webcam", "headset"]
+
+# The kind of mail that keeps arriving almost verbatim
+TEMPLATES = {
+    "order": ("Hello, I placed order #{number} for a {product} on {day} March and it has not shipped yet. "
+              "The tracking page still says the label was created. Could you tell me when it will be "
+              "dispatched and whether I can still change the delivery address? Thanks, {name}"),
+    "recruiter": ("Hi there, my name is {name} and I'm a technical recruiter. I came across your profile and "
+                  "think you'd be a great fit for a senior backend role at a fast growing fintech company, "
+                  "fully remote, up to {number}k. Would you be open to a quick chat this week?"),
+    "invoice": ("Dear team, please find attached invoice {number} for the {product} delivered on {day} March. "
+                "Payment is due within thirty days. Let us know if the purchase order number is missing "
+                "or if anything on the invoice needs correcting. Regards, {name}"),
+    "support": ("Hi, since the last update the {product} disconnects every few minutes and I have to "
+                "restart it. I already tried another cable and reinstalling the driver. Is this a known "
+                "issue and is there a fix planned? My serial number is {number}. {name}"),
+}
+
+
+def render(rng, template):
+    return template.format(number=rng.randint(10000, 99999), product=rng.choice(PRODUCTS),
+                           day=rng.randint(1, 28), name=rng.choice(FIRST_NAMES))
+
+
+def random_body(rng, words=60):
+    return " ".join("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+                    for _ in range(words))
+
+
+def fill_index(rng, entries):
+    """
+    Inserts `entries` answered emails with random shingles straight into SQLite
+    (fingerprinting that many generated bodies would dominate the run).
+    """
+    conn = database.get_connection()
+    batch = 10_000
+    for start in range(0, entries, batch):
+        count = min(batch, entries - start)
+        with conn:
+            conn.executemany(
+                "INSERT INTO reply_index (id, message_id, shingles, reply, urgency, category, created_at) "
+                "VALUES (?, ?, ?, 'Thank you.', 'normal', 'complex', 0)",
+                ((start + i + 1, f"m{start + i}", array("I", sorted(rng.getrandbits(32) for _ in range(50))).tobytes())
+                 for i in range(count)))
+            conn.executemany(
+                "INSERT OR IGNORE INTO reply_index_bands (band_key, reply_id) VALUES (?, ?)",
+                ((rng.getrandbits(64) - (1 << 63), start + i + 1) for i in range(count) for _ in range(BANDS)))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def percentiles_us(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2] * 1e6, ordered[int(len(ordered) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    start = time.perf_counter()
+    fill_index(rng, args.entries)
+    print(f"Indexed {args.entries} answered emails in {time.perf_counter() - start:.1f}s")
+
+    # One answered email per template, then a stream of new variants and unrelated emails
+    for name, template in TEMPLATES.items():
+        reply_index.remember_reply({"id": name, "subject": "Question", "body": render(rng, template)},
+                                   f"Reply to the {name} email")
+
+    fingerprinting, lookups = [], []
+    reused = wrong = false_positives = 0
+    for i in range(args.queries):
+        template_name = rng.choice(list(TEMPLATES))
+        templated = i % 2 == 0
+        body = render(rng, TEMPLATES[template_name]) if templated else random_body(rng)
+
+        hashes, seconds = timed(lambda: shingle_hashes(normalize_tokens(body)))
+        keys, more = timed(band_keys, hashes)
+        fingerprinting.append(seconds + more)
+
+        def lookup():
+            best = None
+            for candidate in database.find_reply_candidates(keys, reply_index.MAX_CANDIDATES):
+                similarity = jaccard(hashes, array("I", candidate["shingles"]))
+                if similarity >= reply_index.REPLY_REUSE_MIN_SIMILARITY and (best is None or similarity > best[0]):
+                    best = (similarity, candidate["message_id"])
+            return best
+
+        best, seconds = timed(lookup)
+        lookups.append(seconds)
+        if templated:
+            reused += best is not None and best[1] == template_name
+            wrong += best is not None and best[1] != template_name
+        else:
+            false_positives += best is not None
+
+    templated_queries = (args.queries + 1) // 2
+    print(f"Templated emails reusing their template's reply: {reused / templated_queries:.1%} "
+          f"(wrong reply {wrong / templated_queries:.1%}), unrelated emails matched: "
+          f"{false_positives / (args.queries - templated_queries):.1%}")
+
+    # What the index saves: comparing against every stored email
+    conn = database.get_connection()
+    scans = []
+    for _ in range(5):
+        hashes = shingle_hashes(normalize_tokens(render(rng, TEMPLATES["order"])))
+        start = time.perf_counter()
+        for (shingles,) in conn.execute("SELECT shingles FROM reply_index"):
+            jaccard(hashes, array("I", shingles))
+        scans.append(time.perf_counter() - start)
+
+    print(f"{'per email':<22} {'p50 us':>10} {'p99 us':>10}")
+    for name, samples in (("fingerprint (MinHash)", fingerprinting), ("index lookup", lookups),
+                          ("full scan", scans)):
+        p50, p99 = percentiles_us(samples)
+        print(f"{name:<22} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
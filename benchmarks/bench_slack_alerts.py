@@ -0,0 +1,97 @@
+"""
+Replays a burst of urgent emails against the local Slack stub: one
+`chat.postMessage` per email (the original behaviour) versus the digest
+aggregator, and reports messages posted, 429s, and how long the processing
+loop was blocked.
+
+Usage:
+    python benchmarks/bench_slack_alerts.py [--alerts 30] [--threads 8] [--window 2]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.fake_slack_server import FakeSlackServer
+from src.utils import slack_notifier
+from src.utils.slack_notifier import SlackAlertAggregator, build_digest
+
+
+def synthetic_alerts(count, threads):
+    alerts = []
+    for index in range(count):
+        thread = random.randrange(threads)
+        alerts.append({
+            "subject": f"URGENT: production incident #{thread}",
+            "sender": f"oncall{thread % 3}@example.com",
+            "body": f"Service degraded, update {index}. Please respond ASAP.",
+            "thread_id": f"thread-{thread}",
+        })
+    return alerts
+
+
+def send_with_retry(send, *args):
+    # What the outbound queue does for a rate-limited alert, minus the jitter
+    while True:
+        try:
+            return send(*args)
+        except SlackApiError as e:
+            if e.response.status_code != 429:
+                raise
+            time.sleep(float(e.response.headers.get("Retry-After", 1)))
+
+
+def per_email(alerts):
+    start = time.perf_counter()
+    for alert in alerts:
+        send_with_retry(slack_notifier.send_slack_notification, alert["subject"], alert["sender"], alert["body"])
+    return time.perf_counter() - start, 0.0
+
+
+def digest(alerts, window):
+    def on_flush(collected):
+        text, blocks = build_digest(collected, window)
+        send_with_retry(slack_notifier.send_slack_digest, text, blocks)
+
+    aggregator = SlackAlertAggregator(on_flush, window=window).start()
+    start = time.perf_counter()
+    for alert in alerts:
+        aggregator.add(alert)
+        time.sleep(0.02)  # Alerts arrive over the burst rather than all at once
+    blocked = time.perf_counter() - start - 0.02 * len(alerts)
+    aggregator.stop()
+    return blocked, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=8, help="Distinct conversations the alerts belong to")
+    parser.add_argument("--window", type=float, default=2.0)
+    args = parser.parse_args()
+
+    random.seed(3)
+    alerts = synthetic_alerts(args.alerts, args.threads)
+    slack_notifier.SLACK_CHANNEL_ID = "C-ALERTS"
+
+    print(f"{'path':<10} {'messages':>9} {'429s':>6} {'loop blocked':>13} {'all sent':>9}")
+    for label in ("per email", "digest"):
+        server = FakeSlackServer().start()
+        slack_notifier.client = WebClient(token="xoxb-test", base_url=server.url)
+        if label == "per email":
+            blocked, _ = per_email(alerts)
+            done = blocked
+        else:
+            blocked, done = digest(alerts, args.window)
+        server.shutdown()
+        print(f"{label:<10} {len(server.messages):>9} {server.rate_limited:>6} {blocked:>12.2f}s {done:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Measures the cold start of cron-style `main.py` runs in fresh interpreters:
+the app's imports, what the lazily imported client libraries would add, and
+building the Gmail, Calendar and People clients from the discovery store
+against `googleapiclient.discovery.build`.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Libraries `main.py` used to import up front and now imports on first use
+LAZY_LIBRARIES = ["openai", "slack_sdk", "requests", "googleapiclient.discovery", "google_auth_oauthlib.flow",
+                  "google_auth_httplib2", "google.auth.transport.requests"]
+
+APIS = [("gmail", "v1"), ("calendar", "v3"), ("people", "v1")]
+
+# Runs in the child: builds every client the way `get_service` does (minus credentials), then with `build`
+BUILD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+import httplib2
+from googleapiclient.discovery import build, build_from_document
+from src.authentication.gmail_auth import discovery_document
+apis = {apis!r}
+start = time.perf_counter()
+for name, version in apis:
+    build_from_document(discovery_document(name, version), http=httplib2.Http())
+store = time.perf_counter() - start
+start = time.perf_counter()
+for name, version in apis:
+    build(name, version, http=httplib2.Http(), cache_discovery=False)
+print(store, time.perf_counter() - start)
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    # The app reads its settings at import; these keep it from needing real ones
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def wall_time(command, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def top_imports(count):
+    """
+    The slowest top-level imports of `main.py --help` (cumulative, from `python -X importtime`).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "main.py", "--help"], cwd=ROOT, env=child_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def installed(module):
+    check = subprocess.run([sys.executable, "-c", f"import {module}"], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    return check.returncode == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    libraries = [name for name in LAZY_LIBRARIES if installed(name)]
+    rows = [
+        ("python -c pass", wall_time([sys.executable, "-c", "pass"], args.runs)),
+        ("main.py --help", wall_time([sys.executable, "main.py", "--help"], args.runs)),
+    ]
+    if libraries:
+        # What every run paid before the clients were built lazily
+        eager = "import runpy, sys; import " + ", ".join(libraries) + \
+                "; sys.argv = ['main.py', '--help']; runpy.run_path('main.py', run_name='__main__')"
+        rows.append(("main.py --help, eager", wall_time([sys.executable, "-c", eager], args.runs)))
+
+    print(f"{'cold start':<24} {'median ms':>10} {'min ms':>10}")
+    for name, samples in rows:
+        print(f"{name:<24} {statistics.median(samples) * 1e3:>10.1f} {min(samples) * 1e3:>10.1f}")
+    if libraries:
+        print(f"(eager adds: {', '.join(libraries)})")
+
+    print("\nSlowest imports of main.py --help:")
+    for milliseconds, name in top_imports(args.top):
+        print(f"  {milliseconds:>8.1f} ms  {name}")
+
+    if not installed("googleapiclient.discovery"):
+        print("\ngoogle-api-python-client is not installed; skipping the client build comparison")
+        return
+    script = BUILD_SCRIPT.format(root=ROOT, apis=APIS)
+    store, build = [], []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=child_env(), capture_output=True,
+                                text=True, check=True).stdout.split()
+        store.append(float(output[0]))
+        build.append(float(output[1]))
+    apis = ", ".join(f"{name} {version}" for name, version in APIS)
+    print(f"\nBuilding the {apis} clients in a fresh process (median ms):")
+    print(f"  discovery store + build_from_document  {statistics.median(store) * 1e3:>8.1f}")
+    print(f"  googleapiclient build()                {statistics.median(build) * 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
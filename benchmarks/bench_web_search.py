@@ -0,0 +1,156 @@
+"""
+Compares the original web search (whole body as the query, a new connection
+per call, no timeout, no cache) with `search_web(extract_search_query(body))`
+on a local fake Custom Search server, over emails that repeat a few questions.
+
+Usage:
+    python benchmarks/bench_web_search.py [--emails 200] [--questions 20] [--latency 0.05] [--stall-every 50]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# Measure the cache and connection reuse, not the Custom Search quota
+os.environ.setdefault("RATE_SEARCH", "1000000")
+os.environ.setdefault("SEARCH_TIMEOUT", "1")
+
+from src.db import database
+from src.utils import web_search
+
+QUESTIONS = [
+    "what is the latest stable release of Python",
+    "how to rotate OAuth refresh tokens for Gmail",
+    "what is the current GST rate on software services in India",
+    "how to export a Google Calendar to ICS",
+    "explain the difference between SPF and DKIM",
+]
+
+
+class FakeSearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, stall_every, stall):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.stall_every = stall_every
+        self.stall = stall
+        self.requests = 0
+        self.query_lengths = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/customsearch/v1"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms
+    # to every response on a kept-alive connection, which no real search endpoint does
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        with server.lock:
+            server.requests += 1
+            stalled = server.stall_every and server.requests % server.stall_every == 0
+            server.query_lengths.append(len(query))
+        time.sleep(server.stall if stalled else server.latency)
+
+        payload = json.dumps({"items": [
+            {"title": f"Result {i}", "snippet": f"Snippet {i} about {query[:40]}", "link": f"https://example.com/{i}"}
+            for i in range(3)
+        ]}).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def synthetic_emails(count, questions):
+    # `questions` distinct questions, each asked by several emails in random order
+    variants = [QUESTIONS[i % len(QUESTIONS)] + (f" in {2020 + i // len(QUESTIONS)}" if i >= len(QUESTIONS) else "")
+                for i in range(questions)]
+    emails = []
+    for index in range(count):
+        question = random.choice(variants)
+        emails.append(f"Hi team,\n\nHope all is well. Quick one: {question}?\n\n"
+                      f"We need this for the rollout planned next week, so any pointers help.\n\nThanks,\nSender {index}")
+    return emails
+
+
+def legacy_search(url, body):
+    # The original call: whole body in an unencoded URL, a fresh connection, no timeout
+    response = requests.get(f"{url}?q={body}&key=x&cx=y").json()
+    return response["items"][0]["snippet"] if "items" in response else "No results found."
+
+
+def run(label, emails, search):
+    latencies = []
+    start = time.perf_counter()
+    for body in emails:
+        call_start = time.perf_counter()
+        search(body)
+        latencies.append(time.perf_counter() - call_start)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return label, total, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=20, help="Distinct questions across the emails")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--stall-every", type=int, default=50, help="Every Nth request hangs for --stall seconds")
+    parser.add_argument("--stall", type=float, default=4.0)
+    args = parser.parse_args()
+
+    random.seed(7)
+    emails = synthetic_emails(args.emails, args.questions)
+    database.DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.init_db()
+
+    totals = {}
+    print(f"{'path':<10} {'requests':>9} {'avg query':>10} {'total':>8} {'p50':>8} {'p99':>8} {'max':>8}")
+    for label in ("original", "cached"):
+        server = FakeSearchServer(args.latency, args.stall_every, args.stall)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        if label == "original":
+            result = run(label, emails, lambda body: legacy_search(server.url, body))
+        else:
+            web_search.SEARCH_URL = server.url
+            web_search._get_session().mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+            result = run(label, emails, lambda body: web_search.search_web(web_search.extract_search_query(body)))
+        server.shutdown()
+
+        name, total, p50, p99, worst = result
+        totals[name] = total
+        average_query = sum(server.query_lengths) / max(1, len(server.query_lengths))
+        print(f"{name:<10} {server.requests:>9} {average_query:>9.0f}c {total:>7.2f}s {p50 * 1000:>6.1f}ms "
+              f"{p99 * 1000:>6.1f}ms {worst:>7.2f}s")
+
+    print(f"Search cache: {web_search.get_search_stats()}")
+    assert totals["cached"] < totals["original"], "the cached path is slower end to end"
+
+
+if __name__ == "__main__":
+    main()
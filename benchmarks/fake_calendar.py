@@ -0,0 +1,104 @@
+"""
+A local, in-memory stand-in for the Calendar API service object returned by
+`googleapiclient.discovery.build("calendar", "v3", ...)`.
+
+It supports `events().list` with incremental `syncToken`s, `events().insert`
+and batch requests, and counts round-trips like `fake_gmail`.
+"""
+import datetime
+import itertools
+import time
+from zoneinfo import ZoneInfo
+
+from benchmarks.fake_gmail import FakeRequest, FakeBatch
+
+
+class FakeEvents:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def list(self, calendarId, syncToken=None, pageToken=None, maxResults=250, **kwargs):
+        def handler():
+            since = int(syncToken or 0)
+            changed = [e for e in self.transport.stored.values() if e["_version"] > since]
+            changed.sort(key=lambda e: e["_version"])
+            start = int(pageToken or 0)
+            page = changed[start:start + maxResults]
+            result = {"items": [{k: v for k, v in e.items() if not k.startswith("_")} for e in page]}
+            if start + maxResults < len(changed):
+                result["nextPageToken"] = str(start + maxResults)
+            else:
+                result["nextSyncToken"] = str(self.transport.version)
+            return result
+        return FakeRequest(self.transport, handler)
+
+    def insert(self, calendarId, body):
+        def handler():
+            return self.transport.store(dict(body))
+        return FakeRequest(self.transport, handler)
+
+
+class FakeCalendarService:
+    """
+    Mimics the subset of the Calendar service used by `calender_api`.
+
+    Args:
+        latency (float): Seconds slept per simulated HTTP round-trip.
+        profile (ServiceProfile): Replaces `latency` with a latency distribution and
+            fails round-trips with 429/503 as often as it says (see `service_profile`).
+    """
+
+    def __init__(self, latency=0.01, profile=None):
+        self.latency = latency
+        self.profile = profile
+        self.round_trips = 0
+        self.stored = {}
+        self.version = 0
+        self.inserts = 0
+        self._ids = itertools.count(1)
+
+    def store(self, event):
+        self.version += 1
+        event.setdefault("id", f"evt{next(self._ids):06d}")
+        event.setdefault("status", "confirmed")
+        event["htmlLink"] = f"https://calendar.example.com/{event['id']}"
+        # The real API answers with the UTC offset applied to the local time
+        event["start"] = {"dateTime": self._with_offset(event["start"]), "timeZone": event["start"].get("timeZone")}
+        event["end"] = {"dateTime": self._with_offset(event["end"]), "timeZone": event["end"].get("timeZone")}
+        event["_version"] = self.version
+        self.stored[event["id"]] = event
+        if "extendedProperties" in event:
+            self.inserts += 1
+        return {k: v for k, v in event.items() if not k.startswith("_")}
+
+    @staticmethod
+    def _with_offset(when):
+        value = datetime.datetime.fromisoformat(when["dateTime"])
+        if value.tzinfo is None and when.get("timeZone"):
+            value = value.replace(tzinfo=ZoneInfo(when["timeZone"]))
+        return value.isoformat()
+
+    def add_busy(self, title, start, hours=1, timezone="Asia/Kolkata"):
+        """
+        Adds an event created outside the assistant (e.g. by the user).
+        """
+        end = datetime.datetime.fromisoformat(start) + datetime.timedelta(hours=hours)
+        self.store({"summary": title, "start": {"dateTime": start, "timeZone": timezone},
+                    "end": {"dateTime": end.isoformat(), "timeZone": timezone}})
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.profile is not None:
+            self.profile.wait()
+            failure = self.profile.outcome()
+            if failure:
+                from benchmarks.synthetic_mailbox import http_error
+                raise http_error(failure)
+        elif self.latency:
+            time.sleep(self.latency)
+
+    def events(self):
+        return FakeEvents(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
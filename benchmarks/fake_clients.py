@@ -0,0 +1,91 @@
+"""
+In-process stand-ins for the Slack WebClient and the Custom Search HTTP session.
+
+Unlike `fake_slack_server`, nothing goes over a socket: the fakes sleep and
+fail as their `ServiceProfile` says, so the end-to-end benchmark measures the
+pipeline rather than local HTTP overhead.
+"""
+import itertools
+import threading
+
+import requests
+from slack_sdk.errors import SlackApiError
+
+
+class _SlackResponse(dict):
+    def __init__(self, status_code, data, headers=None):
+        super().__init__(data)
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.data = data
+
+
+class FakeSlackClient:
+    """
+    Implements `chat_postMessage` like slack_sdk's WebClient.
+
+    Args:
+        profile (ServiceProfile): Latency per call and injected ratelimited/internal_error answers.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile
+        self.messages = 0
+        self.requests = 0
+        self._ts = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def chat_postMessage(self, channel, text=None, blocks=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        if self.profile is not None:
+            self.profile.wait()
+            failure = self.profile.outcome()
+            if failure == "rate_limited":
+                response = _SlackResponse(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": "1"})
+                raise SlackApiError("ratelimited", response)
+            if failure:
+                response = _SlackResponse(500, {"ok": False, "error": "internal_error"})
+                raise SlackApiError("internal_error", response)
+        with self._lock:
+            self.messages += 1
+            ts = f"{next(self._ts)}.000000"
+        return _SlackResponse(200, {"ok": True, "channel": channel, "ts": ts})
+
+
+class _SearchResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.headers = {"Retry-After": "1"} if status_code == 429 else {}
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class FakeSearchSession:
+    """
+    Answers `get(SEARCH_URL, params=...)` like the Custom Search JSON API, through a `requests.Session`-like interface.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        query = (params or {}).get("q", "")
+        if self.profile is not None:
+            self.profile.wait()
+            failure = self.profile.outcome()
+            if failure:
+                return _SearchResponse(429 if failure == "rate_limited" else 500, {"error": {"message": "Injected"}})
+        items = [{"title": f"Result {i}", "snippet": f"Snippet {i} about {query[:40]}",
+                  "link": f"https://example.com/{i}"} for i in range(int((params or {}).get("num", 3)))]
+        return _SearchResponse(200, {"items": items})
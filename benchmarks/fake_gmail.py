@@ -0,0 +1,157 @@
+"""
+A local, in-memory stand-in for the Gmail API service object returned by
+`googleapiclient.discovery.build("gmail", "v1", ...)`.
+
+Every `execute()` sleeps for one simulated HTTP round-trip, so the benchmarks
+measure how many round-trips a fetch strategy needs rather than real network noise.
+"""
+import base64
+import time
+
+
+def make_message(index):
+    """
+    Builds a Gmail message resource with a plain-text body.
+    """
+    body = f"Hello,\n\nThis is synthetic message number {index}.\n\nThanks"
+    return {
+        "id": f"msg{index:07d}",
+        "threadId": f"thr{index:07d}",
+        "historyId": str(index + 1),
+        "snippet": body[:100],
+        "payload": {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "From", "value": f"Sender {index} <sender{index}@example.com>"},
+                {"name": "Subject", "value": f"Synthetic message {index}"},
+            ],
+            "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+        },
+    }
+
+
+class FakeRequest:
+    def __init__(self, transport, handler):
+        self.transport = transport
+        self.handler = handler
+
+    def execute(self):
+        self.transport.round_trip()
+        return self.handler()
+
+
+class FakeBatch:
+    def __init__(self, transport, callback):
+        self.transport = transport
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        # The whole batch costs a single round-trip
+        self.transport.round_trip()
+        for request_id, request in self.requests:
+            try:
+                response = request.handler()
+            except Exception as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeMessages:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def list(self, userId, maxResults=100, pageToken=None, q=None, **kwargs):
+        def handler():
+            start = int(pageToken or 0)
+            end = min(start + maxResults, len(self.transport.messages))
+            page = [{"id": m["id"], "threadId": m["threadId"]} for m in self.transport.messages[start:end]]
+            result = {"messages": page, "resultSizeEstimate": len(page)}
+            if end < len(self.transport.messages):
+                result["nextPageToken"] = str(end)
+            return result
+        return FakeRequest(self.transport, handler)
+
+    def get(self, userId, id, **kwargs):
+        def handler():
+            return self.transport.by_id[id]
+        return FakeRequest(self.transport, handler)
+
+
+class FakeHistory:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def list(self, userId, startHistoryId, pageToken=None, maxResults=100, **kwargs):
+        def handler():
+            start = int(pageToken or startHistoryId)
+            newer = [m for m in self.transport.messages if int(m["historyId"]) > start]
+            newer.sort(key=lambda m: int(m["historyId"]))
+            page = newer[:maxResults]
+            result = {
+                "history": [{"id": m["historyId"], "messagesAdded": [{"message": {"id": m["id"], "threadId": m["threadId"]}}]}
+                            for m in page],
+                "historyId": str(self.transport.history_id),
+            }
+            if len(newer) > maxResults:
+                result["nextPageToken"] = page[-1]["historyId"]
+            return result
+        return FakeRequest(self.transport, handler)
+
+
+class FakeUsers:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def messages(self):
+        return FakeMessages(self.transport)
+
+    def history(self):
+        return FakeHistory(self.transport)
+
+    def getProfile(self, userId):
+        return FakeRequest(self.transport, lambda: {"historyId": str(self.transport.history_id)})
+
+
+class FakeGmailService:
+    """
+    Mimics the subset of the Gmail service used by `email_controller`.
+
+    Args:
+        message_count (int): Number of synthetic messages in the mailbox.
+        latency (float): Seconds slept per simulated HTTP round-trip.
+    """
+
+    def __init__(self, message_count, latency=0.01):
+        self.latency = latency
+        self.round_trips = 0
+        self.messages = [make_message(i) for i in range(message_count)]
+        self.by_id = {m["id"]: m for m in self.messages}
+
+    @property
+    def history_id(self):
+        return len(self.by_id)
+
+    def add_messages(self, count):
+        """
+        Delivers `count` new messages, newest first like a real inbox listing.
+        """
+        start = len(self.by_id)
+        new = [make_message(i) for i in range(start, start + count)]
+        self.by_id.update({m["id"]: m for m in new})
+        self.messages = list(reversed(new)) + self.messages
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def users(self):
+        return FakeUsers(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
@@ -0,0 +1,128 @@
+"""
+A stubbed OpenAI client that mimics `client.chat.completions.create` locally.
+
+It returns canned completions, sleeps in proportion to the prompt and
+completion size, and records an approximate token count for every call.
+"""
+import json
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+
+def count_tokens(text):
+    """
+    Rough token estimate (about four characters per token for English text).
+    """
+    return max(1, len(text) // 4)
+
+
+CANNED_ANALYSIS = {
+    "summary": "The sender asks to meet next week to review the project plan.",
+    "reply": "Dear Sender,\n\nThank you for your email. Tuesday at 10:00 works for me.\n\nBest Regards,\nYour Name",
+    "urgency": "normal",
+    "category": "complex",
+    "meetings": [{"title": "Project plan review", "date": "2026-10-20", "time": "10:00:00", "timezone": "Asia/Kolkata"}],
+}
+
+
+class FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, model, messages, max_tokens=None, response_format=None, stream=False, **kwargs):
+        prompt = "\n".join(m["content"] for m in messages)
+
+        if self.owner.profile is not None:
+            self.owner.profile.wait()
+            failure = self.owner.profile.outcome()
+            if failure:
+                self.owner.record(model, 0, 0)
+                raise _api_error(failure)
+
+        if response_format and response_format.get("type") == "json_object":
+            content = json.dumps(self.owner.responder(prompt) if self.owner.responder else CANNED_ANALYSIS)
+        elif "meeting" in prompt.lower() and "Output as JSON" in prompt:
+            content = json.dumps(CANNED_ANALYSIS["meetings"][0])
+        else:
+            content = f"Summary: {CANNED_ANALYSIS['summary']}\n\nReply: {CANNED_ANALYSIS['reply']}"
+
+        usage = SimpleNamespace(prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(content))
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        self.owner.record(model, usage.prompt_tokens, usage.completion_tokens)
+
+        delay = self.owner.base_latency + usage.total_tokens * self.owner.latency_per_token
+        if delay:
+            time.sleep(delay)
+
+        if stream:
+            include_usage = (kwargs.get("stream_options") or {}).get("include_usage")
+            return _stream_chunks(content, usage if include_usage else None)
+
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+
+def _api_error(failure):
+    """
+    The openai exception the real client raises for an injected 429 or 503.
+    """
+    import openai
+
+    status = 429 if failure == "rate_limited" else 503
+    # Only the attributes the client's error classes read from the HTTP response
+    response = SimpleNamespace(status_code=status, request=None,
+                               headers={"retry-after": "0"} if status == 429 else {})
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class("Injected failure", response=response, body=None)
+
+
+def _stream_chunks(content, usage=None, size=16):
+    """
+    Yields `content` as streamed chat-completion chunks of `size` characters,
+    then a choice-less chunk carrying `usage` if one is given.
+    """
+    for start in range(0, len(content), size):
+        delta = SimpleNamespace(content=content[start:start + size])
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+    if usage is not None:
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeOpenAI:
+    """
+    Drop-in for `openai.OpenAI()` in benchmarks.
+
+    Args:
+        base_latency (float): Seconds added to every call.
+        latency_per_token (float): Seconds added per prompt + completion token.
+        profile (ServiceProfile): Extra latency and injected 429/503 failures (see `service_profile`).
+        responder (callable): Builds the analysis dict for a prompt; the canned one is used otherwise.
+    """
+
+    def __init__(self, base_latency=0.0, latency_per_token=0.0, profile=None, responder=None):
+        self.base_latency = base_latency
+        self.latency_per_token = latency_per_token
+        self.profile = profile
+        self.responder = responder
+        # Running totals rather than a record per call, so long benchmark runs don't grow memory
+        self._totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.models = Counter()
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=FakeCompletions(self))
+
+    def with_options(self, **kwargs):
+        # Per-request timeout and retry options have no effect on the fake
+        return self
+
+    def record(self, model, prompt_tokens, completion_tokens):
+        with self._lock:
+            self._totals["calls"] += 1
+            self._totals["prompt_tokens"] += prompt_tokens
+            self._totals["completion_tokens"] += completion_tokens
+            self.models[model] += 1
+
+    def totals(self):
+        with self._lock:
+            return dict(self._totals)
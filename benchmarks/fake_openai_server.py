@@ -0,0 +1,183 @@
+"""
+A local OpenAI-compatible HTTP server for exercising the real `openai` client.
+
+It answers POST /v1/chat/completions with the canned analysis from
+`fake_openai`, either as one JSON response or as a server-sent event stream,
+and can be told to be slow or to fail, so timeouts, retries and the fallback
+model can be tried without network access.
+
+Usage:
+    python benchmarks/fake_openai_server.py [--port 8808] [--token-delay 0.02] [--fail-first 2 --fail-status 429]
+
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=test python main.py
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.fake_openai import CANNED_ANALYSIS, count_tokens
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Args:
+        port (int): Port to listen on (0 picks a free one; see `url`).
+        first_token_delay (float): Seconds before the first byte of a response.
+        token_delay (float): Seconds between streamed chunks (and per chunk of a plain response).
+        fail_first (int): Number of requests answered with `fail_status` before succeeding.
+        fail_status (int): HTTP status of the injected failures (429 adds a Retry-After header).
+        slow_models (tuple): Models that take `slow_delay` extra seconds before answering.
+        slow_delay (float): See `slow_models`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, first_token_delay=0.0, token_delay=0.0, fail_first=0, fail_status=503,
+                 slow_models=(), slow_delay=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.slow_models = set(slow_models)
+        self.slow_delay = slow_delay
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def record(self, body):
+        """
+        Logs a request and returns True if it should get an injected failure.
+        """
+        with self._lock:
+            self.requests.append({"model": body.get("model"), "stream": bool(body.get("stream"))})
+            return len(self.requests) <= self.fail_first
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        if server.record(body):
+            headers = {"Retry-After": "0.1"} if server.fail_status == 429 else {}
+            return self._send_json(server.fail_status, {"error": {"message": "Injected failure", "type": "server_error"}}, headers)
+
+        model = body.get("model", "fake")
+        delay = server.first_token_delay + (server.slow_delay if model in server.slow_models else 0.0)
+        time.sleep(delay)
+
+        content = json.dumps(CANNED_ANALYSIS)
+        chunks = [content[i:i + 16] for i in range(0, len(content), 16)]
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+        if not body.get("stream"):
+            time.sleep(server.token_delay * len(chunks))
+            return self._send_json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(content),
+                          "total_tokens": count_tokens(prompt) + count_tokens(content)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for index, piece in enumerate(chunks):
+                if index:
+                    time.sleep(server.token_delay)
+                self._send_event({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                })
+            self._send_event({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            })
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._send_event({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(content),
+                              "total_tokens": count_tokens(prompt) + count_tokens(content)},
+                })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (deadline) mid-stream
+
+    def _send_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status, data, headers=None):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--slow-model", action="append", default=[], help="Model that answers --slow-delay seconds late")
+    parser.add_argument("--slow-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.port, args.first_token_delay, args.token_delay, args.fail_first,
+                              args.fail_status, args.slow_model, args.slow_delay)
+    print(f"Fake OpenAI API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
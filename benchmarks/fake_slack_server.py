@@ -0,0 +1,126 @@
+"""
+A local stub of the Slack Web API's chat.postMessage.
+
+It enforces Slack's per-channel limit of about one message per second
+(answering 429 with Retry-After beyond a small burst) and records every
+posted message, so alerting can be tried without a workspace.
+
+Usage:
+    python benchmarks/fake_slack_server.py [--port 8809]
+
+    SLACK_API_URL=http://127.0.0.1:8809/api/ SLACK_BOT_TOKEN=xoxb-test SLACK_CHANNEL_ID=C123 python main.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeSlackServer(ThreadingHTTPServer):
+    """
+    Args:
+        port (int): Port to listen on (0 picks a free one; see `url`).
+        rate (float): Messages per second allowed per channel.
+        burst (int): Messages allowed back to back before the rate applies.
+        latency (float): Seconds every call takes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, rate=1.0, burst=2, latency=0.05):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.rate = rate
+        self.burst = burst
+        self.latency = latency
+        self.messages = []
+        self.rate_limited = 0
+        self._allowance = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-slack", daemon=True).start()
+        return self
+
+    def admit(self, channel):
+        """
+        Token bucket per channel; returns 0 if the message may be posted, else seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._allowance.get(channel, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._allowance[channel] = (tokens, now)
+                self.rate_limited += 1
+                return (1 - tokens) / self.rate
+            self._allowance[channel] = (tokens - 1, now)
+            return 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            body = json.loads(raw or "{}")
+        else:
+            body = {key: values[0] for key, values in parse_qs(raw).items()}
+        time.sleep(server.latency)
+
+        if not self.path.rstrip("/").endswith("chat.postMessage"):
+            return self._send(200, {"ok": False, "error": "unknown_method"})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(200, {"ok": False, "error": "not_authed"})
+
+        channel = body.get("channel") or "default"
+        wait = server.admit(channel)
+        if wait:
+            return self._send(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": str(max(1, round(wait)))})
+
+        ts = f"{time.time():.6f}"
+        blocks = body.get("blocks")
+        if isinstance(blocks, str):
+            blocks = json.loads(blocks)
+        with server._lock:
+            server.messages.append({"channel": channel, "text": body.get("text"), "blocks": blocks, "ts": ts})
+        self._send(200, {"ok": True, "channel": channel, "ts": ts, "message": {"text": body.get("text")}})
+
+    def _send(self, status, data, headers=None):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8809)
+    parser.add_argument("--rate", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = FakeSlackServer(args.port, rate=args.rate)
+    print(f"Fake Slack API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Latency and failure distributions for the local service fakes.
+
+A `ServiceProfile` draws a log-normally distributed delay around a mean (most
+calls near it, a long tail of slow ones, like real API latency) and decides
+whether a call fails with a transient error or a rate limit.
+"""
+import math
+import random
+import threading
+import time
+
+# Realistic per-call means (seconds) and failure rates, before --time-scale is applied
+DEFAULT_PROFILES = {
+    "gmail": {"latency": 0.08, "error_rate": 0.001, "rate_limit_rate": 0.001},
+    "people": {"latency": 0.10},
+    "calendar": {"latency": 0.12, "error_rate": 0.001},
+    "openai": {"latency": 1.5, "error_rate": 0.005, "rate_limit_rate": 0.01},
+    "slack": {"latency": 0.15},
+    "search": {"latency": 0.3, "error_rate": 0.005},
+}
+
+
+class ServiceProfile:
+    """
+    Args:
+        latency (float): Mean seconds per call.
+        jitter (float): Sigma of the log-normal delay; 0 makes every call take exactly `latency`.
+        error_rate (float): Share of calls failing with a retryable server error (5xx).
+        rate_limit_rate (float): Share of calls answered with a rate limit (429).
+        seed (int): Seed of the profile's own random generator, for reproducible runs.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = {"error": 0, "rate_limited": 0}
+
+    def delay(self):
+        if self.latency <= 0:
+            return 0.0
+        if self.jitter <= 0:
+            return self.latency
+        # mu is chosen so the distribution's mean stays at `latency`
+        mu = math.log(self.latency) - self.jitter ** 2 / 2
+        with self._lock:
+            return self._random.lognormvariate(mu, self.jitter)
+
+    def outcome(self):
+        """
+        Returns None for a successful call, else "error" or "rate_limited".
+        """
+        with self._lock:
+            self.calls += 1
+            draw = self._random.random()
+            if draw < self.rate_limit_rate:
+                failure = "rate_limited"
+            elif draw < self.rate_limit_rate + self.error_rate:
+                failure = "error"
+            else:
+                return None
+            self.failures[failure] += 1
+            return failure
+
+    def wait(self):
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+
+def build_profiles(time_scale=1.0, overrides=None, seed=0):
+    """
+    Returns a ServiceProfile per service from DEFAULT_PROFILES, with latencies multiplied by
+    `time_scale` and `overrides` ({service: {field: value}}) applied on top (override latencies are not scaled).
+    """
+    profiles = {}
+    for index, (service, defaults) in enumerate(DEFAULT_PROFILES.items()):
+        settings = dict(defaults, latency=defaults.get("latency", 0.0) * time_scale)
+        settings.update((overrides or {}).get(service, {}))
+        profiles[service] = ServiceProfile(seed=seed + index, **settings)
+    return profiles
+
+
+def parse_overrides(latency=(), errors=(), rate_limits=(), jitter=None):
+    """
+    Turns repeated `service=value` command-line options into `build_profiles` overrides.
+    """
+    overrides = {}
+    for field, entries in (("latency", latency), ("error_rate", errors), ("rate_limit_rate", rate_limits)):
+        for entry in entries:
+            service, _, value = entry.partition("=")
+            if service not in DEFAULT_PROFILES or not value:
+                raise ValueError(f"Expected service=value with service in {sorted(DEFAULT_PROFILES)}, got '{entry}'")
+            overrides.setdefault(service, {})[field] = float(value)
+    if jitter is not None:
+        for service in DEFAULT_PROFILES:
+            overrides.setdefault(service, {})["jitter"] = jitter
+    return overrides
@@ -0,0 +1,511 @@
+"""
+Synthetic Gmail mailboxes of any size, with realistic MIME structure, served
+by an in-memory stand-in for the Gmail and People API service objects.
+
+Messages are generated on demand from their index and a seed, so a mailbox of
+a million messages costs no memory until its messages are fetched, and the
+same seed always yields the same mailbox. The mix covers what a real inbox
+holds: newsletters (multipart/alternative with List-Unsubscribe), automated
+notifications (HTML only, from no-reply senders), short acknowledgements,
+questions, meeting requests with a text/calendar invite, replies in threads
+with quoted history, urgent mail, PDF attachments and non-UTF-8 charsets.
+"""
+import base64
+import email.utils
+import itertools
+import random
+import threading
+
+from benchmarks.fake_gmail import FakeRequest, FakeBatch
+
+# (kind, weight) of the generated messages
+MESSAGE_MIX = (
+    ("newsletter", 22),
+    ("notification", 14),
+    ("thanks", 14),
+    ("question", 14),
+    ("meeting", 10),
+    ("reply", 14),
+    ("urgent", 5),
+    ("attachment", 5),
+    ("latin1", 2),
+)
+
+FIRST_NAMES = ("Asha", "Ben", "Chen", "Divya", "Elena", "Farid", "Grace", "Hiro", "Isabel", "Jonas", "Kavya", "Liam")
+COMPANIES = ("acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "tyrell")
+TOPICS = ("the Q3 roadmap", "the vendor contract", "the onboarding plan", "the data migration",
+          "the pricing update", "the security review", "the hiring plan", "the launch checklist")
+QUESTIONS = ("what is the latest stable release of Python", "how to rotate OAuth refresh tokens",
+             "what is the current GST rate on software services", "how to export a Google Calendar to ICS",
+             "explain the difference between SPF and DKIM", "what is the latest guidance on password rotation")
+
+# Mailbox "now": the newest message was received at this time (epoch seconds)
+_EPOCH = 1_790_000_000
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _part(mime_type, text, charset="utf-8", headers=()):
+    data = text.encode(charset)
+    return {
+        "partId": "",
+        "mimeType": mime_type,
+        "filename": "",
+        "headers": [{"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}, *headers],
+        "body": {"size": len(data), "data": _b64(data)},
+    }
+
+
+def _attachment(mime_type, filename, size, attachment_id):
+    # Gmail leaves attachment bytes out of the message resource and points at them by id
+    return {
+        "partId": "",
+        "mimeType": mime_type,
+        "filename": filename,
+        "headers": [
+            {"name": "Content-Type", "value": f'{mime_type}; name="{filename}"'},
+            {"name": "Content-Disposition", "value": f'attachment; filename="{filename}"'},
+        ],
+        "body": {"size": size, "attachmentId": attachment_id},
+    }
+
+
+def _multipart(subtype, parts):
+    for index, part in enumerate(parts):
+        part["partId"] = str(index)
+    return {"partId": "", "mimeType": f"multipart/{subtype}", "filename": "", "headers": [],
+            "body": {"size": 0}, "parts": parts}
+
+
+# One story block of a marketing email: table layout, inline styles and a tracked link
+_PROMO_BLOCK = ('<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" '
+                'style="max-width:600px;background-color:#ffffff;border-collapse:collapse"><tr>'
+                '<td style="padding:24px 32px;font-family:Helvetica,Arial,sans-serif;font-size:16px;'
+                'line-height:24px;color:#333333"><img src="https://img.{company}.com/{token}/hero.png" width="536" '
+                'alt="" style="display:block;border:0"><h2 style="margin:16px 0 8px;font-size:20px">Story {n}</h2>'
+                '<a href="https://click.{company}.com/ls/click?upn={token}{n:04d}" style="color:#1a73e8;'
+                'text-decoration:none">Read more</a></td></tr></table>')
+
+
+def _html(paragraphs, padding=0, company="acme", token=""):
+    body = "".join(f"<p>{p}</p>" for p in paragraphs)
+    # Real bulk mail is mostly layout markup: pad with story blocks up to `padding` bytes
+    blocks = []
+    size = len(body)
+    while size < padding:
+        blocks.append(_PROMO_BLOCK.format(company=company, token=token, n=len(blocks)))
+        size += len(blocks[-1])
+    return f"<html><head><style>p {{margin: 0 0 1em}}</style></head><body>{body}{''.join(blocks)}</body></html>"
+
+
+class SyntheticMailbox:
+    """
+    A deterministic mailbox of `size` messages; index 0 is the oldest.
+
+    Args:
+        size (int): Number of messages.
+        seed (int): Changes every generated message.
+        mix (tuple): (kind, weight) pairs of the generated messages (default MESSAGE_MIX).
+        bulk_html_kib (float): Pad the HTML of newsletters and notifications to about this size
+            (real ones run to tens of KiB); 0 keeps them minimal.
+    """
+
+    def __init__(self, size, seed=0, mix=MESSAGE_MIX, bulk_html_kib=0):
+        self.size = size
+        self.seed = seed
+        self.bulk_html_bytes = int(bulk_html_kib * 1024)
+        self._kinds, weights = zip(*mix)
+        self._cumulative = list(itertools.accumulate(weights))
+
+    def message_id(self, index):
+        return f"18{self.seed % 256:02x}{index:012x}"
+
+    def index_of(self, message_id):
+        return int(message_id[4:], 16)
+
+    def kind(self, index):
+        draw = self._random(index).random() * self._cumulative[-1]
+        return next(kind for kind, bound in zip(self._kinds, self._cumulative) if draw < bound)
+
+    def _random(self, index, salt=0):
+        return random.Random(self.seed * 1_000_003 + index * 7 + salt)
+
+    def message(self, index, format="full", metadata_headers=None):
+        """
+        Builds the `messages.get` resource of message `index`; with format="metadata",
+        only the headers named in `metadata_headers` (all of them if None) and no body.
+        """
+        rng = self._random(index)
+        rng.random()  # The draw `kind` used
+        kind = self.kind(index)
+        first = rng.choice(FIRST_NAMES)
+        company = rng.choice(COMPANIES)
+        topic = rng.choice(TOPICS)
+        received = _EPOCH - (self.size - index) * 90
+        thread_id = self.message_id(index)
+        extra_headers = []
+        sender = f"{first} {company.title()} <{first.lower()}@{company}.com>"
+
+        if kind == "newsletter":
+            sender = f"{company.title()} Weekly <news@{company}.com>"
+            subject = f"{company.title()} weekly: updates on {topic}"
+            paragraphs = [f"This week at {company.title()}: progress on {topic}.",
+                          "Read the full story on our blog.", "You are receiving this because you subscribed."]
+            payload = _multipart("alternative", [_part("text/plain", "\n\n".join(paragraphs)),
+                                                 _part("text/html", _html(paragraphs, self.bulk_html_bytes,
+                                                                          company, thread_id))])
+            extra_headers = [("List-Unsubscribe", f"<mailto:unsubscribe@{company}.com>"), ("Precedence", "bulk")]
+        elif kind == "notification":
+            sender = f"{company.title()} <no-reply@{company}.com>"
+            subject = f"Your {company.title()} order #{rng.randrange(10**6, 10**7)} has shipped"
+            payload = _part("text/html", _html([f"Hi {first},", "Your order is on its way.", "Track it in the app."],
+                                               self.bulk_html_bytes, company, thread_id))
+            extra_headers = [("Auto-Submitted", "auto-generated")]
+        elif kind == "thanks":
+            subject = rng.choice(("Thanks!", "Received", "Re: documents"))
+            payload = _part("text/plain", rng.choice((
+                "Thank you, received the documents.",
+                f"Hi,\n\nThank you for sending {topic}. Received.\n\n{first}",
+                "Confirmation: all received, thank you.",
+            )))
+        elif kind == "question":
+            question = rng.choice(QUESTIONS)
+            subject = f"Quick question about {topic}"
+            payload = _part("text/plain", f"Hi,\n\nHope all is well. Quick one while we plan {topic}: {question}?\n\n"
+                                          f"Any pointers help.\n\nBest,\n{first}")
+        elif kind == "meeting":
+            day = 1 + rng.randrange(27)
+            hour = 9 + rng.randrange(8)
+            subject = f"Meeting to discuss {topic}"
+            text = (f"Hi,\n\nCan we meet on 2026-11-{day:02d} at {hour}:00 IST to go over {topic}? "
+                    f"I've attached an invite.\n\nRegards,\n{first}")
+            if rng.random() < 0.5:
+                # A long follow-up that also confirms something: the LLM route, auto-replied, with a meeting
+                agenda = "\n".join(f"{n}. Review {t} and agree on owners, dates and open risks."
+                                    for n, t in enumerate(rng.sample(TOPICS, 5), 1))
+                text = (f"Hi,\n\nThank you for the confirmation on the budget. Can we meet on 2026-11-{day:02d} "
+                        f"at {hour}:00 IST to go over {topic}? Proposed agenda:\n\n{agenda}\n\n"
+                        f"I've attached an invite.\n\nRegards,\n{first}")
+            invite = (f"BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:{topic}\r\n"
+                      f"DTSTART:202611{day:02d}T{hour - 5:02d}3000Z\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n")
+            payload = _multipart("mixed", [
+                _multipart("alternative", [_part("text/plain", text), _part("text/html", _html(text.split("\n\n")))]),
+                _part("text/calendar", invite, headers=[{"name": "Content-Disposition", "value": "attachment; filename=\"invite.ics\""}]),
+            ])
+        elif kind == "reply":
+            thread_id = f"t{self.message_id(index)}"
+            subject = f"Re: {topic}"
+            quoted = "\n".join(f"> {line}" for line in self._earlier_text(index, 0).splitlines())
+            text = (f"Sounds good, let's go ahead with {topic}. I'll send the numbers tomorrow.\n\n{first}\n\n"
+                    f"On Mon, 3 Nov 2025 at 10:00, {rng.choice(FIRST_NAMES)} wrote:\n{quoted}")
+            payload = _part("text/plain", text)
+            extra_headers = [("In-Reply-To", f"<{self.message_id(index)}.0@{company}.com>"),
+                             ("References", f"<{self.message_id(index)}.0@{company}.com>")]
+        elif kind == "urgent":
+            subject = f"URGENT: {topic} blocked"
+            payload = _part("text/plain", f"Hi,\n\nThis is urgent: {topic} is blocked and we need a decision ASAP, "
+                                          f"ideally before the deadline today.\n\n{first}")
+        elif kind == "attachment":
+            subject = f"Signed copy of {topic}"
+            payload = _multipart("mixed", [
+                _part("text/plain", f"Hi,\n\nPlease find the signed copy of {topic} attached. Let me know if "
+                                    f"anything needs changing before we file it.\n\n{first}"),
+                _attachment("application/pdf", "signed.pdf", 180_000 + rng.randrange(50_000), f"att{index}"),
+            ])
+        else:  # latin1
+            subject = "Réunion équipe"
+            payload = _part("text/plain", f"Bonjour,\n\nPouvons-nous revoir {topic} au café demain ? "
+                                          f"Merci d'avance.\n\n{first}", charset="iso-8859-1")
+
+        headers = [
+            {"name": "From", "value": sender},
+            {"name": "To", "value": "Me <me@example.com>"},
+            {"name": "Subject", "value": subject},
+            {"name": "Date", "value": email.utils.formatdate(received)},
+            {"name": "Message-ID", "value": f"<{self.message_id(index)}@{company}.com>"},
+            {"name": "MIME-Version", "value": "1.0"},
+        ] + [{"name": name, "value": value} for name, value in extra_headers]
+        if payload["mimeType"].startswith("multipart/"):
+            headers.append({"name": "Content-Type", "value": f'{payload["mimeType"]}; boundary="b{index}"'})
+            payload["headers"] = headers
+        else:
+            payload["headers"] = headers + payload["headers"]
+
+        resource = {
+            "id": self.message_id(index),
+            "threadId": thread_id,
+            "labelIds": ["INBOX", "UNREAD"],
+            "historyId": str(index + 1),
+            "internalDate": str(received * 1000),
+            "snippet": subject[:100],
+            "sizeEstimate": 2000 + len(str(payload)),
+            "payload": payload,
+        }
+        if format == "metadata":
+            if metadata_headers is not None:
+                wanted = {name.lower() for name in metadata_headers}
+                headers = [header for header in headers if header["name"].lower() in wanted]
+            resource["payload"] = {"mimeType": payload["mimeType"], "headers": headers}
+        return resource
+
+    def _earlier_text(self, index, turn):
+        rng = self._random(index, salt=turn + 1)
+        return (f"Hi,\n\nFollowing up on {rng.choice(TOPICS)}: could you confirm the budget and the timeline?\n\n"
+                f"Thanks,\n{rng.choice(FIRST_NAMES)}")
+
+    def thread(self, thread_id):
+        """
+        Builds the `threads.get` resource: earlier turns for reply threads, else the single message.
+        """
+        root = thread_id[1:] if thread_id.startswith("t") else thread_id
+        index = self.index_of(root)
+        latest = self.message(index)
+        if not thread_id.startswith("t"):
+            return {"id": thread_id, "messages": [latest]}
+
+        earlier = []
+        for turn in range(1 + self._random(index, salt=99).randrange(3)):
+            text = self._earlier_text(index, turn)
+            payload = _part("text/plain", text)
+            payload["headers"] = [
+                {"name": "From", "value": f"Colleague <colleague{turn}@example.com>"},
+                {"name": "Subject", "value": latest["payload"]["headers"][2]["value"][4:]},
+            ] + payload["headers"]
+            earlier.append({"id": f"{root}.{turn}", "threadId": thread_id, "historyId": latest["historyId"],
+                            "internalDate": str(int(latest["internalDate"]) - (turn + 1) * 3_600_000),
+                            "payload": payload})
+        return {"id": thread_id, "messages": list(reversed(earlier)) + [latest]}
+
+
+def apply_fields(resource, fields):
+    """
+    Applies a partial-response mask of comma-separated paths ("id,payload/headers") like Gmail's `fields`.
+    """
+    if not fields:
+        return resource
+    result = {}
+    for path in fields.split(","):
+        *parents, last = path.strip().split("/")
+        source, target = resource, result
+        for key in parents:
+            if key not in source:
+                break
+            source, target = source[key], target.setdefault(key, {})
+        else:
+            if last in source:
+                target[last] = source[last]
+    return result
+
+
+class _FailingResponse(dict):
+    # Dict-like like httplib2.Response, with the attributes googleapiclient's HttpError reads
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {}, status=str(status))
+        self.status = status
+        self.reason = "Too Many Requests" if status == 429 else "Backend Error"
+
+
+def http_error(failure):
+    """
+    Builds the googleapiclient HttpError a real client raises for an injected failure
+    ("error", "rate_limited", or "not_found" for a missing draft).
+    """
+    from googleapiclient.errors import HttpError
+
+    status = {"rate_limited": 429, "not_found": 404}.get(failure, 503)
+    resp = _FailingResponse(status, {"retry-after": "0"} if status == 429 else None)
+    content = b'{"error": {"code": %d, "message": "Injected failure"}}' % status
+    error = HttpError(resp, content)
+    error.resp = resp  # Set by HttpError itself; kept explicit for minimal client builds
+    return error
+
+
+class _Transport:
+    """
+    Shared request accounting for the fake Google services.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.round_trips = 0
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.profile:
+            self.profile.wait()
+
+    def request(self, method, handler):
+        """
+        Wraps `handler` in a FakeRequest that counts `method` and may fail as the profile says.
+        """
+        def run():
+            with self._lock:
+                self.requests[method] = self.requests.get(method, 0) + 1
+            failure = self.profile.outcome() if self.profile else None
+            if failure:
+                raise http_error(failure)
+            return handler()
+        return FakeRequest(self, run)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+
+class FakeMailboxService(_Transport):
+    """
+    The subset of the Gmail service the assistant uses (messages list/get/send,
+    drafts, history, threads, getProfile, batches), over a `SyntheticMailbox`.
+
+    Args:
+        mailbox (SyntheticMailbox): The messages to serve.
+        profile (ServiceProfile): Latency per round-trip and failures per request (optional).
+    """
+
+    def __init__(self, mailbox, profile=None):
+        super().__init__(profile)
+        self.mailbox = mailbox
+        self.sent = 0
+        self.drafts = {}
+        self._draft_ids = itertools.count(1)
+
+    def users(self):
+        return _Users(self)
+
+
+class _Users:
+    def __init__(self, service):
+        self.service = service
+
+    def messages(self):
+        return _Messages(self.service)
+
+    def history(self):
+        return _History(self.service)
+
+    def drafts(self):
+        return _Drafts(self.service)
+
+    def threads(self):
+        return _Threads(self.service)
+
+    def getProfile(self, userId):
+        return self.service.request("getProfile", lambda: {"emailAddress": "me@example.com",
+                                                            "historyId": str(self.service.mailbox.size)})
+
+
+class _Messages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, maxResults=100, pageToken=None, q=None, **kwargs):
+        mailbox = self.service.mailbox
+
+        def handler():
+            # Newest first, like the real inbox listing
+            start = int(pageToken or 0)
+            end = min(start + maxResults, mailbox.size)
+            ids = [mailbox.message_id(mailbox.size - 1 - n) for n in range(start, end)]
+            result = {"messages": [{"id": i, "threadId": i} for i in ids], "resultSizeEstimate": mailbox.size}
+            if end < mailbox.size:
+                result["nextPageToken"] = str(end)
+            return result
+        return self.service.request("messages.list", handler)
+
+    def get(self, userId, id, format="full", metadataHeaders=None, fields=None, **kwargs):
+        mailbox = self.service.mailbox
+        return self.service.request("messages.get", lambda: apply_fields(
+            mailbox.message(mailbox.index_of(id), format, metadataHeaders), fields))
+
+    def send(self, userId, body):
+        def handler():
+            with self.service._lock:
+                self.service.sent += 1
+                return {"id": f"sent{self.service.sent:09d}", "labelIds": ["SENT"]}
+        return self.service.request("messages.send", handler)
+
+
+class _Drafts:
+    def __init__(self, service):
+        self.service = service
+
+    def create(self, userId, body):
+        def handler():
+            with self.service._lock:
+                draft_id = f"r{next(self.service._draft_ids)}"
+                self.service.drafts[draft_id] = body["message"]
+            return {"id": draft_id, "message": {"id": f"m{draft_id}"}}
+        return self.service.request("drafts.create", handler)
+
+    def update(self, userId, id, body):
+        def handler():
+            if id not in self.service.drafts:
+                raise http_error("not_found")
+            self.service.drafts[id] = body["message"]
+            return {"id": id}
+        return self.service.request("drafts.update", handler)
+
+    def send(self, userId, body):
+        def handler():
+            with self.service._lock:
+                if self.service.drafts.pop(body["id"], None) is None:
+                    raise http_error("not_found")
+                self.service.sent += 1
+                return {"id": f"sent{self.service.sent:09d}", "labelIds": ["SENT"]}
+        return self.service.request("drafts.send", handler)
+
+    def delete(self, userId, id):
+        def handler():
+            if self.service.drafts.pop(id, None) is None:
+                raise http_error("not_found")
+            return ""
+        return self.service.request("drafts.delete", handler)
+
+
+class _History:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, startHistoryId, pageToken=None, maxResults=100, **kwargs):
+        mailbox = self.service.mailbox
+
+        def handler():
+            start = int(pageToken or startHistoryId)
+            end = min(start + maxResults, mailbox.size)
+            added = [{"message": {"id": mailbox.message_id(i), "threadId": mailbox.message_id(i)}}
+                     for i in range(start, end)]
+            result = {"history": [{"id": str(start + 1), "messagesAdded": added}] if added else [],
+                      "historyId": str(mailbox.size)}
+            if end < mailbox.size:
+                result["nextPageToken"] = str(end)
+            return result
+        return self.service.request("history.list", handler)
+
+
+class _Threads:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, userId, id, format="full", **kwargs):
+        return self.service.request("threads.get", lambda: self.service.mailbox.thread(id))
+
+
+class FakePeopleService(_Transport):
+    """
+    `people().get(resourceName="people/me")` for the user's display name.
+    """
+
+    def __init__(self, name="Me Example", profile=None):
+        super().__init__(profile)
+        self.name = name
+
+    def people(self):
+        return self
+
+    def get(self, resourceName, personFields=None, **kwargs):
+        return self.request("people.get", lambda: {"resourceName": resourceName,
+                                                  "names": [{"displayName": self.name}]})
@@ -1,8 +1,78 @@
 import sys
-import os 
+import os
+import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
+from dotenv import load_dotenv
+
+# Settings are read from the environment when each module is imported, so .env is loaded first (and only here)
+load_dotenv()
+
+from src.utils.log import configure_logging, get_logger
+from src.utils.metrics import METRICS_PORT, start_metrics_server, write_run_report
 from src.services.gmail_service import process_and_respond_to_email
+from src.services.daemon import main as run_daemon
+from src.services.review_queue import run_review
+from src.services.supervisor import ACCOUNTS_FILE, run_accounts
+from src.authentication.gmail_auth import authenticate_gmail, TOKEN_FILE
+
+# Where the JSON run report is written when --report isn't given; empty means no report
+RUN_REPORT_PATH = os.getenv("RUN_REPORT_PATH", "")
+
+logger = get_logger("main")
 
 if __name__ == "__main__":
-    process_and_respond_to_email()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Intelligent Email Assistant")
+    parser.add_argument("--daemon", action="store_true", help="keep running and process new mail continuously")
+    parser.add_argument("--review", action="store_true",
+                        help="approve, edit or reject the drafted replies of complex emails, then send them")
+    parser.add_argument("--approve", metavar="IDS", help="approve these reviews without prompting ('all' or '1,4-6')")
+    parser.add_argument("--reject", metavar="IDS", help="reject these reviews without prompting ('all' or '1,4-6')")
+    parser.add_argument("--unattended", action="store_true",
+                        help="don't stream draft replies to the terminal (cron jobs, mailbox workers)")
+    parser.add_argument("--accounts", metavar="FILE", default=ACCOUNTS_FILE,
+                        help="serve every mailbox of this config file, one worker process each (with --daemon, continuously)")
+    parser.add_argument("--worker", action="store_true",
+                        help="serve a single mailbox even when ACCOUNTS_FILE is set (used by the --accounts supervisor)")
+    parser.add_argument("--login", action="store_true",
+                        help="sign in to the Google account (with --accounts, every mailbox without a token) and exit")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics (0 = off)")
+    parser.add_argument("--report", default=RUN_REPORT_PATH, help="write a JSON run report to this file on exit")
+    parser.add_argument("--log-format", choices=["text", "json"], help="log line format (default LOG_FORMAT or text)")
+    args = parser.parse_args()
+
+    configure_logging(fmt=args.log_format)
+
+    # Workers inherit ACCOUNTS_FILE (and reload .env), so only the flag keeps them from supervising in turn
+    if args.accounts and not args.worker:
+        # The supervisor only runs workers; each one serves its own metrics and reports
+        worker_args = ["--log-format", args.log_format] if args.log_format else []
+        if not args.daemon:
+            worker_args.append("--unattended")
+        sys.exit(run_accounts(args.accounts, daemon=args.daemon, login=args.login, worker_args=worker_args))
+
+    if args.login:
+        authenticate_gmail()
+        logger.info("Signed in", extra={"token_file": os.path.abspath(TOKEN_FILE)})
+        sys.exit(0)
+
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = start_metrics_server(args.metrics_port)
+        logger.info("Serving metrics", extra={"url": f"http://127.0.0.1:{metrics_server.server_address[1]}/metrics"})
+
+    try:
+        if args.review or args.approve or args.reject:
+            run_review(approve=args.approve, reject=args.reject)
+        elif args.daemon:
+            run_daemon()
+        else:
+            process_and_respond_to_email(interactive=not args.unattended)
+    finally:
+        if args.report:
+            mode = "review" if args.review or args.approve or args.reject else "daemon" if args.daemon else "once"
+            write_run_report(args.report, {"mode": mode})
+            logger.info("Run report written", extra={"path": args.report})
+        if metrics_server is not None:
+            metrics_server.shutdown()
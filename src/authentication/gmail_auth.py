@@ -1,8 +1,13 @@
 import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+import sys
+import datetime
+import threading
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 # Define the required Gmail API scopes
 SCOPES = [
@@ -16,27 +21,183 @@ SCOPES = [
     "https://www.googleapis.com/auth/calendar.events"
 ]
 
+# OAuth token of the mailbox and the OAuth client it was issued to; one pair per account in multi-mailbox mode
+TOKEN_FILE = os.getenv("GMAIL_TOKEN_FILE", "token.json")
+CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+
+# Refresh the access token this long before it actually expires
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Socket timeout (seconds) for the pooled HTTP connections used by the API clients
+HTTP_TIMEOUT = int(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))
+
+# Discovery documents the API clients are built from. `{name}.{version}.json` files here win over the
+# copies bundled with google-api-python-client; APIs it doesn't bundle are fetched once and saved here
+DISCOVERY_DIR = os.getenv("GOOGLE_DISCOVERY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery"))
+DISCOVERY_URL = "https://{name}.googleapis.com/$discovery/rest?version={version}"
+
+# Process-wide credentials, loaded once and refreshed in place
+_creds = None
+_creds_lock = threading.Lock()
+
+# httplib2 connections aren't thread-safe, so every thread keeps its own built clients
+_local = threading.local()
+
+# When set, `get_service` returns `_service_factory(name, version)` instead of building a real client
+_service_factory = None
+
+# Discovery documents read this process, shared by the clients of every thread
+_discovery_docs = {}
+_discovery_lock = threading.Lock()
+
 
 def authenticate_gmail():
     """
     Authenticate with Gmail API using OAuth2.
-    Handles token refresh and stores credentials in 'token.json'.
+    Handles token refresh and stores credentials in TOKEN_FILE ('token.json' by default).
+
+    Credentials are read from disk once per process. Later calls return the
+    same object, refreshing it shortly before it expires; because clients hold
+    a reference to it, they pick up the new token too.
+    """
+    global _creds
+    with _creds_lock:
+        if _creds is None:
+            _creds = _load_credentials()
+        elif _needs_refresh(_creds):
+            _refresh_credentials(_creds)
+        return _creds
+
+
+def _load_credentials():
+    """
+    Loads credentials from TOKEN_FILE, running the OAuth flow if there are none.
     """
+    from google.oauth2.credentials import Credentials
+
     creds = None
     # Load existing credentials if available
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+    if os.path.exists(TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+
+    if creds and _needs_refresh(creds):
+        _refresh_credentials(creds)
 
     # If no valid credentials, perform OAuth flow
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        # Save credentials for future use
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    
-    return creds
\ No newline at end of file
+    elif not creds or not creds.valid:
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
+        creds = flow.run_local_server(port=0)
+        _save_credentials(creds)
+
+    return creds
+
+
+def _needs_refresh(creds):
+    """
+    True when the access token has expired or will expire within REFRESH_MARGIN.
+    """
+    if not creds.refresh_token:
+        return False
+    if not creds.valid:
+        return True
+    # google-auth stores expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry is not None and creds.expiry - REFRESH_MARGIN <= now
+
+
+def _refresh_credentials(creds):
+    from google.auth.transport.requests import Request
+
+    creds.refresh(Request())
+    _save_credentials(creds)
+
+
+def _save_credentials(creds):
+    # Save credentials for future use
+    os.makedirs(os.path.dirname(os.path.abspath(TOKEN_FILE)), exist_ok=True)
+    with open(TOKEN_FILE, "w") as token:
+        token.write(creds.to_json())
+
+
+def get_service(name, version):
+    """
+    Returns a Google API client (e.g. `get_service("gmail", "v1")`), built once per thread.
+
+    Each client uses its own keep-alive HTTP connection, so repeated calls
+    reuse the open connection instead of reconnecting. Clients are built from
+    `discovery_document`, never from a discovery request.
+    """
+    if _service_factory is not None:
+        return _service_factory(name, version)
+
+    creds = authenticate_gmail()
+
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (name, version)
+    if key not in services:
+        # Imported here: the client library takes a few hundred ms to import, which runs
+        # that never reach the API (--help, --login, fakes) shouldn't pay
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        services[key] = build_from_document(discovery_document(name, version), http=http)
+    return services[key]
+
+
+def discovery_document(name, version):
+    """
+    Returns the discovery document (JSON text) of a Google API, read at most once per process.
+
+    Looked up in DISCOVERY_DIR, then among the documents bundled with
+    google-api-python-client; only an API found in neither is fetched, once,
+    and saved to DISCOVERY_DIR for every later run.
+    """
+    key = (name, version)
+    with _discovery_lock:
+        if key not in _discovery_docs:
+            _discovery_docs[key] = _load_discovery_document(name, version)
+        return _discovery_docs[key]
+
+
+def _load_discovery_document(name, version):
+    path = os.path.join(DISCOVERY_DIR, f"{name}.{version}.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    from googleapiclient.discovery_cache import get_static_doc
+
+    document = get_static_doc(name, version)
+    if document is not None:
+        return document
+
+    import httplib2
+
+    url = DISCOVERY_URL.format(name=name, version=version)
+    logger.warning("Fetching a discovery document", extra={"api": f"{name}.{version}", "path": path})
+    response, content = httplib2.Http(timeout=HTTP_TIMEOUT).request(url)
+    if response.status >= 400:
+        raise RuntimeError(f"Could not fetch the discovery document of {name} {version}: HTTP {response.status}")
+    document = content.decode("utf-8")
+    os.makedirs(DISCOVERY_DIR, exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(document)
+    os.replace(path + ".tmp", path)
+    return document
+
+
+def set_service_factory(factory):
+    """
+    Makes every `get_service(name, version)` call return `factory(name, version)`,
+    without loading credentials, e.g. to run the whole pipeline against the local
+    fakes in `benchmarks/`. Pass None to go back to real clients.
+    """
+    global _service_factory
+    _service_factory = factory
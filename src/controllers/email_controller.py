@@ -1,63 +1,215 @@
 import sys
 import os
 import base64
-from googleapiclient.discovery import build
+import codecs
+import html
+import json
+import random
+import re
+import threading
+import time
 
 # Add the parent directory to the system path to allow imports from the src folder
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-# Import the authentication function for Gmail
-from src.authentication.gmail_auth import authenticate_gmail
+# Import the shared Google API client registry
+from src.authentication.gmail_auth import get_service
+from src.utils.email_text import html_to_text, strip_quoted_reply
+from src.utils.concurrency import throttled
+from src.utils.log import get_logger
+from src.utils.metrics import EXTERNAL_CALLS, GMAIL_FETCHED, GMAIL_FETCH_BYTES
+from src.utils.rate_limiter import GMAIL_COSTS, throttle, is_rate_limit_error, retry_after_seconds
 
-def extract_email_body(payload):
+logger = get_logger(__name__)
+
+# Upper bound on the number of body bytes decoded per email (keeps huge messages out of the LLM prompt)
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", str(64 * 1024)))
+
+# Fetch headers first, and full bodies only of the emails that need them (see `fetch_emails_by_ids`)
+METADATA_FIRST = os.getenv("GMAIL_METADATA_FIRST", "1") != "0"
+
+# Headers of the metadata phase: the ones `parse_email`, triage and thread detection read
+METADATA_HEADERS = ["From", "Subject", "Date", "Message-ID", "In-Reply-To", "References",
+                    "List-Unsubscribe", "Precedence", "Auto-Submitted"]
+# Batch requests per chunk: parts failing with a 429 or 5xx are retried after a jittered backoff
+FETCH_ATTEMPTS = int(os.getenv("GMAIL_FETCH_ATTEMPTS", "3"))
+FETCH_RETRY_BASE = 0.5
+
+# Metadata responses are small, so they are batched up to Gmail's limit of 100 requests
+METADATA_BATCH_SIZE = 100
+# Partial-response masks, so Gmail leaves out labels, history ids and size estimates
+METADATA_FIELDS = "id,threadId,internalDate,snippet,payload/headers"
+FULL_FIELDS = "id,threadId,internalDate,payload"
+
+# Fetch accounting of the current cycle: messages and response bytes per format, and time spent
+# decoding bodies. Bytes are those of the message resources (JSON), excluding batch framing.
+fetch_stats = {"metadata": 0, "full": 0, "metadata_bytes": 0, "full_bytes": 0, "decode_seconds": 0.0}
+_fetch_stats_lock = threading.Lock()
+
+
+def extract_email_body(payload, max_bytes=MAX_BODY_BYTES, strip_quotes=True):
     """
     Extracts the body text from the email payload.
     Supports both plain text and HTML emails.
+
+    Walks the whole MIME tree (including nested multipart/alternative and
+    multipart/related parts) and prefers the first inline text/plain part; the
+    first text/html part is converted to text only when there is no plain part.
+    At most `max_bytes` of the part are decoded, using the charset from its
+    Content-Type header. Attachment-backed parts are skipped.
     
     Args:
         payload (dict): The payload of the email, which contains the parts of the email (like body, attachments, etc.).
+        max_bytes (int): Maximum number of decoded bytes read from the chosen part.
+        strip_quotes (bool): Remove quoted reply history before returning.
     
     Returns:
         str: The extracted body of the email, decoded from base64 and cleaned up.
     """
-    body = ""
-    
-    # Check if the email has multiple parts (e.g., plain text and HTML)
-    if "parts" in payload:
-        # Loop through all parts and extract plain text if available
-        for part in payload["parts"]:
-            if part["mimeType"] == "text/plain":  # Only extract plain text part
-                data = part["body"]["data"]  # Extract the base64-encoded data
-                body = base64.urlsafe_b64decode(data).decode()  # Decode and convert to string
-                break  
-
-    # If the email doesn't have parts, it might be a simple single-body email
-    elif "body" in payload:
-        data = payload["body"]["data"]  # Extract the base64-encoded data from the body
-        body = base64.urlsafe_b64decode(data).decode()  # Decode and convert to string
-    
+    plain_part = None
+    html_part = None
+
+    # Depth-first walk over the MIME tree, in document order
+    stack = [payload]
+    while stack and plain_part is None:
+        part = stack.pop()
+        if "parts" in part:
+            stack.extend(reversed(part["parts"]))
+            continue
+        if _is_attachment(part) or not part.get("body", {}).get("data"):
+            continue
+
+        mime_type = part.get("mimeType", "text/plain")
+        if mime_type == "text/plain":
+            plain_part = part
+        elif mime_type == "text/html" and html_part is None:
+            html_part = part
+
+    if plain_part is not None:
+        body = _decode_part(plain_part, max_bytes)
+    elif html_part is not None:
+        body = html_to_text(_decode_part(html_part, max_bytes))
+    else:
+        body = ""
+
+    if strip_quotes:
+        body = strip_quoted_reply(body)
+
     return body.strip()  # Remove any leading/trailing whitespace from the body
 
 
-def fetch_emails(max_results=1):
+def _is_attachment(part):
+    if part.get("filename"):
+        return True
+    disposition = _header(part, "Content-Disposition") or ""
+    return disposition.lower().startswith("attachment")
+
+
+def _header(part, name):
+    name = name.lower()
+    return next((h["value"] for h in part.get("headers", []) if h["name"].lower() == name), None)
+
+
+def _decode_part(part, max_bytes):
+    """
+    Decodes at most `max_bytes` of a part's base64url data using its declared charset.
+    """
+    data = part["body"]["data"]
+
+    # Every 4 base64 characters hold 3 bytes, so only the needed prefix is decoded
+    limit = -(-max_bytes // 3) * 4
+    truncated = len(data) > limit
+    data = data[:limit]
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))[:max_bytes]
+
+    charset = "utf-8"
+    match = re.search(r'charset="?([\w.:-]+)"?', _header(part, "Content-Type") or "", re.IGNORECASE)
+    if match:
+        charset = match.group(1)
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    # When the data was cut, a trailing partial multi-byte character is dropped instead of garbled
+    return decoder.decode(raw, final=not truncated)
+
+
+def parse_email(email_data):
+    """
+    Parses a Gmail message resource into the email dict used by the pipeline.
+
+    Args:
+        email_data (dict): A message resource as returned by `messages().get`.
+
+    Returns:
+        dict: The message id, thread id, receive time (epoch seconds), subject, sender and body of the email,
+        plus all headers keyed by lowercased name.
+    """
+    payload = email_data["payload"]  # Get the payload of the email (contains body and headers)
+    headers = payload["headers"]  # Extract headers like sender and subject
+
+    # Extract the subject and sender from headers
+    subject = next((header["value"] for header in headers if header["name"] == "Subject"), "No Subject")
+    sender = next((header["value"] for header in headers if header["name"] == "From"), "Unknown Sender")
+
+    # Extract the email body using the helper function
+    email_body = extract_email_body(payload)
+
+    return {
+        "id": email_data.get("id"),
+        "thread_id": email_data.get("threadId"),
+        "received_at": int(email_data["internalDate"]) / 1000 if "internalDate" in email_data else None,
+        "subject": subject,
+        "sender": sender,
+        "body": email_body,
+        "headers": {header["name"].lower(): header["value"] for header in headers},
+    }
+
+
+def parse_metadata(email_data):
+    """
+    Parses a message fetched with format=metadata into the email dict used by the pipeline.
+
+    The body is Gmail's snippet (the first ~200 characters of the text); the email
+    is marked `partial` so nothing mistakes it for the full body.
+    """
+    headers = email_data.get("payload", {}).get("headers", [])
+    subject = next((header["value"] for header in headers if header["name"] == "Subject"), "No Subject")
+    sender = next((header["value"] for header in headers if header["name"] == "From"), "Unknown Sender")
+    return {
+        "id": email_data.get("id"),
+        "thread_id": email_data.get("threadId"),
+        "received_at": int(email_data["internalDate"]) / 1000 if "internalDate" in email_data else None,
+        "subject": subject,
+        "sender": sender,
+        # Snippets come HTML-escaped (&#39;, &amp;)
+        "body": html.unescape(email_data.get("snippet", "")),
+        "headers": {header["name"].lower(): header["value"] for header in headers},
+        "partial": True,
+    }
+
+
+def fetch_emails(max_results=1, service=None):
     """
     Fetches the latest emails from the user's Gmail inbox.
     Parses sender, subject, and email body.
     
     Args:
         max_results (int): The maximum number of emails to fetch (default is 1).
+        service: An already built Gmail service (optional, built from stored credentials otherwise).
     
     Returns:
         list: A list of dictionaries containing email subject, sender, and body.
     """
 
-    # Authenticate and get credentials for Gmail API
-    creds = authenticate_gmail()
-    service = build("gmail", "v1", credentials=creds)  # Build the Gmail service
+    if service is None:
+        service = get_service("gmail", "v1")  # Reuse the Gmail service built for this thread
 
     
     # Get a list of messages from the user's inbox
-    results = service.users().messages().list(userId="me", maxResults=max_results).execute()
+    with throttled("gmail", GMAIL_COSTS["messages.list"]):
+        results = service.users().messages().list(userId="me", maxResults=max_results).execute()
     messages = results.get("messages", [])  # Get the messages from the response
 
 
@@ -65,19 +217,227 @@ def fetch_emails(max_results=1):
     # Loop through each message and extract relevant details
     for msg in messages:
         # Fetch the full message details using its ID
-        email_data = service.users().messages().get(userId="me", id=msg["id"]).execute()
-        payload = email_data["payload"]  # Get the payload of the email (contains body and headers)
-        headers = payload["headers"]  # Extract headers like sender and subject
-        
-        # Extract the subject and sender from headers
-        subject = next((header["value"] for header in headers if header["name"] == "Subject"), "No Subject")
-        sender = next((header["value"] for header in headers if header["name"] == "From"), "Unknown Sender")
-
-        # Extract the email body using the helper function
-        email_body = extract_email_body(payload)
+        with throttled("gmail", GMAIL_COSTS["messages.get"]):
+            email_data = service.users().messages().get(userId="me", id=msg["id"]).execute()
 
         # Append the extracted details to the emails list
-        emails.append({"subject": subject, "sender": sender, "body": email_body})
+        emails.append(parse_email(email_data))
 
     return emails  
 
+
+def list_message_ids(service, query=None, page_size=100, max_messages=None):
+    """
+    Walks the `nextPageToken` pagination of `messages().list` and yields message ids.
+
+    Args:
+        service: A built Gmail service.
+        query (str): Optional Gmail search query (e.g. "is:unread").
+        page_size (int): Number of ids requested per page (Gmail allows up to 500).
+        max_messages (int): Stop after this many ids (default: no limit).
+
+    Yields:
+        str: The id of each message, newest first.
+    """
+    page_token = None
+    seen = 0
+
+    while True:
+        params = {"userId": "me", "maxResults": page_size}
+        if query:
+            params["q"] = query
+        if page_token:
+            params["pageToken"] = page_token
+
+        with throttled("gmail", GMAIL_COSTS["messages.list"]):
+            results = service.users().messages().list(**params).execute()
+
+        for msg in results.get("messages", []):
+            yield msg["id"]
+            seen += 1
+            if max_messages is not None and seen >= max_messages:
+                return
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return
+
+
+def fetch_emails_batched(max_messages=None, batch_size=50, page_size=100, query=None, service=None, needs_body=None,
+                         failed=None):
+    """
+    Fetches emails through Gmail HTTP batch requests instead of one `get` per message.
+
+    Message ids are paged with `list_message_ids` and their bodies are retrieved
+    `batch_size` at a time in a single HTTP round-trip. Parsed emails are yielded
+    as soon as each batch returns, so processing can start before the whole
+    inbox has been downloaded.
+
+    Args:
+        max_messages (int): The maximum number of emails to fetch (default: the whole mailbox).
+        batch_size (int): Number of `messages().get` calls per batch request (1-100, Gmail recommends 50 or fewer).
+        page_size (int): Number of ids requested per `messages().list` page.
+        query (str): Optional Gmail search query.
+        service: An already built Gmail service (optional, built from stored credentials otherwise).
+        needs_body (callable): Fetch headers first and full bodies only where this says so (see `fetch_emails_by_ids`).
+        failed (list): Receives the ids of the messages that couldn't be retrieved (see `fetch_emails_by_ids`).
+
+    Yields:
+        dict: The parsed email, in the same shape as the entries returned by `fetch_emails`.
+    """
+    if not 1 <= batch_size <= 100:
+        raise ValueError("batch_size must be between 1 and 100 (Gmail batch limit)")
+
+    if service is None:
+        service = get_service("gmail", "v1")
+
+    message_ids = list_message_ids(service, query=query, page_size=page_size, max_messages=max_messages)
+    yield from fetch_emails_by_ids(service, message_ids, batch_size=batch_size, needs_body=needs_body, failed=failed)
+
+
+def fetch_emails_by_ids(service, message_ids, batch_size=50, needs_body=None, failed=None):
+    """
+    Fetches the given messages through Gmail batch requests, `batch_size` at a time.
+
+    With `needs_body` (and METADATA_FIRST), messages are fetched in two phases:
+    first headers and snippet only (format=metadata), METADATA_BATCH_SIZE at a
+    time, then the full message of just the emails for which `needs_body(email)`
+    is true, `batch_size` at a time. The others are yielded as they are, parsed
+    by `parse_metadata`. On a mailbox of mostly bulk mail this skips downloading
+    and decoding most bodies for about the same number of round trips.
+
+    Args:
+        service: A built Gmail service.
+        message_ids (iterable): Gmail message ids, consumed lazily.
+        batch_size (int): Number of `messages().get` calls per batch request.
+        needs_body (callable): Decides from a metadata-only email whether its full body is needed.
+        failed (list): Receives the ids of the messages that couldn't be retrieved, except those
+            Gmail reports as gone (404), so the caller can fetch them again later.
+
+    Yields:
+        dict: The parsed email for every message that could be retrieved, in list order.
+    """
+    two_phase = needs_body is not None and METADATA_FIRST
+    chunk_size = max(batch_size, METADATA_BATCH_SIZE) if two_phase else batch_size
+    chunk = []
+    for message_id in message_ids:
+        chunk.append(message_id)
+        if len(chunk) == chunk_size:
+            yield from _fetch_chunk(service, chunk, batch_size, needs_body if two_phase else None, failed)
+            chunk = []
+
+    if chunk:
+        yield from _fetch_chunk(service, chunk, batch_size, needs_body if two_phase else None, failed)
+
+
+def _fetch_chunk(service, message_ids, batch_size, needs_body, failed=None):
+    if needs_body is None:
+        yield from _fetch_batch(service, message_ids, failed=failed)
+        return
+
+    emails = {email["id"]: email for email in _fetch_batch(service, message_ids, "metadata", failed)}
+    wanted = [message_id for message_id in message_ids if message_id in emails and needs_body(emails[message_id])]
+    for start in range(0, len(wanted), batch_size):
+        emails.update((email["id"], email)
+                      for email in _fetch_batch(service, wanted[start:start + batch_size], failed=failed))
+    wanted = set(wanted)
+    for message_id in message_ids:
+        # A message whose full fetch failed is left out (and reported in `failed`), like any message that
+        # couldn't be retrieved
+        if message_id in emails and not (message_id in wanted and emails[message_id].get("partial")):
+            yield emails[message_id]
+
+
+def _fetch_batch(service, message_ids, format="full", failed=None):
+    """
+    Retrieves a chunk of messages in one batch request and yields them parsed, in list order.
+
+    Parts that fail with a 429 or 5xx are requested again in a smaller batch, up to
+    FETCH_ATTEMPTS times in all, so one throttled part doesn't drop its email. The ids
+    still missing after that, other than messages that no longer exist, go to `failed`.
+    """
+    responses = {}
+    retryable = []
+    throttled_errors = []
+    gone = set()
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            logger.warning("Error fetching message", extra={"message_id": request_id, "error": str(exception)})
+            # The batch itself succeeded, so count the failed parts here
+            if is_rate_limit_error(exception):
+                EXTERNAL_CALLS.inc(service="gmail", outcome="rate_limited")
+                throttled_errors.append(exception)
+                retryable.append(request_id)
+            else:
+                EXTERNAL_CALLS.inc(service="gmail", outcome="error")
+                status = getattr(getattr(exception, "resp", None), "status", None)
+                if isinstance(status, int) and status >= 500:
+                    retryable.append(request_id)
+                elif status == 404:
+                    # Deleted since it was listed: there is nothing to fetch again
+                    gone.add(request_id)
+            return
+        responses[request_id] = response
+
+    if format == "metadata":
+        params = {"format": "metadata", "metadataHeaders": METADATA_HEADERS, "fields": METADATA_FIELDS}
+    else:
+        params = {"format": "full", "fields": FULL_FIELDS}
+
+    pending = list(message_ids)
+    for attempt in range(FETCH_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, FETCH_RETRY_BASE * 2 ** attempt))
+        retryable.clear()
+        throttled_errors.clear()
+        batch = service.new_batch_http_request(callback=callback)
+        for message_id in pending:
+            batch.add(service.users().messages().get(userId="me", id=message_id, **params), request_id=message_id)
+
+        # Every request inside a batch counts against the quota on its own
+        with throttled("gmail", GMAIL_COSTS["messages.get"] * len(pending)):
+            batch.execute()
+        if throttled_errors:
+            throttle("gmail", retry_after_seconds(throttled_errors[0]))
+        pending = list(retryable)
+        if not pending:
+            break
+
+    if failed is not None:
+        failed.extend(message_id for message_id in message_ids if message_id not in responses and message_id not in gone)
+    fetched = [responses[message_id] for message_id in message_ids if message_id in responses]
+    size = sum(len(json.dumps(resource, separators=(",", ":"))) for resource in fetched)
+    start = time.perf_counter()
+    parse = parse_metadata if format == "metadata" else parse_email
+    emails = [parse(resource) for resource in fetched]
+    decode_seconds = time.perf_counter() - start
+
+    GMAIL_FETCHED.inc(len(fetched), format=format)
+    GMAIL_FETCH_BYTES.inc(size, format=format)
+    with _fetch_stats_lock:
+        fetch_stats[format] += len(fetched)
+        fetch_stats[f"{format}_bytes"] += size
+        fetch_stats["decode_seconds"] += decode_seconds
+    yield from emails
+
+
+def get_fetch_stats(reset=False):
+    """
+    Returns the fetch accounting of the current cycle (see `fetch_stats`).
+
+    Args:
+        reset (bool): Start a new cycle after reading the counters.
+    """
+    with _fetch_stats_lock:
+        stats = dict(fetch_stats)
+        if reset:
+            fetch_stats.update(metadata=0, full=0, metadata_bytes=0, full_bytes=0, decode_seconds=0.0)
+    return stats
+
+
+def format_fetch_stats(stats):
+    return (f"Fetch: {stats['metadata']} header-only and {stats['full']} full message(s), "
+            f"{(stats['metadata_bytes'] + stats['full_bytes']) / 1024:.1f} KiB "
+            f"({stats['full_bytes'] / 1024:.1f} KiB of full messages), "
+            f"{stats['decode_seconds'] * 1000:.1f} ms decoding")
@@ -0,0 +1,150 @@
+import json
+import sys
+import os
+from googleapiclient.errors import HttpError
+
+# Add the parent directory to the system path to allow imports from the src folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.authentication.gmail_auth import get_service
+from src.controllers.email_controller import fetch_emails_by_ids, list_message_ids
+from src.db.database import get_sync_state, set_sync_state
+from src.utils.concurrency import throttled
+from src.utils.log import get_logger
+from src.utils.rate_limiter import GMAIL_COSTS
+
+logger = get_logger(__name__)
+
+# Key under which the last processed Gmail historyId is stored in the sync_state table
+HISTORY_CHECKPOINT_KEY = "gmail_history_id"
+
+# Key under which the messages that couldn't be fetched are kept, {message id: failed syncs}, to be fetched again
+FAILED_FETCHES_KEY = "gmail_failed_fetches"
+
+# Upper bound on the number of messages fetched when there is no usable checkpoint
+FULL_SYNC_LIMIT = int(os.getenv("FULL_SYNC_LIMIT", "1"))
+# Syncs in a row a message may fail to fetch before it is given up on
+SYNC_FETCH_RETRIES = int(os.getenv("SYNC_FETCH_RETRIES", "5"))
+
+
+def list_new_message_ids(service, start_history_id, label_id="INBOX"):
+    """
+    Lists the messages added to the mailbox since `start_history_id` using `users.history.list`.
+
+    Args:
+        service: A built Gmail service.
+        start_history_id (str): The checkpoint to read changes from.
+        label_id (str): Only report messages added with this label.
+
+    Returns:
+        tuple: (list of new message ids in arrival order, latest historyId of the mailbox).
+
+    Raises:
+        HttpError: With status 404 when the checkpoint is too old for Gmail to replay.
+    """
+    message_ids = []
+    seen = set()
+    latest_history_id = start_history_id
+    page_token = None
+
+    while True:
+        params = {
+            "userId": "me",
+            "startHistoryId": start_history_id,
+            "historyTypes": ["messageAdded"],
+            "labelId": label_id,
+        }
+        if page_token:
+            params["pageToken"] = page_token
+
+        with throttled("gmail", GMAIL_COSTS["history.list"]):
+            results = service.users().history().list(**params).execute()
+
+        for record in results.get("history", []):
+            for added in record.get("messagesAdded", []):
+                message_id = added["message"]["id"]
+                if message_id not in seen:
+                    seen.add(message_id)
+                    message_ids.append(message_id)
+
+        latest_history_id = results.get("historyId", latest_history_id)
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return message_ids, latest_history_id
+
+
+def sync_emails(service=None, full_sync_limit=FULL_SYNC_LIMIT, batch_size=50, needs_body=None):
+    """
+    Yields only the emails that arrived since the previous sync.
+
+    The last seen Gmail historyId is checkpointed in the local database. When a
+    checkpoint exists, only the delta is pulled through `users.history.list`.
+    Without one (first run), or when Gmail reports the checkpoint as expired, a
+    bounded full resync fetches the newest `full_sync_limit` messages instead.
+
+    The new checkpoint is written once the generator has been fully consumed,
+    so an interrupted run replays its messages on the next cycle rather than
+    losing them. Messages that still can't be fetched after the batch retries
+    are saved and fetched again, ahead of the new ones, by the next syncs (at
+    most SYNC_FETCH_RETRIES in a row), since the checkpoint moves past them.
+
+    Args:
+        service: An already built Gmail service (optional, built from stored credentials otherwise).
+        full_sync_limit (int): Maximum number of messages fetched by a full resync.
+        batch_size (int): Number of messages retrieved per Gmail batch request.
+        needs_body (callable): Decides from headers and snippet whether an email's full body is
+            fetched; the others are yielded header-only (see `fetch_emails_by_ids`).
+
+    Yields:
+        dict: Parsed emails, as returned by `fetch_emails` (or `parse_metadata`).
+    """
+    if service is None:
+        service = get_service("gmail", "v1")
+
+    checkpoint = get_sync_state(HISTORY_CHECKPOINT_KEY)
+    retries = json.loads(get_sync_state(FAILED_FETCHES_KEY) or "{}")
+    failed = []
+
+    if checkpoint:
+        try:
+            message_ids, latest_history_id = list_new_message_ids(service, checkpoint)
+        except HttpError as error:
+            if error.resp.status != 404:
+                raise
+            logger.info("History checkpoint expired, running a full resync", extra={"history_id": checkpoint})
+        else:
+            if message_ids:
+                logger.info("Incremental sync", extra={"messages": len(message_ids), "history_id": checkpoint})
+            message_ids = list(retries) + [message_id for message_id in message_ids if message_id not in retries]
+            yield from fetch_emails_by_ids(service, message_ids, batch_size=batch_size, needs_body=needs_body,
+                                           failed=failed)
+            _save_failed_fetches(retries, failed)
+            set_sync_state(HISTORY_CHECKPOINT_KEY, latest_history_id)
+            return
+
+    # Read the mailbox historyId before listing so no message slips between the two calls
+    with throttled("gmail", GMAIL_COSTS["getProfile"]):
+        profile = service.users().getProfile(userId="me").execute()
+    logger.info("Full sync", extra={"limit": full_sync_limit})
+    newest = list_message_ids(service, max_messages=full_sync_limit)
+    message_ids = list(retries) + [message_id for message_id in newest if message_id not in retries]
+    yield from fetch_emails_by_ids(service, message_ids, batch_size=batch_size, needs_body=needs_body, failed=failed)
+    _save_failed_fetches(retries, failed)
+    set_sync_state(HISTORY_CHECKPOINT_KEY, profile["historyId"])
+
+
+def _save_failed_fetches(retries, failed):
+    """
+    Keeps the messages of this sync that couldn't be fetched for the next one, counting failed syncs per message.
+    """
+    remaining = {}
+    for message_id in failed:
+        attempts = retries.get(message_id, 0) + 1
+        if attempts >= SYNC_FETCH_RETRIES:
+            logger.error("Giving up on fetching message", extra={"message_id": message_id, "syncs": attempts})
+        else:
+            remaining[message_id] = attempts
+    if remaining:
+        logger.warning("Messages will be fetched again on the next sync", extra={"messages": len(remaining)})
+    if remaining or retries:
+        set_sync_state(FAILED_FETCHES_KEY, json.dumps(remaining))
@@ -1,47 +1,801 @@
 import sqlite3
 import os
+import threading
+import time
+
+# Database file path, stored in the same directory as the script unless EMAIL_DB_PATH points elsewhere
+DB_PATH = os.getenv("EMAIL_DB_PATH", os.path.join(os.path.dirname(__file__), "emails.db"))
+
+# Seconds a connection waits for another writer (e.g. a queue worker thread) to release the database
+DB_TIMEOUT = 30
+
+# Every thread keeps one long-lived connection (sqlite3 connections must not be shared across threads)
+_local = threading.local()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id TEXT,
+        thread_id TEXT,
+        sender TEXT,
+        subject TEXT,
+        body TEXT,
+        received_at REAL,
+        status TEXT NOT NULL DEFAULT 'received',
+        created_at REAL NOT NULL DEFAULT (strftime('%s', 'now'))
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS unprocessed_emails (
+        message_id TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 1,
+        error TEXT,
+        updated_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)',
+    '''
+    CREATE TABLE IF NOT EXISTS outbound_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_outbound_ready ON outbound_actions (status, next_attempt_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS dead_letters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        last_error TEXT,
+        failed_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS search_cache (
+        query TEXT PRIMARY KEY,
+        results TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS calendar_events (
+        event_id TEXT PRIMARY KEY,
+        summary TEXT,
+        start_ts REAL NOT NULL,
+        end_ts REAL NOT NULL,
+        all_day INTEGER NOT NULL DEFAULT 0,
+        transparent INTEGER NOT NULL DEFAULT 0,
+        source_key TEXT
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_calendar_events_start ON calendar_events (start_ts)',
+    'CREATE INDEX IF NOT EXISTS idx_calendar_events_source ON calendar_events (source_key)',
+    '''
+    CREATE TABLE IF NOT EXISTS thread_cache (
+        thread_id TEXT PRIMARY KEY,
+        message_ids TEXT NOT NULL,
+        turns TEXT NOT NULL,
+        naive_tokens INTEGER NOT NULL,
+        fetched_at REAL NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS reply_index (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id TEXT,
+        shingles BLOB NOT NULL,
+        reply TEXT NOT NULL,
+        urgency TEXT NOT NULL,
+        category TEXT NOT NULL,
+        specifics TEXT,
+        uses INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        last_used REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS reply_index_bands (
+        band_key INTEGER NOT NULL,
+        reply_id INTEGER NOT NULL,
+        PRIMARY KEY (band_key, reply_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS pending_reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id TEXT UNIQUE,
+        sender TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        email TEXT NOT NULL,
+        reply TEXT NOT NULL,
+        meetings TEXT NOT NULL,
+        urgency TEXT NOT NULL,
+        category TEXT NOT NULL,
+        draft_id TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        edited INTEGER NOT NULL DEFAULT 0,
+        reused_from TEXT,
+        created_at REAL NOT NULL,
+        decided_at REAL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_pending_reviews_status ON pending_reviews (status, created_at)',
+]
+
+# Created after the column migration, since older databases may lack the indexed columns
+EMAIL_INDEXES = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_message_id ON emails (message_id)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails (sender, received_at)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_thread ON emails (thread_id, received_at)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_received_at ON emails (received_at)',
+]
+
+# Columns added to the original (sender, subject, body) emails table
+EMAIL_COLUMNS = {
+    "message_id": "TEXT",
+    "thread_id": "TEXT",
+    "received_at": "REAL",
+    "status": "TEXT NOT NULL DEFAULT 'received'",
+    "created_at": "REAL",
+}
+
+
+def get_connection():
+    """
+    Returns this thread's long-lived connection to DB_PATH, opening it on first use.
+
+    Connections run in WAL mode so the pipeline, queue workers and readers
+    don't block each other, and the schema is created once per database file.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    _local.conn, _local.path = conn, DB_PATH
+
+    with _init_lock:
+        if DB_PATH not in _initialized_paths:
+            _create_schema(conn)
+            _initialized_paths.add(DB_PATH)
+    return conn
+
+
+def close_connection():
+    """
+    Closes this thread's connection (it is reopened on the next call).
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _create_schema(conn):
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+        # Databases created by earlier versions only have sender, subject and body
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(emails)')}
+        for column, definition in EMAIL_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE emails ADD COLUMN {column} {definition}')
+
+        # Replies indexed by earlier versions have no specifics and are never reused
+        if 'specifics' not in {row[1] for row in conn.execute('PRAGMA table_info(reply_index)')}:
+            conn.execute('ALTER TABLE reply_index ADD COLUMN specifics TEXT')
+        if 'reused_from' not in {row[1] for row in conn.execute('PRAGMA table_info(pending_reviews)')}:
+            conn.execute('ALTER TABLE pending_reviews ADD COLUMN reused_from TEXT')
+
+        for statement in EMAIL_INDEXES:
+            conn.execute(statement)
 
-# Database file path, stored in the same directory as the script
-DB_PATH = os.path.join(os.path.dirname(__file__), "emails.db")
 
 def init_db():
     """
-    Initializes the SQLite database and creates a table for storing emails.
-    If the table already exists, it won't be created again.
-    """
-    conn = sqlite3.connect(DB_PATH)  # Connect to the SQLite database (it will create the file if it doesn't exist)
-    cursor = conn.cursor()  # Create a cursor object to interact with the database
-    
-    # Create the 'emails' table if it doesn't exist
-    cursor.execute(''' 
-        CREATE TABLE IF NOT EXISTS emails (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,  # Auto-increment primary key
-            sender TEXT,  # Sender of the email
-            subject TEXT,  # Subject of the email
-            body TEXT  # Body content of the email
-        )
-    ''')
-    
-    conn.commit()  # Commit changes (save the table structure)
-    conn.close()  # Close the database connection
+    Initializes the SQLite database and creates the tables and indexes.
+    If they already exist, they won't be created again.
+    """
+    get_connection()
+
 
 def store_emails(emails):
     """
-    Stores a list of emails in the database.
-    
-    :param emails: List of dictionaries with 'sender', 'subject', and 'body' keys.
-    Each dictionary represents an email.
-    """
-    conn = sqlite3.connect(DB_PATH)  # Connect to the SQLite database
-    cursor = conn.cursor()  # Create a cursor object to interact with the database
-    
-    # Iterate over the list of emails and insert each email into the database
-    for email in emails:
-        cursor.execute('''
-            INSERT INTO emails (sender, subject, body) 
-            VALUES (?, ?, ?)
-        ''', (email["sender"], email["subject"], email["body"]))
-
-    
-    conn.commit()  # Commit changes (save the emails into the database)
-    conn.close()  # Close the database connection
+    Stores a list of emails in the database in a single transaction.
+
+    :param emails: List of dictionaries with 'sender', 'subject', and 'body' keys, plus optional
+    'id' (Gmail message id), 'thread_id', 'received_at' and 'status'.
+    Emails whose Gmail message id is already stored are skipped.
+    :return: Number of emails actually inserted.
+    """
+    conn = get_connection()
+    rows = [
+        (email.get("id"), email.get("thread_id"), email["sender"], email["subject"], email["body"],
+         email.get("received_at"), email.get("status", "received"), time.time())
+        for email in emails
+    ]
+
+    with conn:
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO emails
+                (message_id, thread_id, sender, subject, body, received_at, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return conn.total_changes - before
+
+
+def update_email_status(message_id, status):
+    """
+    Updates the processing status of a stored email (e.g. 'auto_replied', 'pending_review').
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('UPDATE emails SET status = ? WHERE message_id = ?', (status, message_id))
+
+
+def get_thread_emails(thread_id):
+    """
+    Returns the stored emails of a Gmail thread, oldest first.
+    """
+    conn = get_connection()
+    cursor = conn.execute('''
+        SELECT message_id, thread_id, sender, subject, body, received_at, status
+        FROM emails WHERE thread_id = ? ORDER BY received_at
+    ''', (thread_id,))
+    columns = ("id", "thread_id", "sender", "subject", "body", "received_at", "status")
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def get_recent_emails(limit=50, sender=None):
+    """
+    Returns the most recently received emails, optionally only those from `sender`.
+    """
+    conn = get_connection()
+    query = 'SELECT message_id, thread_id, sender, subject, received_at, status FROM emails'
+    params = []
+    if sender:
+        query += ' WHERE sender = ?'
+        params.append(sender)
+    query += ' ORDER BY received_at DESC LIMIT ?'
+    params.append(limit)
+
+    columns = ("id", "thread_id", "sender", "subject", "received_at", "status")
+    return [dict(zip(columns, row)) for row in conn.execute(query, params).fetchall()]
+
+
+def get_sync_state(key):
+    """
+    Reads a sync checkpoint from the database.
+
+    :param key: Name of the checkpoint (e.g. 'gmail_history_id').
+    :return: The stored value, or None if the checkpoint was never written.
+    """
+    conn = get_connection()
+    row = conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_sync_state(key, value):
+    """
+    Writes (or overwrites) a sync checkpoint in the database.
+
+    :param key: Name of the checkpoint.
+    :param value: Value to store; converted to a string.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO sync_state (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, str(value)))
+
+
+def add_unprocessed_emails(message_ids):
+    """
+    Records that processing of these emails starts, so they can be picked up again if it fails or
+    never finishes. An email already recorded counts one more attempt.
+
+    :param message_ids: Gmail message ids.
+    """
+    conn = get_connection()
+    now = time.time()
+    with conn:
+        conn.executemany('''
+            INSERT INTO unprocessed_emails (message_id, updated_at) VALUES (?, ?)
+            ON CONFLICT(message_id) DO UPDATE SET attempts = attempts + 1, updated_at = excluded.updated_at
+        ''', [(message_id, now) for message_id in message_ids])
+
+
+def finish_unprocessed_email(message_id, error=None):
+    """
+    Ends an attempt at processing an email: forgets it on success, keeps it with `error` otherwise.
+
+    :return: Number of attempts made so far.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute('SELECT attempts FROM unprocessed_emails WHERE message_id = ?', (message_id,)).fetchone()
+        if error is None:
+            conn.execute('DELETE FROM unprocessed_emails WHERE message_id = ?', (message_id,))
+        else:
+            conn.execute('UPDATE unprocessed_emails SET error = ?, updated_at = ? WHERE message_id = ?',
+                         (error, time.time(), message_id))
+    return row[0] if row else 0
+
+
+def get_unprocessed_emails(max_attempts):
+    """
+    Ids of the emails whose processing failed or never finished, with fewer than `max_attempts` attempts,
+    oldest first.
+    """
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT message_id FROM unprocessed_emails WHERE attempts < ? ORDER BY updated_at
+    ''', (max_attempts,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def get_cached_llm_response(key):
+    """
+    Looks up a cached LLM response and marks it as recently used.
+
+    :param key: Cache key (hash of the normalized input, prompt version and model).
+    :return: The stored JSON string, or None if it is missing or expired.
+    """
+    now = time.time()
+    conn = get_connection()
+
+    row = conn.execute('SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?', (key, now)).fetchone()
+    if row:
+        with conn:
+            conn.execute('UPDATE llm_cache SET last_access = ? WHERE key = ?', (now, key))
+
+    return row[0] if row else None
+
+
+def put_cached_llm_response(key, value, ttl, max_entries):
+    """
+    Stores an LLM response, then evicts expired entries and the least recently
+    used ones beyond `max_entries`.
+
+    :param key: Cache key.
+    :param value: JSON string to store.
+    :param ttl: Seconds the entry stays valid.
+    :param max_entries: Maximum number of entries kept in the cache.
+    """
+    now = time.time()
+    conn = get_connection()
+
+    with conn:
+        conn.execute('''
+            INSERT INTO llm_cache (key, value, created_at, expires_at, last_access) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, created_at = excluded.created_at,
+                expires_at = excluded.expires_at, last_access = excluded.last_access
+        ''', (key, value, now, now + ttl, now))
+
+        conn.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+        conn.execute('''
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+
+
+def enqueue_action(kind, payload, idempotency_key):
+    """
+    Adds an outbound action (reply, Slack alert, calendar event) to the queue.
+
+    :param kind: Handler name, e.g. 'reply'.
+    :param payload: JSON string with everything the handler needs.
+    :param idempotency_key: Unique key; an action with the same key is never queued twice.
+    :return: True if the action was queued, False if it was a duplicate.
+    """
+    now = time.time()
+    conn = get_connection()
+
+    with conn:
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO outbound_actions
+                (kind, payload, idempotency_key, status, attempts, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)
+        ''', (kind, payload, idempotency_key, now, now, now))
+        return cursor.rowcount == 1
+
+
+def claim_next_action():
+    """
+    Atomically marks the oldest due pending action as in progress and returns it.
+
+    :return: Dict with 'id', 'kind', 'payload', 'idempotency_key' and 'attempts', or None if nothing is due.
+    """
+    now = time.time()
+    conn = get_connection()
+
+    with conn:
+        row = conn.execute('''
+            UPDATE outbound_actions SET status = 'in_progress', updated_at = ?
+            WHERE id = (
+                SELECT id FROM outbound_actions
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at LIMIT 1
+            )
+            RETURNING id, kind, payload, idempotency_key, attempts
+        ''', (now, now)).fetchone()
+
+    if not row:
+        return None
+    return dict(zip(("id", "kind", "payload", "idempotency_key", "attempts"), row))
+
+
+def complete_action(action_id):
+    """
+    Marks an action as successfully done (the row is kept so its idempotency key stays taken).
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE outbound_actions SET status = 'done', attempts = attempts + 1, last_error = NULL, updated_at = ?
+            WHERE id = ?
+        ''', (time.time(), action_id))
+
+
+def retry_action(action_id, error, next_attempt_at):
+    """
+    Puts a failed action back in the queue to be retried at `next_attempt_at` (epoch seconds).
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE outbound_actions
+            SET status = 'pending', attempts = attempts + 1, last_error = ?, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (str(error), next_attempt_at, time.time(), action_id))
+
+
+def dead_letter_action(action_id, error):
+    """
+    Gives up on an action: marks it dead and copies it into the dead_letters table.
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE outbound_actions SET status = 'dead', attempts = attempts + 1, last_error = ?, updated_at = ?
+            WHERE id = ?
+        ''', (str(error), now, action_id))
+        conn.execute('''
+            INSERT INTO dead_letters (action_id, kind, payload, idempotency_key, attempts, last_error, failed_at)
+            SELECT id, kind, payload, idempotency_key, attempts, last_error, ? FROM outbound_actions WHERE id = ?
+        ''', (now, action_id))
+
+
+def requeue_stale_actions(older_than):
+    """
+    Returns actions stuck 'in_progress' for more than `older_than` seconds (e.g. after a crash) to the queue.
+
+    :return: Number of actions requeued.
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('''
+            UPDATE outbound_actions SET status = 'pending', next_attempt_at = ?, updated_at = ?
+            WHERE status = 'in_progress' AND updated_at < ?
+        ''', (now, now, now - older_than))
+        return cursor.rowcount
+
+
+def count_ready_actions():
+    """
+    Counts pending actions that are already due.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT COUNT(*) FROM outbound_actions WHERE status = 'pending' AND next_attempt_at <= ?",
+        (time.time(),)
+    ).fetchone()
+    return row[0]
+
+
+def get_cached_thread(thread_id):
+    """
+    Returns the cached turns of a Gmail thread.
+
+    :return: Dict with 'message_ids' (list), 'turns' (JSON string) and 'naive_tokens', or None.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        'SELECT message_ids, turns, naive_tokens FROM thread_cache WHERE thread_id = ?', (thread_id,)
+    ).fetchone()
+    if not row:
+        return None
+    return {"message_ids": row[0].split(","), "turns": row[1], "naive_tokens": row[2]}
+
+
+def put_cached_thread(thread_id, message_ids, turns, naive_tokens):
+    """
+    Caches the parsed turns of a Gmail thread.
+
+    :param message_ids: Ids of the messages the thread had when fetched.
+    :param turns: JSON string of the parsed turns.
+    :param naive_tokens: Token count of all raw bodies concatenated (for savings metrics).
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO thread_cache (thread_id, message_ids, turns, naive_tokens, fetched_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(thread_id) DO UPDATE SET message_ids = excluded.message_ids, turns = excluded.turns,
+                naive_tokens = excluded.naive_tokens, fetched_at = excluded.fetched_at
+        ''', (thread_id, ",".join(message_ids), turns, naive_tokens, time.time()))
+
+
+def get_cached_search(query):
+    """
+    Returns the cached results of a web search.
+
+    :param query: The normalized search query.
+    :return: The stored JSON string, or None if it is missing or expired.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        'SELECT results FROM search_cache WHERE query = ? AND expires_at > ?', (query, time.time())
+    ).fetchone()
+    return row[0] if row else None
+
+
+def put_cached_search(query, results, ttl, max_entries):
+    """
+    Caches the results of a web search, then evicts expired entries and the
+    oldest ones beyond `max_entries`.
+
+    :param query: The normalized search query.
+    :param results: JSON string of the results (an empty list is cached too).
+    :param ttl: Seconds the entry stays valid.
+    """
+    now = time.time()
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO search_cache (query, results, created_at, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(query) DO UPDATE SET results = excluded.results, created_at = excluded.created_at,
+                expires_at = excluded.expires_at
+        ''', (query, results, now, now + ttl))
+
+        conn.execute('DELETE FROM search_cache WHERE expires_at <= ?', (now,))
+        conn.execute('''
+            DELETE FROM search_cache WHERE query IN (
+                SELECT query FROM search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+
+
+def upsert_calendar_events(events):
+    """
+    Stores or refreshes cached calendar events in one transaction.
+
+    :param events: Dicts with 'event_id', 'summary', 'start_ts', 'end_ts', 'all_day',
+    'transparent' and 'source_key'.
+    """
+    conn = get_connection()
+    rows = [
+        (e["event_id"], e["summary"], e["start_ts"], e["end_ts"], int(e["all_day"]), int(e["transparent"]), e["source_key"])
+        for e in events
+    ]
+    with conn:
+        conn.executemany('''
+            INSERT INTO calendar_events (event_id, summary, start_ts, end_ts, all_day, transparent, source_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(event_id) DO UPDATE SET summary = excluded.summary, start_ts = excluded.start_ts,
+                end_ts = excluded.end_ts, all_day = excluded.all_day, transparent = excluded.transparent,
+                source_key = excluded.source_key
+        ''', rows)
+
+
+def delete_calendar_events(event_ids=None, ended_before=None):
+    """
+    Removes cached calendar events by id, those that ended before a timestamp, or (with no arguments) all of them.
+    """
+    conn = get_connection()
+    with conn:
+        if event_ids is not None:
+            conn.executemany('DELETE FROM calendar_events WHERE event_id = ?', [(i,) for i in event_ids])
+        elif ended_before is not None:
+            conn.execute('DELETE FROM calendar_events WHERE end_ts < ?', (ended_before,))
+        else:
+            conn.execute('DELETE FROM calendar_events')
+
+
+def get_calendar_events_between(start_ts, end_ts):
+    """
+    Returns cached events overlapping [start_ts, end_ts), as dicts.
+    """
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT event_id, summary, start_ts, end_ts, all_day, transparent, source_key FROM calendar_events
+        WHERE start_ts < ? AND end_ts > ?
+        ORDER BY start_ts
+    ''', (end_ts, start_ts)).fetchall()
+    keys = ("event_id", "summary", "start_ts", "end_ts", "all_day", "transparent", "source_key")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def get_calendar_event_by_source(source_key):
+    """
+    Returns the id of the cached event created for `source_key`, or None.
+    """
+    conn = get_connection()
+    row = conn.execute('SELECT event_id FROM calendar_events WHERE source_key = ?', (source_key,)).fetchone()
+    return row[0] if row else None
+
+
+def put_indexed_reply(message_id, shingles, band_keys, reply, urgency, category, specifics):
+    """
+    Indexes the reply sent to the email `message_id` for near-duplicate lookups.
+
+    :param shingles: Packed shingle hashes of the email body (compared to compute similarity).
+    :param band_keys: MinHash band keys of the body; emails sharing one are candidate duplicates.
+    :param specifics: JSON list of the numbers and names the reply copied from the email.
+    :return: Id of the new index entry.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO reply_index (message_id, shingles, reply, urgency, category, specifics, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (message_id, shingles, reply, urgency, category, specifics, time.time()))
+        reply_id = cursor.lastrowid
+        conn.executemany('INSERT OR IGNORE INTO reply_index_bands (band_key, reply_id) VALUES (?, ?)',
+                         [(key, reply_id) for key in band_keys])
+    return reply_id
+
+
+def find_reply_candidates(band_keys, limit=20):
+    """
+    Returns the indexed replies sharing at least one MinHash band key, those sharing the most first.
+
+    :return: List of dicts with 'id', 'message_id', 'shingles', 'reply', 'urgency', 'category' and 'specifics'.
+    """
+    conn = get_connection()
+    placeholders = ",".join("?" * len(band_keys))
+    rows = conn.execute(f'''
+        SELECT r.id, r.message_id, r.shingles, r.reply, r.urgency, r.category, r.specifics
+        FROM (
+            SELECT reply_id, COUNT(*) AS shared FROM reply_index_bands
+            WHERE band_key IN ({placeholders}) GROUP BY reply_id ORDER BY shared DESC LIMIT ?
+        ) AS c JOIN reply_index AS r ON r.id = c.reply_id
+        ORDER BY c.shared DESC
+    ''', (*band_keys, limit)).fetchall()
+    keys = ("id", "message_id", "shingles", "reply", "urgency", "category", "specifics")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def touch_indexed_reply(reply_id):
+    """
+    Counts one reuse of an indexed reply.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('UPDATE reply_index SET uses = uses + 1, last_used = ? WHERE id = ?', (time.time(), reply_id))
+
+
+def count_indexed_replies():
+    """
+    Number of replies in the near-duplicate index.
+    """
+    conn = get_connection()
+    return conn.execute('SELECT COUNT(*) FROM reply_index').fetchone()[0]
+
+
+REVIEW_COLUMNS = ("id", "message_id", "sender", "subject", "email", "reply", "meetings", "urgency", "category",
+                  "draft_id", "status", "edited", "reused_from", "created_at", "decided_at")
+
+
+def add_pending_review(message_id, sender, subject, email, reply, meetings, urgency, category, reused_from=None):
+    """
+    Records a drafted reply waiting for an operator's decision.
+
+    :param email: JSON string of the email fields needed to send the reply later.
+    :param meetings: JSON string of the meetings to create once the reply is approved.
+    :param reused_from: Message id of the indexed email whose reply was reused, if any.
+    :return: Id of the review, or None if this email already has one.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO pending_reviews
+                (message_id, sender, subject, email, reply, meetings, urgency, category, reused_from, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (message_id, sender, subject, email, reply, meetings, urgency, category, reused_from, time.time()))
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+
+
+def get_review(review_id):
+    """
+    Returns a review as a dict (see REVIEW_COLUMNS), or None.
+    """
+    conn = get_connection()
+    row = conn.execute(f'SELECT {", ".join(REVIEW_COLUMNS)} FROM pending_reviews WHERE id = ?',
+                       (review_id,)).fetchone()
+    return dict(zip(REVIEW_COLUMNS, row)) if row else None
+
+
+def get_pending_reviews(limit=None):
+    """
+    Returns the reviews still waiting for a decision, oldest first.
+    """
+    conn = get_connection()
+    rows = conn.execute(f'''
+        SELECT {", ".join(REVIEW_COLUMNS)} FROM pending_reviews WHERE status = 'pending'
+        ORDER BY created_at, id LIMIT ?
+    ''', (-1 if limit is None else limit,)).fetchall()
+    return [dict(zip(REVIEW_COLUMNS, row)) for row in rows]
+
+
+def count_pending_reviews():
+    """
+    Counts the reviews still waiting for a decision.
+    """
+    conn = get_connection()
+    return conn.execute("SELECT COUNT(*) FROM pending_reviews WHERE status = 'pending'").fetchone()[0]
+
+
+def set_review_draft(review_id, draft_id):
+    """
+    Links a review to the Gmail draft holding its reply.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('UPDATE pending_reviews SET draft_id = ? WHERE id = ?', (draft_id, review_id))
+
+
+def decide_review(review_id, status, reply=None):
+    """
+    Moves a pending review to 'approved' or 'rejected', optionally replacing its reply with an edited one.
+
+    :return: The updated review as a dict, or None if it doesn't exist or was already decided.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(f'''
+            UPDATE pending_reviews SET status = ?, reply = COALESCE(?, reply),
+                edited = edited OR ? IS NOT NULL, decided_at = ?
+            WHERE id = ? AND status = 'pending'
+            RETURNING {", ".join(REVIEW_COLUMNS)}
+        ''', (status, reply, reply, time.time(), review_id)).fetchone()
+    return dict(zip(REVIEW_COLUMNS, row)) if row else None
@@ -1,81 +1,505 @@
-import openai
 import json
 import os
+import re
+import hashlib
+import random
+import threading
+import time
+from datetime import datetime
 
-from dotenv import load_dotenv
-load_dotenv()
+from src.db.database import get_cached_llm_response, put_cached_llm_response
+from src.utils.concurrency import throttled
+from src.utils.log import get_logger
+from src.utils.metrics import CACHE_LOOKUPS, LLM_REQUESTS, record_llm_usage
+from src.utils.rate_limiter import acquire, get_bucket
+from src.utils.tokens import count_tokens
+
+logger = get_logger(__name__)
 
 api_key = os.getenv("OPENAI_API_KEY")
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=api_key)
+# The OpenAI client, built on first use by `get_client` (importing `openai` alone takes a good part
+# of a second, which runs that need no analysis shouldn't pay); assign a client here to replace it
+client = None
+_client_lock = threading.Lock()
 
+# JSON mode (response_format) needs a model newer than the original gpt-4 snapshot
+ANALYSIS_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
 
-# Defining a funtion for genertaing reply using model api
-def generate_reply(email_body):
+# Faster model used when the primary one can't answer within the call deadline
+FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
+
+# Bump whenever ANALYSIS_PROMPT changes, so cached or stored analyses can be told apart
+PROMPT_VERSION = "analysis-v3"
+
+# Wall-clock budget (seconds) for one analysis, retries and fallback included
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+# Share of the deadline the primary model gets; the rest is kept for FALLBACK_MODEL
+PRIMARY_SHARE = float(os.getenv("LLM_PRIMARY_SHARE", "0.6"))
+# Attempts per analysis across both models; 429, 5xx, timeouts and dropped connections are retried
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+# Jittered exponential backoff between attempts: uniform(0, RETRY_BASE * 2**attempt), capped
+RETRY_BASE = 0.5
+RETRY_MAX = 8.0
+
+DEFAULT_TIMEZONE = "Asia/Kolkata"
+URGENCY_LEVELS = ("high", "normal", "low")
+CATEGORIES = ("simple", "complex")
+
+# Persistent response cache: identical (normalized) bodies reuse the stored analysis
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+cache_stats = {"hits": 0, "misses": 0}
+_cache_stats_lock = threading.Lock()
+
+ANALYSIS_PROMPT = """
+Analyze the email below and answer with a single JSON object with exactly these keys, in this order:
+  "reply": a polite, professional reply to the sender,
+  "summary": a one or two sentence summary of the email,
+  "urgency": "high", "normal" or "low",
+  "category": "simple" if a short acknowledgement answers it, otherwise "complex",
+  "meetings": a list of meetings the email asks for, each as
+      {{"title": "<Meeting Title>", "date": "YYYY-MM-DD", "time": "HH:MM:SS", "timezone": "{timezone}"}},
+      or an empty list if there are none.
+
+{thread_section}Email:
+\"\"\"{email_body}\"\"\"
+"""
+
+THREAD_SECTION = """Earlier messages in this thread, for context only (reply to the email, not to these):
+\"\"\"{thread_context}\"\"\"
+
+"""
+
+
+def cache_key(email_body, prompt_version=PROMPT_VERSION, model=None, thread_context=""):
     """
-    Generate a summary and a polite response to an email using GPT-4.
+    Content address of an LLM request: SHA-256 of the whitespace-normalized body
+    and thread context, the prompt template version and the model.
     """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an AI assistant that summarizes emails and generates professional replies."},
-            {"role": "user", "content": f"Summarize this email and generate a polite reply:\n\n{email_body}"}
-        ],
-        max_tokens=300
-    )
+    normalized = " ".join(email_body.split())
+    context = " ".join(thread_context.split())
+    material = "\x1f".join([prompt_version, model or ANALYSIS_MODEL, normalized, context])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
 
-    full_response = response.choices[0].message.content.strip()
 
-    # Split summary and reply using a delimiter
-    if "Reply:" in full_response:
-        summary, reply = full_response.split("Reply:", 1)
-        return summary.strip(), reply.strip()
-    else:
-        return "Summary not available", full_response
-    
+def get_cache_stats():
+    """
+    Returns a copy of the cache hit/miss counters for this process.
+    """
+    with _cache_stats_lock:
+        return dict(cache_stats)
 
 
-client = openai.OpenAI(api_key=api_key)  # Use env var in production!
-def extract_meeting_details(email_text):
-    """Use OpenAI LLM to extract meeting details from email text."""
-    prompt = f"""
-    Extract structured meeting details from the following email and in timezone field write Asia/Kolkata:
+def _count_cache(outcome):
+    with _cache_stats_lock:
+        cache_stats[outcome] += 1
+    CACHE_LOOKUPS.inc(cache="llm", outcome="hit" if outcome == "hits" else "miss")
+
+
+def analyze_email(email_body, thread_context="", on_reply_text=None):
+    """
+    Summarize, draft a reply, classify, and extract meetings from an email in one GPT call.
+    `thread_context` is earlier conversation history (see `build_thread_context`).
+
+    With `on_reply_text`, the completion is streamed and the callback receives the
+    reply text piece by piece as tokens arrive, long before the whole analysis is
+    done. It receives None when a failed attempt is retried and the text so far
+    should be discarded. A cached analysis is passed to it in a single piece.
+
+    Results are cached in SQLite (see `cache_key`), so a repeated or
+    whitespace-only-different body costs no API call until the entry expires
+    or is evicted.
+
+    Returns:
+        dict: {"summary", "reply", "urgency", "category", "meetings"}, validated and
+        normalized by `validate_analysis`. If the model output isn't valid JSON, the
+        raw text is returned as the reply with neutral defaults for the other keys.
+    """
+    if not LLM_CACHE_ENABLED:
+        analysis, _ = _request_analysis(email_body, thread_context, on_reply_text)
+        return analysis
+
+    key = cache_key(email_body, thread_context=thread_context)
+    cached = get_cached_llm_response(key)
+    if cached is not None:
+        _count_cache("hits")
+        analysis = json.loads(cached)
+        if on_reply_text:
+            on_reply_text(analysis["reply"])
+        return analysis
+
+    _count_cache("misses")
+    analysis, valid = _request_analysis(email_body, thread_context, on_reply_text)
+    # Unparseable output is not cached, so the next occurrence gets a fresh attempt
+    if valid:
+        put_cached_llm_response(key, json.dumps(analysis), LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES)
+    return analysis
+
+
+def _request_analysis(email_body, thread_context="", on_reply_text=None):
+    """
+    Sends the analysis request to the model.
 
-    "{email_text}"
+    Returns:
+        tuple: (analysis dict, whether the model output was valid).
+    """
+    messages = [
+        {"role": "system", "content": "You are an AI assistant that reads emails and returns a JSON analysis."},
+        {"role": "user", "content": build_prompt(email_body, thread_context)}
+    ]
+    content = complete_with_deadline(
+        messages, on_reply_text=on_reply_text, response_format={"type": "json_object"}, max_tokens=600
+    ).strip()
+
+    try:
+        return validate_analysis(json.loads(content)), True
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.warning("Couldn't parse LLM analysis, raw output used as reply", extra={"error": str(e)})
+        return {
+            "summary": "Summary not available",
+            "reply": content,
+            "urgency": "normal",
+            "category": "complex",
+            "meetings": [],
+        }, False
+
+
+def complete_with_deadline(messages, on_reply_text=None, deadline=None, **params):
+    """
+    Runs a chat completion within `deadline` seconds and returns the message content.
+
+    The primary model gets PRIMARY_SHARE of the deadline, each attempt bounded by
+    what is left of it. Rate limits, 5xx answers, timeouts and dropped connections
+    are retried after a jittered backoff; once the primary model's share is used
+    up, the remaining attempts go to FALLBACK_MODEL. With `on_reply_text` the
+    response is streamed (see `analyze_email`).
+
+    Every attempt first waits for the shared OpenAI request and token budgets
+    (see `rate_limiter`), reserving the prompt plus `max_tokens`; the unused
+    part of the reservation is handed back once the usage is known, and all of
+    it when the attempt fails. Token usage, estimated cost and the outcome of
+    every attempt go to `metrics`.
+
+    Raises:
+        TimeoutError: If the deadline passes before any attempt succeeds.
+        openai.OpenAIError: A non-retryable error, or the last retryable one.
+    """
+    deadline = deadline or LLM_DEADLINE
+    start = time.monotonic()
+    end = start + deadline
+    primary_end = start + deadline * PRIMARY_SHARE
+    estimate = sum(count_tokens(m["content"]) for m in messages) + params.get("max_tokens", 0)
+    last_error = None
+
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        now = time.monotonic()
+        if now >= end:
+            break
+
+        model = ANALYSIS_MODEL
+        attempt_end = primary_end
+        if now >= primary_end or FALLBACK_MODEL == ANALYSIS_MODEL:
+            model, attempt_end = FALLBACK_MODEL, end
+        elif attempt == LLM_MAX_ATTEMPTS:
+            # Last chance: the fallback model is the likelier one to finish in time
+            model, attempt_end = FALLBACK_MODEL, end
+
+        if model != ANALYSIS_MODEL:
+            logger.warning("Falling back to the fallback model",
+                           extra={"model": model, "deadline_left": round(end - now, 1)})
+
+        reserved = False
+        try:
+            if not acquire("openai_tokens", estimate, timeout=attempt_end - now):
+                raise TimeoutError("No OpenAI token budget left before the deadline")
+            reserved = True
+            with throttled("openai", timeout=max(0.0, attempt_end - time.monotonic())):
+                request = get_client().with_options(timeout=max(0.1, attempt_end - time.monotonic()), max_retries=0)
+                if on_reply_text is None:
+                    response = request.chat.completions.create(model=model, messages=messages, **params)
+                    content, usage = response.choices[0].message.content, getattr(response, "usage", None)
+                else:
+                    content, usage = _stream_completion(request, model, messages, on_reply_text, attempt_end, params)
+            reserved = False
+            _record_usage(model, estimate, usage)
+            LLM_REQUESTS.inc(model=model, outcome="ok")
+            return content
+        except Exception as e:
+            if reserved:
+                # A failed attempt hands its whole reservation back, so retries and the fallback don't pay twice
+                get_bucket("openai_tokens").refund(estimate)
+            if not _is_retryable(e):
+                LLM_REQUESTS.inc(model=model, outcome="error")
+                raise
+            LLM_REQUESTS.inc(model=model, outcome="retried")
+            last_error = e
+
+        if on_reply_text is not None:
+            on_reply_text(None)
 
-    Output as JSON:
-    {{
-      "title": "<Meeting Title>",
-      "date": "YYYY-MM-DD",
-      "time": "HH:MM:SS",
-      "timezone": "<TimeZone>"
-    }}
+        delay = min(_retry_delay(last_error, attempt), max(0.0, end - time.monotonic()))
+        logger.info("Retrying LLM call", extra={"delay": round(delay, 1), "attempt": attempt, "model": model,
+                                                "error": str(last_error)})
+        time.sleep(delay)
+
+    if last_error is not None:
+        raise last_error
+    raise TimeoutError(f"LLM call did not finish within {deadline:.0f}s")
+
+
+def _record_usage(model, estimate, usage):
+    """
+    Hands the unused part of the token reservation back and records the usage in `metrics`.
     """
+    if usage is None:
+        return
+    get_bucket("openai_tokens").refund(max(0, estimate - usage.total_tokens))
+    record_llm_usage(model, usage.prompt_tokens, usage.completion_tokens)
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are an AI that extracts structured meeting data."},
-            {"role": "user", "content": prompt}
-        ],
-    )
 
-    content = response.choices[0].message.content
+def _stream_completion(request, model, messages, on_reply_text, attempt_end, params):
+    """
+    Streams one completion, feeding the reply text to `on_reply_text` as it arrives.
 
-    # Optional: parse to dict (if you're confident the format is valid JSON)
+    Returns:
+        tuple: (content, usage), usage coming from the final chunk the API adds with `include_usage`.
+    """
+    extractor = ReplyStreamExtractor()
+    parts = []
+    usage = None
+    stream = request.chat.completions.create(model=model, messages=messages, stream=True,
+                                             stream_options={"include_usage": True}, **params)
     try:
-         # Parse the JSON content
-        meeting_details = json.loads(content)
-
-        # Check for missing title and replace it with "Meeting" if needed
-        if "title" in meeting_details and meeting_details["title"] == "<Meeting Title>":
-            meeting_details["title"] = "Meeting"
-
-        # Return the updated meeting details
-        return meeting_details
-    
-    except json.JSONDecodeError:
-        print("⚠️ Couldn't parse LLM response to JSON. Raw output returned.")
-        return content
-    
\ No newline at end of file
+        for chunk in stream:
+            if time.monotonic() > attempt_end:
+                raise TimeoutError(f"{model} stream passed its deadline")
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    on_reply_text(text)
+    finally:
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+    return "".join(parts), usage
+
+
+def get_client():
+    """
+    Returns the process-wide OpenAI client, building it on first use.
+    """
+    global client
+    with _client_lock:
+        if client is None:
+            import openai
+
+            client = openai.OpenAI(api_key=api_key)
+        return client
+
+
+def _is_retryable(error):
+    """
+    True for failures another attempt can fix: 429, 5xx, timeouts and connection errors.
+    """
+    import openai
+
+    if isinstance(error, (TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def _retry_delay(error, attempt):
+    """
+    Seconds before the next attempt: none after a timeout (the deadline already
+    paid for it), the server's Retry-After if it sent one, otherwise exponential
+    backoff with full jitter.
+    """
+    import openai
+
+    if isinstance(error, (TimeoutError, openai.APITimeoutError)):
+        return 0.0
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** attempt))
+
+
+class ReplyStreamExtractor:
+    """
+    Pulls the "reply" string out of a JSON object that is still being streamed.
+
+    `feed` takes the next chunk of raw model output and returns the newly
+    decoded reply text (JSON escapes resolved), or "" if there is none yet.
+    """
+
+    _START = re.compile(r'"reply"\s*:\s*"')
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None
+        self.done = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self.position is None:
+            match = self._START.search(self.buffer)
+            if not match:
+                return ""
+            self.position = match.end()
+
+        out = []
+        buffer, i = self.buffer, self.position
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence; wait for the rest of it if the chunk split it
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(buffer):
+                    break
+                code_point = _hex(buffer[i + 2:i + 6])
+                if 0xD800 <= code_point < 0xDC00:
+                    # UTF-16 surrogate pair (emoji etc.): needs the second \uXXXX too
+                    if i + 12 > len(buffer):
+                        break
+                    low = _hex(buffer[i + 8:i + 12])
+                    if 0xDC00 <= low < 0xE000:
+                        code_point = 0x10000 + ((code_point - 0xD800) << 10) + (low - 0xDC00)
+                        i += 6
+                if 0 <= code_point and not 0xD800 <= code_point < 0xE000:
+                    out.append(chr(code_point))
+                i += 6
+            else:
+                out.append(self._ESCAPES.get(code, code))
+                i += 2
+
+        self.position = i
+        return "".join(out)
+
+
+def _hex(text):
+    try:
+        return int(text, 16)
+    except ValueError:
+        return -1
+
+
+def build_prompt(email_body, thread_context=""):
+    """
+    Renders the analysis prompt, with the thread section only when there is history.
+    """
+    thread_section = THREAD_SECTION.format(thread_context=thread_context) if thread_context else ""
+    return ANALYSIS_PROMPT.format(email_body=email_body, thread_section=thread_section, timezone=DEFAULT_TIMEZONE)
+
+
+def validate_analysis(data):
+    """
+    Checks the JSON returned by the model and fills in defaults.
+
+    Raises:
+        ValueError: If the object has no usable reply.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("analysis is not a JSON object")
+
+    reply = data.get("reply")
+    if not isinstance(reply, str) or not reply.strip():
+        raise ValueError("analysis has no reply")
+
+    summary = data.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        summary = "Summary not available"
+
+    urgency = str(data.get("urgency", "normal")).lower()
+    if urgency not in URGENCY_LEVELS:
+        urgency = "normal"
+
+    category = str(data.get("category", "complex")).lower()
+    if category not in CATEGORIES:
+        category = "complex"
+
+    meetings = data.get("meetings") or []
+    if isinstance(meetings, dict):
+        meetings = [meetings]
+    meetings = [meeting for meeting in (validate_meeting(m) for m in meetings) if meeting]
+
+    return {
+        "summary": summary.strip(),
+        "reply": reply.strip(),
+        "urgency": urgency,
+        "category": category,
+        "meetings": meetings,
+    }
+
+
+def validate_meeting(meeting):
+    """
+    Normalizes one extracted meeting, or returns None if it has no usable date and time.
+    """
+    if not isinstance(meeting, dict):
+        return None
+
+    date = str(meeting.get("date", "")).strip()
+    time = str(meeting.get("time", "")).strip()
+    if re.fullmatch(r"\d{1,2}:\d{2}", time):
+        time += ":00"
+
+    try:
+        datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        logger.warning("Ignoring meeting without a valid date/time", extra={"meeting": meeting})
+        return None
+
+    title = str(meeting.get("title") or "").strip()
+    if not title or title == "<Meeting Title>":
+        title = "Meeting"
+
+    return {
+        "title": title,
+        "date": date,
+        "time": time.zfill(8),
+        "timezone": meeting.get("timezone") or DEFAULT_TIMEZONE,
+    }
+
+
+# Defining a funtion for genertaing reply using model api
+def generate_reply(email_body):
+    """
+    Generate a summary and a polite response to an email using GPT-4.
+
+    Thin view over `analyze_email`; call that directly when the meetings are needed too.
+    """
+    analysis = analyze_email(email_body)
+    return analysis["summary"], analysis["reply"]
+
+
+def extract_meeting_details(email_text):
+    """
+    Use OpenAI LLM to extract meeting details from email text.
+
+    Thin view over `analyze_email`; returns a (possibly empty) list of meeting dicts.
+    """
+    return analyze_email(email_text)["meetings"]
@@ -0,0 +1,108 @@
+import argparse
+import json
+import math
+import os
+import re
+from collections import Counter
+
+# Where the trained model is stored; the triage stage just skips the model if the file is missing
+MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", os.path.join(os.path.dirname(__file__), "triage_model.json"))
+
+# Only the start of long emails is looked at, which is where bulk mail gives itself away
+MAX_TOKENS = 400
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9']{1,24}")
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens of `text` (the first MAX_TOKENS of them).
+    """
+    return _TOKEN_RE.findall(text.lower())[:MAX_TOKENS]
+
+
+class NaiveBayesModel:
+    """
+    A multinomial Naive Bayes bag-of-words classifier, small enough to train and
+    evaluate in pure Python and to store as a JSON file.
+    """
+
+    def __init__(self, class_counts=None, token_counts=None):
+        self.class_counts = Counter(class_counts or {})
+        self.token_counts = {label: Counter(counts) for label, counts in (token_counts or {}).items()}
+        self._refresh()
+
+    def _refresh(self):
+        self.vocabulary = set()
+        for counts in self.token_counts.values():
+            self.vocabulary.update(counts)
+        self.totals = {label: sum(counts.values()) for label, counts in self.token_counts.items()}
+
+    def train(self, examples):
+        """
+        Adds labelled examples: an iterable of (text, label) pairs.
+        """
+        for text, label in examples:
+            self.class_counts[label] += 1
+            self.token_counts.setdefault(label, Counter()).update(tokenize(text))
+        self._refresh()
+        return self
+
+    def predict_proba(self, text):
+        """
+        Returns {label: probability} for `text` (Laplace-smoothed).
+        """
+        if not self.class_counts:
+            return {}
+
+        tokens = [t for t in tokenize(text) if t in self.vocabulary]
+        documents = sum(self.class_counts.values())
+        vocabulary_size = len(self.vocabulary) or 1
+
+        log_scores = {}
+        for label, count in self.class_counts.items():
+            counts = self.token_counts.get(label, Counter())
+            denominator = self.totals.get(label, 0) + vocabulary_size
+            score = math.log(count / documents)
+            for token in tokens:
+                score += math.log((counts[token] + 1) / denominator)
+            log_scores[label] = score
+
+        # Normalize in log space to avoid underflow
+        top = max(log_scores.values())
+        exp_scores = {label: math.exp(score - top) for label, score in log_scores.items()}
+        total = sum(exp_scores.values())
+        return {label: value / total for label, value in exp_scores.items()}
+
+    def save(self, path=MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"class_counts": self.class_counts, "token_counts": self.token_counts}, f)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """
+        Loads a saved model, or returns None if there is no model file.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["class_counts"], data["token_counts"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local triage model from labelled emails.")
+    parser.add_argument("examples", help='JSONL file, one {"text": ..., "label": "bulk" | "personal"} per line')
+    parser.add_argument("--output", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    with open(args.examples, encoding="utf-8") as f:
+        examples = [(row["text"], row["label"]) for row in map(json.loads, filter(str.strip, f))]
+
+    model = NaiveBayesModel().train(examples)
+    model.save(args.output)
+    print(f"Trained on {len(examples)} example(s) {dict(model.class_counts)}; saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.authentication.gmail_auth import get_service
+from src.controllers.inbox_sync import sync_emails
+from src.controllers.email_controller import fetch_emails_by_ids, get_fetch_stats, format_fetch_stats
+from src.services.gmail_service import get_gmail_user_name, process_email
+from src.services.triage import get_triage_stats, format_triage_stats, needs_full_body
+from src.services.outbound_queue import OutboundWorkerPool
+from src.db.database import init_db, add_unprocessed_emails, finish_unprocessed_email, get_unprocessed_emails
+from src.utils.rate_limiter import get_rate_stats, format_rate_stats
+from src.utils.log import get_logger
+from src.utils.metrics import EMAIL_ERRORS
+
+logger = get_logger(__name__)
+
+# Seconds to wait between two inbox polls
+POLL_INTERVAL = float(os.getenv("DAEMON_POLL_INTERVAL", "30"))
+# Maximum number of emails processed at the same time
+MAX_IN_FLIGHT = int(os.getenv("DAEMON_MAX_IN_FLIGHT", "16"))
+# Seconds granted to in-flight emails to finish on shutdown
+DRAIN_TIMEOUT = float(os.getenv("DAEMON_DRAIN_TIMEOUT", "120"))
+# Times an email is processed (failed, or cut off by a shutdown) before it is given up on
+MAX_ATTEMPTS = int(os.getenv("DAEMON_MAX_ATTEMPTS", "5"))
+
+
+def _fetch_new_emails(in_flight_ids=()):
+    """
+    Runs one incremental sync to completion (which also advances the checkpoint), then
+    fetches again the emails of earlier ticks or runs whose processing failed or never
+    finished. Every returned email is recorded as unprocessed until `_handle_email` is done with it.
+
+    Args:
+        in_flight_ids (set): Ids of the emails still being processed, which aren't fetched again.
+    """
+    emails = []
+    # Recorded as they arrive: the checkpoint moves past them once the sync is consumed
+    for email in sync_emails(needs_body=needs_full_body):
+        add_unprocessed_emails([email["id"]])
+        emails.append(email)
+
+    new_ids = {email["id"] for email in emails}
+    retry_ids = [message_id for message_id in get_unprocessed_emails(MAX_ATTEMPTS)
+                 if message_id not in new_ids and message_id not in in_flight_ids]
+    if retry_ids:
+        logger.info("Processing emails again", extra={"emails": len(retry_ids)})
+        # Counted before fetching, so a message that can't be fetched any more is eventually given up on too
+        add_unprocessed_emails(retry_ids)
+        emails = list(fetch_emails_by_ids(get_service("gmail", "v1"), retry_ids, needs_body=needs_full_body)) + emails
+    return emails
+
+
+async def _handle_email(email, user_name, slots):
+    """
+    Processes one email on a worker thread and frees its in-flight slot afterwards.
+    A failed email stays recorded as unprocessed and is tried again on a later tick.
+    """
+    try:
+        await asyncio.to_thread(process_email, email, user_name, False)
+    except Exception as e:
+        EMAIL_ERRORS.inc(stage="process")
+        logger.exception("Failed to process email", extra={"email_id": email.get("id"), "subject": email.get("subject")})
+        attempts = await asyncio.to_thread(finish_unprocessed_email, email["id"], str(e) or type(e).__name__)
+        if attempts >= MAX_ATTEMPTS:
+            logger.error("Giving up on email", extra={"email_id": email.get("id"), "attempts": attempts})
+    else:
+        await asyncio.to_thread(finish_unprocessed_email, email["id"])
+    finally:
+        slots.release()
+
+
+async def run_daemon(poll_interval=POLL_INTERVAL, max_in_flight=MAX_IN_FLIGHT, drain_timeout=DRAIN_TIMEOUT):
+    """
+    Polls the inbox continuously and processes new emails concurrently.
+
+    Each email runs `process_email` on a worker thread, so the blocking Gmail,
+    OpenAI, Calendar, Slack and search clients overlap across emails. How many
+    calls hit each service at once is capped by the per-service limits in
+    `src.utils.concurrency`; `max_in_flight` caps the number of emails.
+
+    Replies to complex emails are saved as Gmail drafts and wait in the review
+    queue (`python main.py --review`), as in one-shot runs.
+
+    Replies, Slack alerts and calendar events go through the outbound queue,
+    drained by its own worker pool.
+
+    On SIGINT/SIGTERM the daemon stops polling and waits up to `drain_timeout`
+    seconds for in-flight emails, then for due outbound actions, to finish.
+    Emails that fail, or are still in flight when the daemon stops or is killed,
+    are processed again on a later tick (at most `MAX_ATTEMPTS` times).
+    """
+    loop = asyncio.get_running_loop()
+    # One thread per in-flight email plus one for polling
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight + 1, thread_name_prefix="email-worker"))
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Signal handlers are not available on Windows event loops; Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    slots = asyncio.Semaphore(max_in_flight)
+    in_flight = set()
+    in_flight_ids = set()
+
+    init_db()
+    outbound = OutboundWorkerPool().start()
+    user_name = await asyncio.to_thread(get_gmail_user_name)
+    logger.info("Daemon started", extra={"poll_interval": poll_interval, "max_in_flight": max_in_flight})
+
+    while not stop.is_set():
+        try:
+            emails = await asyncio.to_thread(_fetch_new_emails, set(in_flight_ids))
+        except Exception as e:
+            EMAIL_ERRORS.inc(stage="poll")
+            logger.warning("Error polling inbox", extra={"error": str(e)})
+            emails = []
+
+        # The checkpoint already covers these emails, so they are all scheduled even if a stop was requested
+        for email in emails:
+            await slots.acquire()
+            task = asyncio.create_task(_handle_email(email, user_name, slots))
+            in_flight.add(task)
+            in_flight_ids.add(email["id"])
+            task.add_done_callback(in_flight.discard)
+            task.add_done_callback(lambda _, message_id=email["id"]: in_flight_ids.discard(message_id))
+
+        if emails:
+            # Counts cover emails routed since the previous report, in-flight ones included
+            stats = get_triage_stats(reset=True)
+            logger.info(format_triage_stats(stats), extra={"triage": stats})
+            fetch = get_fetch_stats(reset=True)
+            logger.info(format_fetch_stats(fetch), extra={"fetch": fetch})
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    if in_flight:
+        logger.info("Shutting down, waiting for in-flight emails", extra={"in_flight": len(in_flight)})
+        done, pending = await asyncio.wait(in_flight, timeout=drain_timeout)
+        if pending:
+            # They stay recorded as unprocessed, so the next run processes them again
+            logger.warning("Emails did not finish before the drain timeout",
+                           extra={"pending": len(pending), "drain_timeout": drain_timeout})
+    await asyncio.to_thread(outbound.stop, True, drain_timeout)
+    rate_stats = get_rate_stats()
+    logger.info(format_rate_stats(rate_stats), extra={"rate_limits": rate_stats})
+    logger.info("Daemon stopped")
+
+
+def main():
+    asyncio.run(run_daemon())
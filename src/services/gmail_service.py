@@ -3,59 +3,96 @@
 import os
 import sys
 import base64
-from googleapiclient.discovery import build
 from email.utils import parseaddr
 import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from src.models.llm_service import generate_reply, extract_meeting_details
-from src.db.database import init_db, store_emails  #
-from src.utils.slack_notifier import send_slack_notification
-from src.utils.calender_api import create_calender_event
-from src.utils.web_search import search_web
-from src.authentication.gmail_auth import authenticate_gmail
-from src.controllers.email_controller import fetch_emails
-
-
-def is_simple_case(email_body):
+from src.models.llm_service import analyze_email
+from src.db.database import init_db, store_emails, update_email_status, count_pending_reviews
+from src.utils.web_search import search_web, extract_search_query
+from src.authentication.gmail_auth import get_service
+from src.controllers.inbox_sync import sync_emails
+from src.controllers.email_controller import get_fetch_stats, format_fetch_stats
+from src.utils.concurrency import limited, throttled
+from src.utils.rate_limiter import GMAIL_COSTS, URGENT, NORMAL, set_lane, get_rate_stats, format_rate_stats
+from src.services.outbound_queue import OutboundWorkerPool, queue_reply, queue_slack_alert, queue_calendar_events
+from src.services.review_queue import queue_for_review
+from src.utils.stage_timer import StageTimer
+from src.utils.keyword_matcher import get_matcher
+from src.services.thread_context import build_thread_context, get_context_stats
+from src.services.reply_index import find_similar_reply, remember_reply, get_reuse_stats
+from src.services.triage import triage_email, template_reply, get_triage_stats, format_triage_stats, needs_full_body, ROUTE_SKIP, ROUTE_TEMPLATE, ROUTE_REUSED
+from src.utils.log import get_logger
+from src.utils.metrics import EMAILS, EMAIL_SECONDS
+
+logger = get_logger(__name__)
+
+# Worker pool shared by all emails for the independent, network-bound pipeline stages
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", "8"))
+_stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="email-stage")
+
+# Which stages each stage of `process_email` waits for; used to report the critical path
+STAGE_DEPENDENCIES = {
+    "analysis": ["thread_context"],
+    "personalize": ["analysis", "web_search", "user_name"],
+    "actions": ["personalize"],
+}
+
+
+def is_simple_case(email_body, labels=None):
     """
     Determine if the email is a simple case that can be auto-replied to.
     For example, simple confirmations or brief emails like 'thank you'.
     
     Args:
     email_body (str): The body text of the email to analyze.
+    labels (set): Rules already matched by `classify_email` (skips re-scanning the body).
     
     Returns:
-    bool: True if the email body contains certain simple keywords, False otherwise.
+    bool: True if the email body matches the 'simple' keyword rule, False otherwise.
     """
-    
-    # List of keywords typically found in simple emails (like confirmations or acknowledgements)
-    simple_keywords = ["thank you", "confirmation", "acknowledged", "received"]
-    
-    # Iterate over the keywords and check if any of them appear in the email body (case-insensitive)
-    for keyword in simple_keywords:
-        if keyword.lower() in email_body.lower():
-            # If a keyword is found, return True indicating it's a simple case
-            return True
-    
-    # If none of the keywords are found, return False indicating it's not a simple case
-    return False
+    if labels is None:
+        labels = classify_email(email_body)
+    return "simple" in labels
+
+
+def classify_email(email_body, subject=""):
+    """
+    Matches the email against every keyword rule (simple, urgent, meeting, web_search) in one pass.
 
+    Returns:
+    set: Names of the rules from keyword_rules.json that the email satisfies.
+    """
+    return get_matcher().classify(email_body, subject)
+
+
+# Display name of the authenticated user, looked up once per process
+_user_name = None
 
 
-def get_gmail_user_name(creds):
+def get_gmail_user_name():
     """
     Fetch the Gmail user's name using the People API.
+    The name is memoized after the first successful lookup.
     """
+    global _user_name
+    if _user_name is not None:
+        return _user_name
+
     try:
-        people_service = build("people", "v1", credentials=creds)
-        profile = people_service.people().get(resourceName='people/me', personFields='names').execute()
+        people_service = get_service("people", "v1")
+        with throttled("people"):
+            profile = people_service.people().get(resourceName='people/me', personFields='names').execute()
         names = profile.get("names", [])
-        if names:
-            return names[0].get("displayName", "Your Name")
+        if names and names[0].get("displayName"):
+            _user_name = names[0]["displayName"]
+            return _user_name
     except Exception as e:
-        print(f"Error fetching user name: {e}")
+        logger.warning("Error fetching user name", extra={"error": str(e)})
     return "Your Name"
 
 
@@ -106,146 +143,274 @@ def insert_web_snippet_before_signature(reply, web_snippet):
 
 
 
-def process_email_for_web_search(email_body):
+def process_email_for_web_search(email_body, labels=None):
     """
     Analyze the email body and trigger a web search if it contains question-related keywords.
     """
-    question_keywords = ["what is", "how to", "explain", "define", "current", "latest"]
-    
-    # Trigger web search if any question-related keyword is found
-    if any(keyword in email_body.lower() for keyword in question_keywords):
-        print("[Web Search Triggered]")
-        return search_web(email_body)
+    if labels is None:
+        labels = classify_email(email_body)
+
+    # Trigger web search if the question-keyword rule matched, with a short query taken from the question
+    if "web_search" in labels:
+        query = extract_search_query(email_body)
+        logger.info("Web search triggered", extra={"query": query})
+        return search_web(query)
     
     return None
     
 
 
-def is_urgent_email(email_body, subject):
+def is_urgent_email(email_body, subject, labels=None):
     """
     Check if the email is urgent based on certain keywords in the subject and body.
     """
-    urgency_keywords = [
-        "urgent", "asap", "immediately", "important", "emergency", 
-        "action required", "respond quickly", "critical", "deadline", "attention"
-    ]
-    
-    # Combine subject and body to check for urgency keywords
-    combined = (subject + " " + email_body).lower()
-    
-    return any(keyword in combined for keyword in urgency_keywords)
+    if labels is None:
+        labels = classify_email(email_body, subject)
+    return "urgent" in labels
 
 
-def mark_meeting_details(meeting_details):
-    # print('outside')
+def mark_meeting_details(meeting_details, email=None):
+    """
+    Queues the extracted meetings as one calendar action; the outbound workers
+    create them together in a single batch request.
+    """
     try:
-        print(type(meeting_details))
-        # print(meeting_details.len())
         if type(meeting_details)==str or type(meeting_details)==dict:
-            # print('kk')
             meeting_details=[meeting_details]
 
-        # print(meeting_details)
-        
-        for event in meeting_details:
-            #print(event)
-            create_calender_event(event)
+        queue_calendar_events(list(meeting_details), email)
     except Exception as e:
-        print(f"⚠️ Could not create calendar event: {e}")
+        logger.warning("Could not queue calendar event", extra={"error": str(e)})
 
 
-def process_and_respond_to_email():
+def process_and_respond_to_email(interactive=True):
     """
     Process the email content, summarize, extract meeting details, and generate a draft reply.
     Also, ensure safeguards to auto-send or ask for confirmation before replying.
-    """
-    # Fetch the latest emails
-    emails = fetch_emails()
 
-    for email in emails:
-        print(f"Processing email: {email['subject']} from {email['sender']}")
+    Replies to complex emails are not sent: they are saved as Gmail drafts and wait for
+    `python main.py --review` (see `src.services.review_queue`), so nothing here blocks on a human.
+
+    Args:
+        interactive (bool): Show the drafts of complex emails on the terminal as they are written.
+    """
+    init_db()
 
-        raw_email = parseaddr(email["sender"])
-        sender_name = raw_email[0] if raw_email[0] else raw_email[1].split("@")[0].capitalize()
+    # Replies, Slack alerts and calendar events are sent by background workers
+    outbound = OutboundWorkerPool().start()
 
-        user_name = get_gmail_user_name(authenticate_gmail())
+    try:
+        # Fetch only the emails that arrived since the last run, bodies only of those triage can't skip on headers
+        emails = sync_emails(needs_body=needs_full_body)
+
+        for email in emails:
+            process_email(email, interactive=interactive)
+
+        triage = get_triage_stats(reset=True)
+        logger.info(format_triage_stats(triage), extra={"triage": triage})
+        fetch = get_fetch_stats(reset=True)
+        logger.info(format_fetch_stats(fetch), extra={"fetch": fetch})
+        context = get_context_stats()
+        logger.info(f"Thread context: {context['threads']} thread(s), {context['packed_tokens']} token(s) sent, "
+                    f"{context['tokens_saved']} saved against naive concatenation", extra={"thread_context": context})
+        reuse = get_reuse_stats(reset=True)
+        logger.info(f"Reply reuse: {reuse['hits']} of {reuse['lookups']} lookup(s) reused a stored reply, "
+                    f"{reuse['mismatched']} rejected for different details, {reuse['entries']} indexed", extra={"reply_reuse": reuse})
+        rate_stats = get_rate_stats()
+        logger.info(format_rate_stats(rate_stats), extra={"rate_limits": rate_stats})
+        pending = count_pending_reviews()
+        if pending:
+            logger.info(f"{pending} drafted repl{'y' if pending == 1 else 'ies'} waiting for review "
+                        f"(python main.py --review)", extra={"pending_reviews": pending})
+    finally:
+        # Give queued actions a chance to go out; retries not yet due wait for the next run
+        outbound.stop(drain=True)
+
+
+def process_email(email, user_name=None, interactive=True):
+    """
+    Summarize a single email, generate a reply, and act on it (Slack alert, database, reply, calendar).
 
-        # Generate a summary and a reply using LLM
-        summary, reply = generate_reply(email['body'])
+    Args:
+        email (dict): A parsed email as returned by `fetch_emails`.
+        user_name (str): Display name used to sign the reply (looked up via the People API if not given).
+        interactive (bool): Stream the draft reply of a complex email to the terminal as it is
+            written. Either way the draft goes to the review queue instead of being sent.
+    """
+    started = time.perf_counter()
+    logger.info("Processing email", extra={"email_id": email.get("id"), "subject": email["subject"],
+                                           "sender": email["sender"]})
+
+    raw_email = parseaddr(email["sender"])
+    sender_name = raw_email[0] if raw_email[0] else raw_email[1].split("@")[0].capitalize()
+
+    timer = StageTimer()
+    labels = classify_email(email['body'], email['subject'])
+
+    # Urgent mail goes first whenever an API's rate budget is contended
+    set_lane(URGENT if "urgent" in labels else NORMAL)
+
+    # Cheap local triage decides whether this email needs the LLM at all
+    route, reason = triage_email(email, labels)
+    logger.info("Triage route", extra={"email_id": email.get("id"), "route": route, "reason": reason})
+
+    if route == ROUTE_SKIP:
+        # Skipped mail is never analysed, but urgent keywords in its subject or body (the snippet,
+        # when only the headers were fetched) still raise the Slack alert
+        if "urgent" in labels:
+            logger.info("Urgent email detected", extra={"email_id": email.get("id"), "alert": "digest"})
+            queue_slack_alert(email)
+        store_emails([dict(email, status="skipped")])
+        return _finish(email, timer, route, started)
+
+    if route == ROUTE_TEMPLATE:
+        if user_name is None:
+            user_name = timer.run("user_name", get_gmail_user_name)
+        reply = template_reply(sender_name, user_name)
+        logger.debug("Generated reply", extra={"email_id": email.get("id"), "reply": reply})
+        with timer.stage("actions"):
+            _act_on_email(email, reply, [], labels)
+        return _finish(email, timer, route, started)
+
+    # A near duplicate of an email already answered reuses that reply instead of calling the LLM
+    reused = timer.run("reply_index", find_similar_reply, email)
+    if reused:
+        if user_name is None:
+            user_name = timer.run("user_name", get_gmail_user_name)
+        with timer.stage("personalize"):
+            reply = personalize_reply(reused["reply"], sender_name, user_name)
+        logger.info("Reusing reply of a near-duplicate email", extra={"email_id": email.get("id"),
+                                                                     "original_id": reused["message_id"],
+                                                                     "similarity": round(reused["similarity"], 3)})
+        # A reused reply was written for another email, so it is never sent without review
+        with timer.stage("actions"):
+            _act_on_email(email, reply, [], labels, urgent=reused["urgency"] == "high",
+                          analysis={"urgency": reused["urgency"], "category": reused["category"],
+                                    "reused_from": reused["message_id"]}, review=True)
+        return _finish(email, timer, ROUTE_REUSED, started)
+
+    # A reply that will go to the review queue is streamed to the terminal as it is written
+    on_reply_text = None
+    if interactive and not is_simple_case(email['body'], labels):
+        print("Drafting reply: ", end="", flush=True)
+        on_reply_text = show_draft_progress
+
+    # One LLM call returns the summary, reply, classification and meetings; the web search runs alongside it
+    # The stages run in copies of this context, so they keep the email's priority lane
+    analysis_future = _stage_pool.submit(contextvars.copy_context().run, _analyze_with_context, timer, email, on_reply_text)
+    web_future = _stage_pool.submit(contextvars.copy_context().run, timer.run, "web_search",
+                                    process_email_for_web_search, email['body'], labels)
+
+    if user_name is None:
+        user_name = timer.run("user_name", get_gmail_user_name)
+
+    # Personalization waits for the reply and the web snippet
+    analysis = analysis_future.result()
+    if on_reply_text:
+        print()
+    summary, reply = analysis["summary"], analysis["reply"]
+    web_snippet = web_future.result()
+
+    with timer.stage("personalize"):
         reply = personalize_reply(reply, sender_name, user_name)
         reply = reply.replace("Your Name", user_name)
+        reply = insert_web_snippet_before_signature(reply, web_snippet)
 
-        # Trigger web search for additional context or data
-        web_snippet = process_email_for_web_search(email['body'])
+    # Meeting details extracted by the analysis, if any
+    meeting_details = analysis["meetings"]
+    logger.info("Analysed email", extra={"email_id": email.get("id"), "summary": summary,
+                                         "urgency": analysis["urgency"], "category": analysis["category"],
+                                         "meetings": meeting_details})
+    logger.debug("Generated reply", extra={"email_id": email.get("id"), "reply": reply})
 
-        reply = insert_web_snippet_before_signature(reply, web_snippet)
+    with timer.stage("actions"):
+        _act_on_email(email, reply, meeting_details, labels, urgent=analysis["urgency"] == "high", analysis=analysis)
 
-        # Print the summary and generated reply only once for debugging
-        print(f"Summary: {summary}")
-        print(f"Generated reply: {reply}")
+    return _finish(email, timer, route, started)
 
-        # Extract meeting details if any
-        meeting_details = extract_meeting_details(email['body'])
-        print(f"Meeting Details: {meeting_details}")
 
+def _finish(email, timer, route, started):
+    """
+    Records the email's route and end-to-end time in `metrics`, logs its stage timings and returns them.
+    """
+    EMAILS.inc(route=route)
+    EMAIL_SECONDS.observe(time.perf_counter() - started, route=route)
+    if timer.stages:
+        logger.info(f"Stage timings: {timer.report(STAGE_DEPENDENCIES)}",
+                    extra={"email_id": email.get("id"), "stages": timer.stages})
+    return timer.stages
 
-        # checking urgent mail or not
-        if is_urgent_email(email['body'], email['subject']):
-            print("Urgent email detected. Sending Slack notification...")
-            send_slack_notification(email['subject'], email['sender'], email['body'])
 
-        # Store emails in the database
-        store_emails([email])
+def _analyze_with_context(timer, email, on_reply_text=None):
+    """
+    Builds the token-budgeted thread context, then runs the LLM analysis on it.
+    """
+    body, history = timer.run("thread_context", build_thread_context, email)
+    return timer.run("analysis", analyze_email, body, history, on_reply_text)
 
 
-        # Check if the email is simple and can be auto-replied
-        if is_simple_case(email['body']):
-            print("This is a simple email, auto-replying...")
-            send_reply_via_gmail(reply, email)  # Send the reply automatically
+def show_draft_progress(text):
+    """
+    Prints streamed reply text as it arrives; None means the attempt is being retried.
+    """
+    if text is None:
+        print("\n[retrying] Drafting reply: ", end="", flush=True)
+    else:
+        print(text, end="", flush=True)
 
-            if meeting_details:
-                mark_meeting_details(meeting_details)
 
-        else:
-            print("This is a complex email, logging and asking for confirmation...")
+def _act_on_email(email, reply, meeting_details, labels, urgent=False, analysis=None, review=False):
+    """
+    Runs the side effects of an analysed email: Slack alert, database, reply and calendar.
+    `urgent` is the LLM's verdict; the keyword check can still flag the email on its own.
+    With the LLM `analysis` the reply came from, a sent reply is indexed for near-duplicate reuse.
+    With `review`, the reply goes to the review queue even for a simple email.
+    """
+    # checking urgent mail or not
+    keyword_urgent = is_urgent_email(email['body'], email['subject'], labels)
+    if urgent or keyword_urgent:
+        # When the LLM and the keywords agree, alert right away instead of in the next digest
+        immediate = urgent and keyword_urgent
+        logger.info("Urgent email detected", extra={"email_id": email.get("id"),
+                                                    "alert": "immediate" if immediate else "digest"})
+        queue_slack_alert(email, immediate=immediate)
 
-            # Log email for manual review
-            log_email_for_confirmation(email['subject'], email['sender'], email['body'], reply)
+    # Store emails in the database
+    store_emails([email])
 
-            # Ask user for confirmation before sending
-            confirmation=ask_for_user_confirmation(reply, email)
 
-            if confirmation == 'y':
-                if meeting_details:
-                    mark_meeting_details(meeting_details)
+    # Check if the email is simple and can be auto-replied
+    if not review and is_simple_case(email['body'], labels):
+        logger.info("Simple email, auto-replying", extra={"email_id": email.get("id")})
+        queue_reply(email, reply)  # Send the reply automatically
+        update_email_status(email.get("id"), "auto_replied")
 
+        if analysis is not None:
+            _remember_sent_reply(email, reply, meeting_details, analysis)
 
-def log_email_for_confirmation(subject, sender, body, reply):
-    """
-    Logs the email for manual review before sending a reply.
-    """
-    print(f"\n[LOGGING] Email from {sender} with subject '{subject}'")
+        if meeting_details:
+            mark_meeting_details(meeting_details, email)
 
-def ask_for_user_confirmation(reply,email):
-    """
-    Asks the user for confirmation before sending the reply.
-    """
-    confirmation = input(f"Do you want to send the following reply? (y/n): ")
-    if confirmation.lower() == 'y':
-        send_reply_via_gmail(reply,email)
-        print("Reply sent!")
     else:
-        print("Reply not sent.")
+        logger.info("Saving the reply as a draft for review", extra={"email_id": email.get("id")})
+
+        # The reply is sent, and its meetings created, once an operator approves it
+        queue_for_review(email, reply, meeting_details, analysis)
+        update_email_status(email.get("id"), "pending_review")
+
+
+def _remember_sent_reply(email, reply, meeting_details, analysis):
+    try:
+        remember_reply(email, reply, analysis["urgency"], analysis["category"], meeting_details)
+    except Exception as e:
+        logger.warning("Could not index reply", extra={"email_id": email.get("id"), "error": str(e)})
 
-    return confirmation.lower()
-        
 
 def send_reply_via_gmail(reply, email):
     """
     Sends the reply via Gmail API, using the provided email details and reply text.
     """
-    creds = authenticate_gmail()  # Authenticate and get credentials
-    service = build("gmail", "v1", credentials=creds)  # Build the Gmail service
+    service = get_service("gmail", "v1")  # Reuse the Gmail service built for this thread
 
     # Create the message to send (using the email's sender and subject)
     message = create_message("me", email['sender'], "Re: " + email['subject'], reply)
@@ -275,6 +440,48 @@ def create_message(sender, to, subject, body):
     raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
     return {"raw": raw_message}
 
+@limited("gmail", cost=GMAIL_COSTS["drafts.create"])
+def create_draft(reply, email):
+    """
+    Saves the reply to `email` as a Gmail draft and returns it (its 'id' is needed to send it).
+    """
+    service = get_service("gmail", "v1")
+    message = create_message("me", email['sender'], "Re: " + email['subject'], reply)
+    return service.users().drafts().create(userId="me", body={"message": message}).execute()
+
+
+@limited("gmail", cost=GMAIL_COSTS["drafts.update"])
+def update_draft(draft_id, reply, email):
+    """
+    Replaces the text of a Gmail draft with an edited reply.
+    """
+    service = get_service("gmail", "v1")
+    message = create_message("me", email['sender'], "Re: " + email['subject'], reply)
+    return service.users().drafts().update(userId="me", id=draft_id,
+                                           body={"id": draft_id, "message": message}).execute()
+
+
+@limited("gmail", cost=GMAIL_COSTS["drafts.send"])
+def send_draft(draft_id):
+    """
+    Sends a Gmail draft as it currently is.
+    """
+    service = get_service("gmail", "v1")
+    message = service.users().drafts().send(userId="me", body={"id": draft_id}).execute()
+    logger.info("Draft sent", extra={"draft_id": draft_id, "message_id": message.get("id")})
+    return message
+
+
+@limited("gmail", cost=GMAIL_COSTS["drafts.delete"])
+def delete_draft(draft_id):
+    """
+    Deletes a Gmail draft.
+    """
+    service = get_service("gmail", "v1")
+    service.users().drafts().delete(userId="me", id=draft_id).execute()
+
+
+@limited("gmail", cost=GMAIL_COSTS["messages.send"])
 def send_message(service, sender, message):
     """
     Sends an email message via the Gmail API.
@@ -282,7 +489,8 @@ def send_message(service, sender, message):
     try:
         # Send the email using Gmail API
         message = service.users().messages().send(userId=sender, body=message).execute()
-        print(f"Message sent! Message ID: {message['id']}")
+        logger.info("Message sent", extra={"message_id": message["id"]})
     except Exception as error:
-        # Handle any errors that occur during sending
-        print(f"An error occurred: {error}")
+        # Log the error and let the outbound queue decide whether to retry
+        logger.warning("Could not send message", extra={"error": str(error)})
+        raise
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.db.database import (
+    enqueue_action, claim_next_action, complete_action, retry_action,
+    dead_letter_action, requeue_stale_actions, count_ready_actions, get_review, set_review_draft,
+)
+from src.utils.slack_notifier import send_slack_notification, send_slack_digest, build_digest, SlackAlertAggregator
+from src.utils.calender_api import create_calendar_events
+from src.utils.rate_limiter import URGENT, lane, is_rate_limit_error, retry_after_seconds
+from src.utils.log import get_logger
+from src.utils.metrics import OUTBOUND_ACTIONS
+
+logger = get_logger(__name__)
+
+# Number of threads draining the outbound queue
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+# Attempts before an action is moved to the dead-letter table
+MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "6"))
+# Exponential backoff: BACKOFF_BASE * 2**attempt seconds, capped at BACKOFF_MAX, with jitter
+BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", "2"))
+BACKOFF_MAX = float(os.getenv("OUTBOUND_BACKOFF_MAX", "900"))
+# Actions 'in_progress' for longer than this are assumed orphaned by a crash
+STALE_AFTER = 600
+
+
+class PermanentActionError(Exception):
+    """
+    Raised by a handler when no retry can make the action succeed; it is dead-lettered right away.
+    """
+
+
+def _email_key(email):
+    """
+    Stable identifier of an email for idempotency keys: its Gmail id, or a content hash.
+    """
+    if email.get("id"):
+        return email["id"]
+    material = "\x1f".join([email.get("sender", ""), email.get("subject", ""), email.get("body", "")])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def queue_reply(email, reply):
+    """
+    Queues a Gmail reply to `email`. Returns False if this email was already answered through the queue.
+    """
+    payload = {
+        "reply": reply,
+        "email": {key: email.get(key) for key in ("id", "thread_id", "sender", "subject")},
+    }
+    return enqueue_action("reply", json.dumps(payload), f"reply:{_email_key(email)}")
+
+
+def queue_slack_alert(email, immediate=False):
+    """
+    Raises the urgent-email Slack alert for `email`.
+
+    Alerts are collected into the next digest message (see `SlackAlertAggregator`);
+    with `immediate` the alert is queued as a message of its own right away.
+    """
+    payload = {"subject": email["subject"], "sender": email["sender"], "body": email["body"]}
+    if immediate:
+        return enqueue_action("slack", json.dumps(payload), f"slack:{_email_key(email)}")
+    _slack_digest.add(dict(payload, thread_id=email.get("thread_id")))
+    return True
+
+
+def _queue_digest(alerts):
+    text, blocks = build_digest(alerts, _slack_digest.window)
+    material = "\x1f".join(f"{a.get('thread_id') or a['sender']}:{a['count']}:{a['first_seen']}" for a in alerts)
+    key = f"slack_digest:{hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]}"
+    enqueue_action("slack_digest", json.dumps({"text": text, "blocks": blocks}), key)
+
+
+# Urgent alerts collected between digests; flushed into the queue by OutboundWorkerPool
+_slack_digest = SlackAlertAggregator(_queue_digest)
+
+
+def queue_calendar_events(events, email=None):
+    """
+    Queues creation of the calendar events extracted from `email` as one action,
+    so they are checked and inserted together in a single batch request.
+    """
+    events_id = json.dumps(events, sort_keys=True, default=str)
+    source = _email_key(email) if email else "manual"
+    key = f"calendar:{source}:{hashlib.sha256(events_id.encode('utf-8')).hexdigest()[:16]}"
+    return enqueue_action("calendar", json.dumps(events), key)
+
+
+def queue_calendar_event(event_details, email=None):
+    """
+    Queues creation of one calendar event extracted from `email`.
+    """
+    return queue_calendar_events([event_details], email)
+
+
+def queue_draft(review_id, email):
+    """
+    Queues saving the reply of a review as a Gmail draft, so it can also be read and edited in Gmail.
+    """
+    return enqueue_action("draft", json.dumps({"review_id": review_id}), f"draft:{_email_key(email)}")
+
+
+def queue_review_reply(review_id, email):
+    """
+    Queues sending an approved review. It shares its idempotency key with `queue_reply`, so an email is answered once.
+    """
+    return enqueue_action("review_reply", json.dumps({"review_id": review_id}), f"reply:{_email_key(email)}")
+
+
+def queue_draft_discard(review_id, email):
+    """
+    Queues deleting the Gmail draft of a rejected review.
+    """
+    return enqueue_action("draft_discard", json.dumps({"review_id": review_id}), f"draft_discard:{_email_key(email)}")
+
+
+def _send_reply(payload):
+    # Imported here because gmail_service itself imports this module to enqueue actions
+    from src.services.gmail_service import send_reply_via_gmail
+    send_reply_via_gmail(payload["reply"], payload["email"])
+
+
+def _send_slack(payload):
+    # Slack alerts are only raised for urgent mail
+    with lane(URGENT):
+        send_slack_notification(payload["subject"], payload["sender"], payload["body"])
+
+
+def _send_digest(payload):
+    with lane(URGENT):
+        send_slack_digest(payload["text"], payload["blocks"])
+
+
+def _create_draft(payload):
+    from src.services.gmail_service import create_draft
+    review = get_review(payload["review_id"])
+    # Decided before its draft was written (it is then sent as a plain reply), or already drafted
+    if review is None or review["status"] != "pending" or review["draft_id"]:
+        return
+    draft = create_draft(review["reply"], json.loads(review["email"]))
+    set_review_draft(review["id"], draft["id"])
+
+
+def _send_review_reply(payload):
+    from src.services.gmail_service import send_reply_via_gmail, send_draft, update_draft
+    review = get_review(payload["review_id"])
+    if review is None:
+        raise PermanentActionError(f"Review {payload['review_id']} no longer exists")
+    email = json.loads(review["email"])
+    if not review["draft_id"]:
+        send_reply_via_gmail(review["reply"], email)
+        return
+    # Unedited drafts are sent as they are in Gmail, including changes made there
+    if review["edited"]:
+        update_draft(review["draft_id"], review["reply"], email)
+    send_draft(review["draft_id"])
+
+
+def _discard_draft(payload):
+    from src.services.gmail_service import delete_draft
+    review = get_review(payload["review_id"])
+    if review is None or not review["draft_id"]:
+        return
+    try:
+        delete_draft(review["draft_id"])
+    except Exception as e:
+        # Already deleted (or sent) from Gmail itself
+        if getattr(getattr(e, "resp", None), "status", None) != 404:
+            raise
+
+
+def _create_events(payload):
+    # Actions queued before multi-event payloads carry a single event
+    create_calendar_events(payload if isinstance(payload, list) else [payload])
+
+
+# Maps an action kind to the function that performs it; handlers raise on failure
+HANDLERS = {
+    "reply": _send_reply,
+    "slack": _send_slack,
+    "slack_digest": _send_digest,
+    "calendar": _create_events,
+    "draft": _create_draft,
+    "review_reply": _send_review_reply,
+    "draft_discard": _discard_draft,
+}
+
+
+def is_permanent_error(error):
+    """
+    True for client errors that a retry can't fix (HTTP 4xx other than 408/429
+    and Google's rate-limit 403s) and for `PermanentActionError`.
+    """
+    if isinstance(error, PermanentActionError):
+        return True
+    if is_rate_limit_error(error):
+        return False
+    status = getattr(getattr(error, "resp", None), "status", None)  # googleapiclient HttpError
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)  # Slack / requests
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= status < 500 and status not in (408, 429)
+
+
+def backoff_delay(attempt):
+    """
+    Seconds to wait before retry number `attempt` (1-based), with full jitter.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def process_action(action):
+    """
+    Runs one claimed action and records the outcome (done, retry later, or dead-lettered).
+    """
+    handler = HANDLERS.get(action["kind"])
+    attempt = action["attempts"] + 1
+
+    try:
+        if handler is None:
+            raise ValueError(f"No handler for outbound action kind '{action['kind']}'")
+        handler(json.loads(action["payload"]))
+    except Exception as e:
+        if handler is None or is_permanent_error(e) or attempt >= MAX_ATTEMPTS:
+            logger.error("Giving up on outbound action",
+                         extra={"key": action["idempotency_key"], "attempts": attempt, "error": str(e)})
+            OUTBOUND_ACTIONS.inc(kind=action["kind"], outcome="dead")
+            dead_letter_action(action["id"], e)
+        else:
+            # A server-sent Retry-After wins over a shorter backoff
+            delay = max(backoff_delay(attempt), retry_after_seconds(e) or 0.0)
+            logger.info("Retrying outbound action", extra={"key": action["idempotency_key"], "delay": round(delay, 1),
+                                                           "attempt": attempt, "error": str(e)})
+            OUTBOUND_ACTIONS.inc(kind=action["kind"], outcome="retry")
+            retry_action(action["id"], e, time.time() + delay)
+    else:
+        OUTBOUND_ACTIONS.inc(kind=action["kind"], outcome="sent")
+        complete_action(action["id"])
+
+
+class OutboundWorkerPool:
+    """
+    Background threads that drain the outbound action queue.
+
+    The pipeline only enqueues replies, Slack alerts and calendar events, so a
+    slow or failing API never holds up inbox processing. The pool also runs the
+    Slack digest window, so collected alerts reach the queue while it is up.
+    """
+
+    def __init__(self, workers=OUTBOUND_WORKERS, poll_interval=1.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+
+    def start(self):
+        requeued = requeue_stale_actions(STALE_AFTER)
+        if requeued:
+            logger.info("Requeued outbound actions left in progress by a previous run", extra={"requeued": requeued})
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbound-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        _slack_digest.start()
+        return self
+
+    def stop(self, drain=True, timeout=60):
+        """
+        Stops the workers. With `drain`, first waits (up to `timeout` seconds) until
+        no due action is left; actions waiting on a backoff stay queued for the next run.
+        """
+        # Alerts still waiting for their digest window are queued now
+        _slack_digest.stop()
+
+        if drain:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                with self._busy_lock:
+                    busy = self._busy
+                if busy == 0 and count_ready_actions() == 0:
+                    break
+                time.sleep(0.2)
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                action = claim_next_action()
+                if action is not None:
+                    process_action(action)
+            except Exception:
+                action = None
+                logger.exception("Outbound worker error")
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+
+            if action is None:
+                self._stop.wait(self.poll_interval)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.db.database import put_indexed_reply, find_reply_candidates, touch_indexed_reply, count_indexed_replies
+from src.services.thread_context import _is_reply
+from src.utils.email_text import strip_quoted_reply
+from src.utils.log import get_logger
+from src.utils.metrics import CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+# Reuse the reply sent to a near-duplicate email instead of asking the LLM
+REPLY_REUSE_ENABLED = os.getenv("REPLY_REUSE_ENABLED", "1") != "0"
+# Jaccard similarity of word trigrams from which an answered email counts as a near duplicate
+REPLY_REUSE_MIN_SIMILARITY = float(os.getenv("REPLY_REUSE_MIN_SIMILARITY", "0.7"))
+# Bodies with fewer distinct trigrams than this are too short to compare reliably
+MIN_SHINGLES = int(os.getenv("REPLY_REUSE_MIN_SHINGLES", "8"))
+# Candidates (those sharing the most bands first) compared exactly per lookup
+MAX_CANDIDATES = 20
+
+SHINGLE_SIZE = 3
+# MinHash LSH: BANDS bands of ROWS hashes. Two emails share a band with probability
+# 1 - (1 - s**ROWS)**BANDS for similarity s: 0.98 at 0.7, 0.24 at 0.3, ~0 for unrelated mail
+BANDS = 10
+ROWS = 3
+
+# Every shingle hash is expanded into one 32-bit value per MinHash row by a single SHAKE digest
+_ROW_FORMAT = struct.Struct(f">{BANDS * ROWS}I")
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+# Details a reply may copy from its email: email addresses, numbers (ids, amounts, dates) and capitalized names
+_SPECIFIC_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+|\d+(?:[.,:/-]\d+)*|\b[A-Z][a-z]+(?:['-][A-Za-z]+)*")
+
+reuse_stats = {"lookups": 0, "hits": 0, "mismatched": 0, "indexed": 0}
+_stats_lock = threading.Lock()
+
+
+def normalize_tokens(body):
+    """
+    Words of the email body without quoted history, lowercased, with every number folded to '0'
+    so order ids, amounts and dates don't make templated emails look different.
+    A reply that quotes those numbers is only reused when they match (see `specifics`).
+    """
+    text = strip_quoted_reply(body).lower()
+    return ["0" if token[0].isdigit() else token for token in _TOKEN_RE.findall(text)]
+
+
+def shingle_hashes(tokens):
+    """
+    Sorted, distinct 32-bit hashes of the word trigrams of `tokens`.
+    """
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    return sorted({int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+                   for s in shingles})
+
+
+def band_keys(hashes):
+    """
+    MinHash signature of a shingle set folded into one signed 64-bit key per band.
+    """
+    rows_per_shingle = [_ROW_FORMAT.unpack(hashlib.shake_128(h.to_bytes(4, "big")).digest(_ROW_FORMAT.size))
+                        for h in hashes]
+    signature = [min(column) for column in zip(*rows_per_shingle)]
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        material = f"{band}:" + ",".join(map(str, rows))
+        keys.append(int.from_bytes(hashlib.blake2b(material.encode("ascii"), digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def specifics(text):
+    """
+    Email addresses, numbers and capitalized names in `text`.
+    """
+    return set(_SPECIFIC_RE.findall(text))
+
+
+def copied_specifics(email, reply):
+    """
+    The specifics of `email` that `reply` repeats, such as an order id, an amount or a name.
+    """
+    return specifics(reply) & specifics(strip_quoted_reply(email["body"]))
+
+
+def jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _eligible(email):
+    # Replies in a thread depend on its history, so only fresh conversations reuse a reply
+    return REPLY_REUSE_ENABLED and not _is_reply(email)
+
+
+def _shingles(email):
+    hashes = shingle_hashes(normalize_tokens(email["body"]))
+    return hashes if len(hashes) >= MIN_SHINGLES else None
+
+
+def find_similar_reply(email):
+    """
+    Looks for an already answered email that is a near duplicate of `email`.
+
+    Candidates come from the MinHash bands in SQLite (a handful of primary-key
+    lookups however large the index grows); the best ones are then compared on
+    their exact trigram similarity. A candidate whose reply repeats numbers or
+    names of its email that `email` doesn't contain is never reused.
+
+    Returns:
+        dict: The stored {"reply", "urgency", "category", "message_id", "similarity"} of the most
+        similar email, or None. The reply still carries the original greeting and signature;
+        pass it through `personalize_reply`.
+    """
+    if not _eligible(email):
+        return None
+    hashes = _shingles(email)
+    if hashes is None:
+        return None
+
+    best, mismatched = None, 0
+    body_specifics = specifics(strip_quoted_reply(email["body"]))
+    for candidate in find_reply_candidates(band_keys(hashes), MAX_CANDIDATES):
+        similarity = jaccard(hashes, array("I", candidate["shingles"]))
+        if similarity < REPLY_REUSE_MIN_SIMILARITY or (best is not None and similarity <= best["similarity"]):
+            continue
+        # The reply would tell this sender about another order, amount or person
+        if candidate["specifics"] is None or not set(json.loads(candidate["specifics"])) <= body_specifics:
+            mismatched += 1
+            continue
+        best = dict(candidate, similarity=similarity)
+
+    with _stats_lock:
+        reuse_stats["lookups"] += 1
+        reuse_stats["hits"] += best is not None
+        reuse_stats["mismatched"] += mismatched
+    CACHE_LOOKUPS.inc(cache="reply_index", outcome="hit" if best else "miss")
+    if best is None:
+        return None
+
+    touch_indexed_reply(best["id"])
+    return {key: best[key] for key in ("reply", "urgency", "category", "message_id", "similarity")}
+
+
+def remember_reply(email, reply, urgency="normal", category="complex", meetings=()):
+    """
+    Indexes the reply sent to `email`, so near duplicates arriving later can reuse it.
+
+    Returns:
+        bool: True if the email was indexed (it is long enough, not part of a thread,
+        and its reply doesn't schedule `meetings`, whose dates won't fit another email).
+    """
+    if meetings or not _eligible(email):
+        return False
+    hashes = _shingles(email)
+    if hashes is None:
+        return False
+
+    put_indexed_reply(email.get("id"), array("I", hashes).tobytes(), band_keys(hashes), reply, urgency, category,
+                      json.dumps(sorted(copied_specifics(email, reply))))
+    with _stats_lock:
+        reuse_stats["indexed"] += 1
+    return True
+
+
+def get_reuse_stats(reset=False):
+    """
+    Returns the lookup/hit counters of this process (hits are LLM calls avoided) and the index size.
+    """
+    with _stats_lock:
+        stats = dict(reuse_stats)
+        if reset:
+            reuse_stats.update(lookups=0, hits=0, mismatched=0, indexed=0)
+    stats["entries"] = count_indexed_replies()
+    return stats
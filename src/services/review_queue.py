@@ -0,0 +1,256 @@
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.db.database import (
+    init_db, add_pending_review, decide_review, get_pending_reviews, count_pending_reviews, update_email_status,
+)
+from src.services.outbound_queue import (
+    OutboundWorkerPool, queue_draft, queue_review_reply, queue_draft_discard, queue_calendar_events,
+)
+from src.services.reply_index import remember_reply
+from src.utils.log import get_logger
+from src.utils.metrics import REVIEWS
+
+logger = get_logger(__name__)
+
+# Editor for `e <id>` in the review command; without one the new reply is typed on the terminal
+EDITOR = os.getenv("VISUAL") or os.getenv("EDITOR", "")
+
+# Email fields kept with a review: enough to send the reply and index it once approved
+_EMAIL_FIELDS = ("id", "thread_id", "sender", "subject", "body")
+_THREAD_HEADERS = ("in-reply-to", "references")
+
+HELP = """Commands (IDS is 'all', '3' or '1,4-6'):
+  a IDS   approve and send          r IDS   reject (the draft is deleted)
+  e ID    edit a reply (approve it to send the edited text)
+  v ID    show the email and the full reply
+  l       list pending reviews      q       quit"""
+
+
+def queue_for_review(email, reply, meetings=(), analysis=None):
+    """
+    Records the reply to a complex email for an operator to approve, edit or reject,
+    and queues saving it as a Gmail draft. Nothing is sent until it is approved.
+
+    Args:
+        email (dict): The parsed email.
+        reply (str): The personalized reply.
+        meetings (list): Meetings to create on the calendar once the reply is approved.
+        analysis (dict): The LLM analysis the reply came from (urgency and category are kept),
+            with "reused_from" when the reply was reused from the reply index.
+
+    Returns:
+        int: Id of the review, or None if the email was already waiting for review.
+    """
+    stored = {key: email.get(key) for key in _EMAIL_FIELDS}
+    stored["headers"] = {key: value for key, value in (email.get("headers") or {}).items() if key in _THREAD_HEADERS}
+    review_id = add_pending_review(
+        email.get("id"), email["sender"], email["subject"], json.dumps(stored), reply,
+        json.dumps(list(meetings or []), default=str),
+        (analysis or {}).get("urgency", "normal"), (analysis or {}).get("category", "complex"),
+        (analysis or {}).get("reused_from"),
+    )
+    if review_id is not None:
+        queue_draft(review_id, email)
+        REVIEWS.inc(outcome="queued")
+    return review_id
+
+
+def approve_reviews(review_ids, edits=None):
+    """
+    Approves reviews: queues sending their replies and creating their meetings.
+
+    Args:
+        review_ids (list): Ids of pending reviews; already decided ones are skipped.
+        edits (dict): {review_id: edited reply} to send instead of the drafted text.
+
+    Returns:
+        list: Ids of the reviews approved by this call.
+    """
+    approved = []
+    for review_id in review_ids:
+        review = decide_review(review_id, "approved", (edits or {}).get(review_id))
+        if review is None:
+            continue
+        email, meetings = json.loads(review["email"]), json.loads(review["meetings"])
+        queue_review_reply(review_id, email)
+        update_email_status(review["message_id"], "replied")
+        if meetings:
+            queue_calendar_events(meetings, email)
+        # A reply reused from the index is already in it; only an operator's edit makes it a new one
+        if not review["reused_from"] or review["edited"]:
+            try:
+                remember_reply(email, review["reply"], review["urgency"], review["category"], meetings)
+            except Exception as e:
+                logger.warning("Could not index reply", extra={"review_id": review_id, "error": str(e)})
+        REVIEWS.inc(outcome="approved")
+        approved.append(review_id)
+    return approved
+
+
+def reject_reviews(review_ids):
+    """
+    Rejects reviews: nothing is sent and their Gmail drafts are deleted.
+
+    Returns:
+        list: Ids of the reviews rejected by this call.
+    """
+    rejected = []
+    for review_id in review_ids:
+        review = decide_review(review_id, "rejected")
+        if review is None:
+            continue
+        queue_draft_discard(review_id, json.loads(review["email"]))
+        update_email_status(review["message_id"], "rejected")
+        REVIEWS.inc(outcome="rejected")
+        rejected.append(review_id)
+    return rejected
+
+
+def parse_ids(spec, reviews):
+    """
+    Turns 'all', '3' or '1,4-6' into the ids of `reviews` it names.
+
+    Raises:
+        ValueError: If the spec is malformed or names an id that isn't pending.
+    """
+    pending = [review["id"] for review in reviews]
+    if spec.strip().lower() == "all":
+        return pending
+
+    ids = []
+    for part in spec.replace(" ", "").split(","):
+        first, _, last = part.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    unknown = sorted(set(ids) - set(pending))
+    if unknown:
+        raise ValueError(f"Not pending: {', '.join(map(str, unknown))}")
+    return ids
+
+
+def format_review(review, edits=None, full=False):
+    reply = (edits or {}).get(review["id"], review["reply"])
+    meetings = json.loads(review["meetings"])
+    flags = []
+    if review["id"] in (edits or {}):
+        flags.append("edited")
+    if meetings:
+        flags.append(f"{len(meetings)} meeting(s)")
+    if review["urgency"] == "high":
+        flags.append("urgent")
+    header = f"[{review['id']}] {review['sender']}: {review['subject']}" + (f" ({', '.join(flags)})" if flags else "")
+    if not full:
+        first_line = next((line for line in reply.splitlines()[1:] if line.strip()), "")
+        return f"{header}\n      {first_line[:100]}"
+    body = json.loads(review["email"])["body"]
+    return f"{header}\n\n--- Email ---\n{body.strip()}\n\n--- Reply ---\n{reply}\n"
+
+
+def edit_text(text):
+    """
+    Opens `text` in EDITOR and returns the result; without an editor, reads a new text
+    from the terminal up to a line with a single '.'.
+    """
+    if EDITOR:
+        with tempfile.NamedTemporaryFile("w+", suffix=".txt", delete=False, encoding="utf-8") as f:
+            f.write(text)
+            path = f.name
+        try:
+            subprocess.call(shlex.split(EDITOR) + [path])
+            with open(path, encoding="utf-8") as f:
+                return f.read().strip()
+        finally:
+            os.unlink(path)
+
+    print("Type the new reply, then a line with a single '.':")
+    lines = []
+    while True:
+        line = input()
+        if line == ".":
+            return "\n".join(lines).strip()
+        lines.append(line)
+
+
+def review_interactively():
+    """
+    The bulk review loop: list pending reviews, then approve, edit or reject many at once.
+    """
+    edits = {}
+    reviews = get_pending_reviews()
+    if not reviews:
+        print("No replies waiting for review.")
+        return
+
+    print("\n".join(format_review(review, edits) for review in reviews))
+    print(HELP)
+    while reviews:
+        try:
+            command = input("review> ").strip()
+        except EOFError:
+            break
+        action, _, argument = command.partition(" ")
+        action = action.lower()
+        try:
+            if action in ("q", "quit"):
+                break
+            elif action in ("l", "list"):
+                print("\n".join(format_review(review, edits) for review in reviews))
+            elif action in ("v", "view"):
+                for review_id in parse_ids(argument, reviews):
+                    print(format_review(next(r for r in reviews if r["id"] == review_id), edits, full=True))
+            elif action in ("e", "edit"):
+                (review_id,) = parse_ids(argument, reviews)
+                review = next(r for r in reviews if r["id"] == review_id)
+                text = edit_text(edits.get(review_id, review["reply"]))
+                if text and text != review["reply"]:
+                    edits[review_id] = text
+                    print(f"Edited [{review_id}]; approve it to send the new text.")
+            elif action in ("a", "approve"):
+                done = approve_reviews(parse_ids(argument, reviews), edits)
+                print(f"Approved {len(done)} repl{'y' if len(done) == 1 else 'ies'}.")
+            elif action in ("r", "reject"):
+                done = reject_reviews(parse_ids(argument, reviews))
+                print(f"Rejected {len(done)} repl{'y' if len(done) == 1 else 'ies'}.")
+            else:
+                print(HELP)
+                continue
+        except ValueError as e:
+            print(f"{e}. Expected IDS as 'all', '3' or '1,4-6' (and a single id for 'e').")
+            continue
+        reviews = get_pending_reviews()
+
+    unsaved = [review_id for review_id in edits if any(r["id"] == review_id for r in reviews)]
+    if unsaved:
+        print(f"Edits of {', '.join(map(str, unsaved))} were not approved and are discarded.")
+
+
+def run_review(approve=None, reject=None):
+    """
+    Entry point of `python main.py --review`: decides pending replies and sends the approved ones.
+
+    Args:
+        approve (str): Ids to approve without prompting ('all', '3' or '1,4-6').
+        reject (str): Ids to reject without prompting.
+        With neither, the interactive review loop runs.
+    """
+    init_db()
+    outbound = OutboundWorkerPool().start()
+    try:
+        if approve or reject:
+            reviews = get_pending_reviews()
+            rejected = reject_reviews(parse_ids(reject, reviews)) if reject else []
+            approved = approve_reviews(parse_ids(approve, reviews)) if approve else []
+            logger.info(f"Approved {len(approved)}, rejected {len(rejected)} repl(ies)",
+                        extra={"approved": approved, "rejected": rejected})
+        else:
+            review_interactively()
+    finally:
+        # Sends what was approved before exiting; failures stay queued for the next run
+        outbound.stop(drain=True)
+    logger.info(f"{count_pending_reviews()} repl(ies) still waiting for review")
@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+MAIN_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../main.py"))
+# Marks a `main.py` started by the supervisor, which serves one mailbox even when ACCOUNTS_FILE is set
+WORKER_FLAG = "--worker"
+
+# Mailbox config of the multi-account mode (see `load_accounts`); empty means a single mailbox
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "")
+# Crashed workers are restarted after SUPERVISOR_BACKOFF_BASE * 2**crashes seconds, capped at SUPERVISOR_BACKOFF_MAX
+RESTART_BACKOFF_BASE = float(os.getenv("SUPERVISOR_BACKOFF_BASE", "2"))
+RESTART_BACKOFF_MAX = float(os.getenv("SUPERVISOR_BACKOFF_MAX", "300"))
+# Crashes in a row after which a mailbox is given up on
+MAX_RESTARTS = int(os.getenv("SUPERVISOR_MAX_RESTARTS", "5"))
+# A daemon worker that stayed up this long (seconds) is healthy again: its crash count starts over
+HEALTHY_AFTER = 600
+# Seconds workers get to drain after SIGTERM before they are killed
+STOP_TIMEOUT = float(os.getenv("DAEMON_DRAIN_TIMEOUT", "30")) + 30
+
+# Quotas of one API key or workspace shared by all mailboxes, split evenly between concurrent workers.
+# Gmail, Calendar and People quotas are per user, so every worker keeps its full budget for those.
+SHARED_QUOTAS = {
+    "OPENAI_REQUESTS_PER_MINUTE": "500",
+    "OPENAI_TOKENS_PER_MINUTE": "30000",
+    "RATE_SEARCH": "1.6",
+    "RATE_SLACK": "1",
+}
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def load_accounts(path):
+    """
+    Reads the multi-mailbox config file:
+
+        {
+          "workers": 4,
+          "state_dir": "accounts",
+          "metrics_base_port": 9110,
+          "quotas": {"OPENAI_REQUESTS_PER_MINUTE": 3000},
+          "mailboxes": [
+            {"name": "support", "env": {"SLACK_CHANNEL_ID": "C0123"}},
+            {"name": "sales", "token_file": "tokens/sales.json", "env": {"RATE_GMAIL_UNITS": "100"}}
+          ]
+        }
+
+    Every mailbox gets its own token file, database and logs under `state_dir/<name>/`
+    unless `token_file` / `db_path` say otherwise; `credentials_file` (the OAuth client)
+    defaults to the shared GOOGLE_CREDENTIALS_FILE. `env` sets any other variable for that
+    mailbox only. Relative paths are relative to the config file.
+
+    Returns:
+        dict: The config, with defaults filled in and paths made absolute.
+
+    Raises:
+        ValueError: If a mailbox has no name, an invalid one, or a duplicate one.
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value):
+        return os.path.normpath(os.path.join(base, value))
+
+    config["workers"] = int(config.get("workers") or os.cpu_count() or 1)
+    config["state_dir"] = resolve(config.get("state_dir", "accounts"))
+    credentials = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+
+    mailboxes, seen = [], set()
+    for mailbox in config.get("mailboxes", []):
+        name = mailbox.get("name", "")
+        if not _NAME_RE.match(name) or name in seen:
+            raise ValueError(f"Mailbox names must be unique and use only letters, digits, '_', '.' or '-': '{name}'")
+        seen.add(name)
+        if not mailbox.get("enabled", True):
+            continue
+        directory = os.path.join(config["state_dir"], name)
+        mailboxes.append(dict(
+            mailbox,
+            directory=directory,
+            token_file=resolve(mailbox["token_file"]) if mailbox.get("token_file") else os.path.join(directory, "token.json"),
+            credentials_file=resolve(mailbox.get("credentials_file", credentials)),
+            db_path=resolve(mailbox["db_path"]) if mailbox.get("db_path") else os.path.join(directory, "emails.db"),
+            env={key: str(value) for key, value in mailbox.get("env", {}).items()},
+        ))
+    config["mailboxes"] = mailboxes
+    return config
+
+
+def worker_environment(mailbox, index, concurrent, config):
+    """
+    Environment of a mailbox's worker process: its own credentials, database and log tag,
+    an even share of the shared quotas, and the mailbox's own `env` on top.
+    """
+    env = dict(os.environ)
+    env.update({
+        "MAILBOX_NAME": mailbox["name"],
+        "GMAIL_TOKEN_FILE": mailbox["token_file"],
+        "GOOGLE_CREDENTIALS_FILE": mailbox["credentials_file"],
+        "EMAIL_DB_PATH": mailbox["db_path"],
+        # The supervisor serves metrics per worker, never on the parent's port
+        "METRICS_PORT": str(config["metrics_base_port"] + index) if config.get("metrics_base_port") else "0",
+    })
+    quotas = config.get("quotas", {})
+    for name, default in SHARED_QUOTAS.items():
+        total = float(quotas.get(name, os.getenv(name, default)))
+        env[name] = str(total / max(1, concurrent))
+    env.update(mailbox["env"])
+    return env
+
+
+class _Worker:
+    def __init__(self, mailbox, index):
+        self.mailbox = mailbox
+        self.index = index
+        self.process = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restarts = 0
+        self.not_before = 0.0
+        self.status = "pending"  # pending, running, done, failed, stopped
+        self.exit_code = None
+
+
+class Supervisor:
+    """
+    Runs one `main.py` worker process per mailbox and restarts the ones that crash.
+
+    Every worker is a separate interpreter with the environment of
+    `worker_environment`, so credentials, database, caches and rate-limit
+    buckets are never shared between mailboxes, and all cores are used.
+
+    In daemon mode every mailbox keeps a long-running `main.py --daemon` worker;
+    one that exits is restarted with exponential backoff, and given up on after
+    MAX_RESTARTS crashes in a row. Otherwise each mailbox gets one pass (like a
+    cron run), with at most `workers` passes at a time, and a pass that fails
+    is retried the same way.
+
+    Args:
+        config (dict): As returned by `load_accounts`.
+        daemon (bool): Keep every mailbox's worker running.
+        worker_args (list): Extra `main.py` arguments for every worker (e.g. ['--log-format', 'json']).
+        command (list): Program the workers run; defaults to this interpreter with `main.py --worker`.
+    """
+
+    def __init__(self, config, daemon=False, worker_args=(), command=None):
+        self.config = config
+        self.daemon = daemon
+        self.command = list(command or [sys.executable, MAIN_PATH, WORKER_FLAG]) + (["--daemon"] if daemon else []) + list(worker_args)
+        self.workers = [_Worker(mailbox, i) for i, mailbox in enumerate(config["mailboxes"])]
+        for worker in self.workers:
+            if not os.path.exists(worker.mailbox["token_file"]):
+                # A worker would block on the browser sign-in; that has to happen in the foreground first
+                worker.status = "failed"
+                logger.error("Mailbox has no token, run `python main.py --accounts FILE --login` first",
+                             extra={"mailbox": worker.mailbox["name"], "token_file": worker.mailbox["token_file"]})
+        runnable = sum(1 for w in self.workers if w.status == "pending")
+        self.concurrency = runnable if daemon else min(config["workers"], runnable)
+        self._stopping = False
+
+    def stop(self, *_):
+        """
+        Stops starting workers and asks the running ones to drain (SIGTERM).
+        """
+        if not self._stopping:
+            logger.info("Stopping mailbox workers")
+        self._stopping = True
+        for worker in self._running():
+            worker.process.send_signal(signal.SIGTERM)
+
+    def _running(self):
+        return [w for w in self.workers if w.status == "running"]
+
+    def _start(self, worker):
+        mailbox = worker.mailbox
+        os.makedirs(mailbox["directory"], exist_ok=True)
+        os.makedirs(os.path.dirname(mailbox["db_path"]), exist_ok=True)
+        env = worker_environment(mailbox, worker.index, self.concurrency, self.config)
+        worker.process = subprocess.Popen(self.command, env=env, cwd=os.path.dirname(MAIN_PATH))
+        worker.started_at = time.monotonic()
+        worker.status = "running"
+        logger.info("Started mailbox worker", extra={"mailbox": mailbox["name"], "pid": worker.process.pid,
+                                                     "restarts": worker.restarts})
+
+    def _reap(self, worker, code):
+        name = worker.mailbox["name"]
+        worker.exit_code = code
+        if self._stopping:
+            worker.status = "stopped"
+            return
+        if code == 0 and not self.daemon:
+            worker.status = "done"
+            logger.info("Mailbox pass finished", extra={"mailbox": name})
+            return
+
+        if self.daemon and time.monotonic() - worker.started_at >= HEALTHY_AFTER:
+            worker.crashes = 0
+        worker.crashes += 1
+        if worker.crashes > MAX_RESTARTS:
+            worker.status = "failed"
+            logger.error("Mailbox worker keeps crashing, giving up", extra={"mailbox": name, "exit_code": code,
+                                                                            "crashes": worker.crashes})
+            return
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * 2 ** (worker.crashes - 1))
+        worker.status = "pending"
+        worker.not_before = time.monotonic() + delay
+        worker.restarts += 1
+        logger.warning("Mailbox worker exited, restarting", extra={"mailbox": name, "exit_code": code,
+                                                                   "delay": delay, "crashes": worker.crashes})
+
+    def run(self, poll_interval=0.5):
+        """
+        Supervises the workers until every pass is done (or, in daemon mode, until SIGINT/SIGTERM).
+
+        Returns:
+            dict: {mailbox name: {"status", "restarts", "exit_code"}}.
+        """
+        handlers = {sig: signal.signal(sig, self.stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        stop_deadline = None
+        try:
+            while True:
+                for worker in self._running():
+                    code = worker.process.poll()
+                    if code is not None:
+                        self._reap(worker, code)
+
+                if self._stopping:
+                    stop_deadline = stop_deadline or time.monotonic() + STOP_TIMEOUT
+                    if not self._running():
+                        break
+                    if time.monotonic() > stop_deadline:
+                        for worker in self._running():
+                            logger.warning("Killing mailbox worker", extra={"mailbox": worker.mailbox["name"]})
+                            worker.process.kill()
+                            worker.process.wait()
+                            worker.status = "stopped"
+                        break
+                else:
+                    now = time.monotonic()
+                    free = self.concurrency - len(self._running())
+                    for worker in self.workers:
+                        if free <= 0:
+                            break
+                        if worker.status == "pending" and worker.not_before <= now:
+                            self._start(worker)
+                            free -= 1
+                    if not any(w.status in ("pending", "running") for w in self.workers):
+                        break
+                time.sleep(poll_interval)
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+
+        summary = {w.mailbox["name"]: {"status": w.status, "restarts": w.restarts, "exit_code": w.exit_code}
+                   for w in self.workers}
+        logger.info("Mailbox workers finished", extra={"mailboxes": summary})
+        return summary
+
+
+def login_accounts(config, command=None):
+    """
+    Runs the OAuth sign-in, in the foreground, for every mailbox that has no token yet.
+    """
+    for index, mailbox in enumerate(config["mailboxes"]):
+        if os.path.exists(mailbox["token_file"]):
+            continue
+        print(f"Sign in to the Google account of mailbox '{mailbox['name']}'")
+        os.makedirs(mailbox["directory"], exist_ok=True)
+        env = worker_environment(mailbox, index, 1, config)
+        subprocess.run(list(command or [sys.executable, MAIN_PATH, WORKER_FLAG]) + ["--login"], env=env, check=True,
+                       cwd=os.path.dirname(MAIN_PATH))
+
+
+def run_accounts(path, daemon=False, login=False, worker_args=()):
+    """
+    Entry point of `python main.py --accounts FILE`.
+
+    Returns:
+        int: Process exit code: 0 when every mailbox finished (or stopped) cleanly, 1 if one was given up on.
+    """
+    config = load_accounts(path)
+    if not config["mailboxes"]:
+        logger.warning("No enabled mailboxes in the config", extra={"path": path})
+        return 0
+    if login:
+        login_accounts(config)
+        return 0
+    summary = Supervisor(config, daemon=daemon, worker_args=worker_args).run()
+    return 1 if any(entry["status"] == "failed" for entry in summary.values()) else 0
@@ -0,0 +1,165 @@
+import json
+import os
+import re
+import sys
+import threading
+from email.utils import parseaddr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.authentication.gmail_auth import get_service
+from src.controllers.email_controller import parse_email, extract_email_body
+from src.db.database import get_cached_thread, put_cached_thread
+from src.utils.concurrency import limited
+from src.utils.log import get_logger
+from src.utils.metrics import CACHE_LOOKUPS
+from src.utils.rate_limiter import GMAIL_COSTS
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+# Token budget for the email plus its thread history in the LLM prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Share of the budget the current email may use before its own body is truncated
+CURRENT_EMAIL_SHARE = 0.6
+# Put between the turns of the thread history
+TURN_SEPARATOR = "\n\n---\n\n"
+
+logger = get_logger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9']{3,}")
+
+context_stats = {"threads": 0, "naive_tokens": 0, "packed_tokens": 0}
+_stats_lock = threading.Lock()
+
+
+def _is_reply(email):
+    """
+    True if the email continues an earlier conversation (so there is history worth fetching).
+    """
+    headers = email.get("headers") or {}
+    if "in-reply-to" in headers or "references" in headers:
+        return True
+    return bool(re.match(r"^\s*(re|fwd?|aw|sv)\s*:", email.get("subject", ""), re.IGNORECASE))
+
+
+@limited("gmail", cost=GMAIL_COSTS["threads.get"])
+def _fetch_thread(thread_id):
+    service = get_service("gmail", "v1")
+    return service.users().threads().get(userId="me", id=thread_id, format="full").execute()
+
+
+def get_thread_turns(email):
+    """
+    Returns the parsed messages of the email's thread, oldest first, and the naive token count.
+
+    Threads are cached in the local database; the cache is reused as long as it
+    already contains the current message, so re-processing costs no API call.
+    """
+    thread_id = email.get("thread_id")
+    cached = get_cached_thread(thread_id)
+    if cached and email.get("id") in cached["message_ids"]:
+        CACHE_LOOKUPS.inc(cache="thread", outcome="hit")
+        return json.loads(cached["turns"]), cached["naive_tokens"]
+    CACHE_LOOKUPS.inc(cache="thread", outcome="miss")
+
+    thread = _fetch_thread(thread_id)
+    turns = []
+    naive_tokens = 0
+    for message in thread.get("messages", []):
+        parsed = parse_email(message)
+        turns.append({key: parsed[key] for key in ("id", "sender", "received_at", "body")})
+        # What a naive prompt would carry: every raw body, quoted history included
+        naive_tokens += count_tokens(extract_email_body(message["payload"], strip_quotes=False))
+
+    put_cached_thread(thread_id, [turn["id"] for turn in turns], json.dumps(turns), naive_tokens)
+    return turns, naive_tokens
+
+
+def _dedupe_paragraphs(turns):
+    """
+    Drops paragraphs already seen in a more recent turn (signatures, pasted text, leftover quotes).
+    """
+    seen = set()
+    deduped = []
+    for turn in reversed(turns):
+        paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", turn["body"]):
+            key = " ".join(paragraph.lower().split())
+            if key and key not in seen:
+                seen.add(key)
+                paragraphs.append(paragraph.strip())
+        if paragraphs:
+            deduped.append(dict(turn, body="\n\n".join(paragraphs)))
+    return list(reversed(deduped))
+
+
+def pack_turns(turns, current_body, budget):
+    """
+    Chooses the prior turns that fit in `budget` tokens, most relevant first.
+
+    Relevance mixes recency with word overlap with the current email. Every turn
+    after the first also pays for the TURN_SEPARATOR it is joined with. The
+    chosen turns are returned in chronological order.
+    """
+    current_words = set(_WORD_RE.findall(current_body.lower()))
+    scored = []
+    for position, turn in enumerate(turns):
+        words = set(_WORD_RE.findall(turn["body"].lower()))
+        overlap = len(words & current_words) / (len(words | current_words) or 1)
+        recency = (position + 1) / len(turns)
+        scored.append((0.5 * recency + 0.5 * overlap, position, turn))
+
+    separator = count_tokens(TURN_SEPARATOR)
+    chosen = []
+    remaining = budget
+    for _, position, turn in sorted(scored, key=lambda item: item[0], reverse=True):
+        text = _format_turn(turn)
+        tokens = count_tokens(text) + (separator if chosen else 0)
+        if tokens <= remaining:
+            chosen.append((position, text))
+            remaining -= tokens
+
+    return [text for _, text in sorted(chosen)]
+
+
+def _format_turn(turn):
+    name = parseaddr(turn["sender"])[0] or parseaddr(turn["sender"])[1]
+    return f"From {name}:\n{turn['body']}"
+
+
+def build_thread_context(email, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Assembles the LLM input for an email: its (possibly truncated) body and the
+    most relevant earlier turns of its thread, within `budget` tokens in total.
+
+    Returns:
+        tuple: (email body to send, thread history text, or "" when there is none).
+    """
+    body = truncate_to_tokens(email["body"], int(budget * CURRENT_EMAIL_SHARE))
+    if not email.get("thread_id") or not _is_reply(email):
+        return body, ""
+
+    try:
+        turns, naive_tokens = get_thread_turns(email)
+    except Exception as e:
+        logger.warning("Could not load thread history", extra={"thread_id": email["thread_id"], "error": str(e)})
+        return body, ""
+
+    prior = _dedupe_paragraphs([turn for turn in turns if turn["id"] != email.get("id")])
+    history = TURN_SEPARATOR.join(pack_turns(prior, body, budget - count_tokens(body)))
+
+    with _stats_lock:
+        context_stats["threads"] += 1
+        context_stats["naive_tokens"] += naive_tokens
+        context_stats["packed_tokens"] += count_tokens(body) + count_tokens(history)
+
+    return body, history
+
+
+def get_context_stats():
+    """
+    Returns thread-context counters, including the tokens saved against naive concatenation.
+    """
+    with _stats_lock:
+        stats = dict(context_stats)
+    stats["tokens_saved"] = max(0, stats["naive_tokens"] - stats["packed_tokens"])
+    return stats
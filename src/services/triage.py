@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from email.utils import parseaddr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.models.triage_model import NaiveBayesModel
+
+# Routes an email can take through the pipeline
+ROUTE_SKIP = "skip"          # store only: no LLM call, no reply
+ROUTE_TEMPLATE = "template"  # canned acknowledgement, no LLM call
+ROUTE_LLM = "llm"            # full analysis
+ROUTE_REUSED = "reused"      # LLM route answered with the reply of a near-duplicate email (see reply_index)
+
+CONFIG_PATH = os.getenv("TRIAGE_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "triage_config.json"))
+
+TEMPLATE_REPLY = (
+    "Dear {sender_name},\n\n"
+    "Thank you for your email. I have received it and will follow up if anything else is needed.\n\n"
+    "Best Regards,\n{user_name}"
+)
+
+_config = None
+_model = None
+_loaded = False
+_load_lock = threading.Lock()
+
+# Routing counters for the current cycle: {"skip": n, ...} and {"skip:list-unsubscribe": n, ...}
+_stats_lock = threading.Lock()
+route_counts = Counter()
+reason_counts = Counter()
+
+
+def _load():
+    global _config, _model, _loaded
+    with _load_lock:
+        if not _loaded:
+            with open(CONFIG_PATH, encoding="utf-8") as f:
+                _config = json.load(f)
+            _model = NaiveBayesModel.load()
+            _loaded = True
+    return _config, _model
+
+
+def _matches(address, entries):
+    """
+    True if `address` equals an entry, or its domain matches an '@domain' entry.
+    """
+    domain = "@" + address.rsplit("@", 1)[-1] if "@" in address else None
+    return any(entry.lower() == address or entry.lower() == domain for entry in entries)
+
+
+def triage_email(email, labels):
+    """
+    Decides, from cheap local signals only, how much work an email deserves.
+
+    Checked in order: sender allow list (always full LLM), deny list, no-reply
+    senders, bulk-mail headers (List-Unsubscribe, Precedence, Auto-Submitted),
+    the bag-of-words model, and finally the 'simple' keyword rule for short
+    emails, which get a template reply unless they mention a meeting (only the
+    LLM extracts meetings for the calendar).
+
+    Args:
+        email (dict): Parsed email, with a 'headers' dict of lowercased header names.
+        labels (set): Keyword rules matched by `classify_email`.
+
+    Returns:
+        tuple: (route, reason).
+    """
+    config, model = _load()
+    decided = _route_by_headers(config, email)
+    if decided is not None:
+        return _record(*decided)
+
+    if model is not None:
+        probabilities = model.predict_proba(email["subject"] + "\n" + email["body"])
+        if probabilities.get("bulk", 0) >= config.get("bulk_threshold", 0.9):
+            return _record(ROUTE_SKIP, "model")
+
+    if "simple" in labels and "meeting" not in labels \
+            and len(email["body"].split()) <= config.get("template_max_words", 80):
+        return _record(ROUTE_TEMPLATE, "simple-keywords")
+
+    return _record(ROUTE_LLM, "default")
+
+
+def _route_by_headers(config, email):
+    """
+    The (route, reason) that the sender and headers alone decide, or None if the body has to be read.
+    """
+    headers = email.get("headers") or {}
+    address = parseaddr(email["sender"])[1].lower()
+
+    if _matches(address, config.get("allow", [])):
+        return ROUTE_LLM, "allow-list"
+    if _matches(address, config.get("deny", [])):
+        return ROUTE_SKIP, "deny-list"
+    if any(pattern in address for pattern in config.get("noreply_patterns", [])):
+        return ROUTE_SKIP, "no-reply-sender"
+
+    if headers.get("precedence", "").strip().lower() in ("bulk", "list", "junk"):
+        return ROUTE_SKIP, "precedence"
+    if headers.get("auto-submitted", "no").strip().lower() != "no":
+        return ROUTE_SKIP, "auto-submitted"
+    if "list-unsubscribe" in headers:
+        return ROUTE_SKIP, "list-unsubscribe"
+    return None
+
+
+def needs_full_body(email):
+    """
+    False when `triage_email` will skip the email on its sender or headers alone,
+    so its body never needs to be downloaded (see `fetch_emails_by_ids`).
+
+    Args:
+        email (dict): Email parsed from a format=metadata fetch (headers and snippet only).
+    """
+    config, _ = _load()
+    decided = _route_by_headers(config, email)
+    return decided is None or decided[0] != ROUTE_SKIP
+
+
+def template_reply(sender_name, user_name):
+    return TEMPLATE_REPLY.format(sender_name=sender_name, user_name=user_name)
+
+
+def _record(route, reason):
+    with _stats_lock:
+        route_counts[route] += 1
+        reason_counts[f"{route}:{reason}"] += 1
+    return route, reason
+
+
+def get_triage_stats(reset=False):
+    """
+    Returns the routing counters, including how many LLM calls were avoided.
+
+    Args:
+        reset (bool): Start a new cycle after reading the counters.
+    """
+    with _stats_lock:
+        total = sum(route_counts.values())
+        stats = {
+            "total": total,
+            "routes": dict(route_counts),
+            "reasons": dict(reason_counts),
+            "llm_calls_avoided": route_counts[ROUTE_SKIP] + route_counts[ROUTE_TEMPLATE],
+            "skip_rate": route_counts[ROUTE_SKIP] / total if total else 0.0,
+        }
+        if reset:
+            route_counts.clear()
+            reason_counts.clear()
+    return stats
+
+
+def format_triage_stats(stats):
+    return (f"Triage: {stats['total']} email(s), routes {stats['routes']}, "
+            f"{stats['llm_calls_avoided']} LLM call(s) avoided, skip rate {stats['skip_rate']:.0%}")
@@ -1,64 +1,179 @@
 import datetime
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+import hashlib
 import os
+import sys
+import threading
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from googleapiclient.errors import HttpError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.authentication.gmail_auth import get_service
+from src.db.database import (
+    get_sync_state, set_sync_state, upsert_calendar_events, delete_calendar_events,
+    get_calendar_events_between, get_calendar_event_by_source,
+)
+from src.utils.concurrency import throttled
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+CALENDAR_ID = "primary"
+
+# Key under which the Calendar API's nextSyncToken is stored in the sync_state table
+SYNC_TOKEN_KEY = "calendar_sync_token"
+# Private extended property that marks events created by the assistant, with their meeting fingerprint
+SOURCE_PROPERTY = "assistantSourceKey"
+
+# Skip meetings that overlap a busy event instead of creating them as tentative
+SKIP_CONFLICTS = os.getenv("CALENDAR_SKIP_CONFLICTS", "0") == "1"
+# Inserts per batch request
+INSERT_BATCH_SIZE = 50
+EVENT_DURATION = datetime.timedelta(hours=1)
+# Cached events that ended longer ago than this are dropped after a sync
+KEEP_PAST = datetime.timedelta(days=1)
+# A sync younger than this is reused; the assistant's own inserts are cached as they are made
+SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "60"))
+
+_sync_lock = threading.Lock()
+_last_sync = 0.0
 
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
 def get_calendar_service():
     """
-    Authenticates and returns the Google Calendar API service.
-    """
-    creds = None
-    # Check if token file exists and load the credentials
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    
-    # If credentials are invalid or expired, refresh or request new credentials
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())  # Refresh the expired token
-        else:
-            # Start OAuth flow to get new credentials
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        # Save credentials for future use
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    
-    # Return the Calendar API service
-    return build("calendar", "v3", credentials=creds)
+    Returns the Google Calendar API service, sharing the process-wide credentials
+    and the client already built for this thread.
+    """
+    return get_service("calendar", "v3")
 
-def create_calender_event(event_details):
+
+def sync_calendar(service=None, max_age=0.0):
     """
-    Creates a calendar event based on the provided event details.
+    Brings the local cache of calendar events up to date.
+
+    Uses the stored `syncToken`, so only events changed since the previous sync
+    are transferred; the first run (or an expired token, HTTP 410) does a full sync.
+    Nothing is fetched if this process synced less than `max_age` seconds ago.
+
+    Returns:
+        int: Number of events added, changed or removed in the cache.
+    """
+    if service is None:
+        service = get_calendar_service()
+
+    global _last_sync
+    with _sync_lock:
+        if max_age and time.monotonic() - _last_sync < max_age:
+            return 0
+
+        sync_token = get_sync_state(SYNC_TOKEN_KEY)
+        try:
+            changed, removed, next_token = _list_changes(service, sync_token)
+        except HttpError as e:
+            if sync_token is None or getattr(e.resp, "status", None) != 410:
+                raise
+            logger.info("Calendar sync token expired, running a full sync")
+            delete_calendar_events()
+            changed, removed, next_token = _list_changes(service, None)
+
+        upsert_calendar_events(changed)
+        if removed:
+            delete_calendar_events(event_ids=removed)
+        if next_token:
+            set_sync_state(SYNC_TOKEN_KEY, next_token)
+
+        horizon = datetime.datetime.now(datetime.timezone.utc) - KEEP_PAST
+        delete_calendar_events(ended_before=horizon.timestamp())
+        _last_sync = time.monotonic()
+        return len(changed) + len(removed)
+
+
+def _list_changes(service, sync_token):
+    """
+    Pages through `events.list` and returns (changed cache rows, removed event ids, nextSyncToken).
+    """
+    changed, removed = [], []
+    page_token = None
+
+    while True:
+        # singleEvents must stay the same between the full sync and the incremental ones
+        params = {"calendarId": CALENDAR_ID, "singleEvents": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        if page_token:
+            params["pageToken"] = page_token
+
+        with throttled("calendar"):
+            results = service.events().list(**params).execute()
+
+        for item in results.get("items", []):
+            if item.get("status") == "cancelled" or "start" not in item:
+                removed.append(item["id"])
+            else:
+                changed.append(_cache_row(item))
+
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return changed, removed, results.get("nextSyncToken")
+
+
+def _cache_row(item):
+    declined = any(a.get("self") and a.get("responseStatus") == "declined" for a in item.get("attendees", []))
+    return {
+        "event_id": item["id"],
+        "summary": item.get("summary", ""),
+        "start_ts": _timestamp(item["start"]),
+        "end_ts": _timestamp(item["end"]),
+        "all_day": "date" in item["start"],
+        # Free time and declined invitations don't block a new meeting
+        "transparent": item.get("transparency") == "transparent" or declined,
+        "source_key": item.get("extendedProperties", {}).get("private", {}).get(SOURCE_PROPERTY),
+    }
+
+
+def _timestamp(when):
+    if "dateTime" in when:
+        return datetime.datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00")).timestamp()
+    return datetime.datetime.fromisoformat(when["date"]).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def source_key(event_details):
+    """
+    Fingerprint of an extracted meeting: title (case and spacing ignored), date, time and time zone.
+    """
+    title = " ".join(str(event_details["title"]).lower().split())
+    material = "\x1f".join([title, event_details["date"], event_details["time"], event_details["timezone"]])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def _build_event(event_details):
+    """
+    Validates extracted meeting details and returns (event body, start timestamp, end timestamp), or None.
     """
-    # Debugging: Print the event details to ensure it's a dictionary and has the expected structure
-    print("Event details:", event_details)
-    
     # Check if event_details is a dictionary
     if not isinstance(event_details, dict):
-        print("⚠️ Expected a dictionary, but received:", type(event_details))
-        return  # Exit the function if event_details is not a dictionary
-    
+        logger.warning("Expected a dictionary of meeting details", extra={"received": type(event_details).__name__})
+        return None
+
     # Check if necessary keys exist in event_details
     required_keys = ['date', 'time', 'title', 'timezone']
     for key in required_keys:
         if key not in event_details:
-            print(f"⚠️ Missing key in event_details: {key}")
-            return  # Exit the function if any key is missing
-    
-    # Get the authenticated calendar service
-    service = get_calendar_service()
-
-    # Parse the event start date and time from the event details
-    start_dt = datetime.datetime.strptime(f"{event_details['date']} {event_details['time']}", "%Y-%m-%d %H:%M:%S")
-    
+            logger.warning("Missing key in meeting details", extra={"key": key})
+            return None
+
+    try:
+        # Parse the event start date and time from the event details
+        start_dt = datetime.datetime.strptime(f"{event_details['date']} {event_details['time']}", "%Y-%m-%d %H:%M:%S")
+        zone = ZoneInfo(event_details["timezone"])
+    except (ValueError, ZoneInfoNotFoundError) as e:
+        logger.warning("Invalid meeting date, time or time zone", extra={"error": str(e)})
+        return None
+
     # Set the event end time (1 hour after the start time)
-    end_dt = start_dt + datetime.timedelta(hours=1)
+    end_dt = start_dt + EVENT_DURATION
 
     # Define the event details for the Google Calendar API
     event = {
@@ -72,14 +187,132 @@ def create_calender_event(event_details):
             "dateTime": end_dt.isoformat(),  # Event end time
             "timeZone": event_details["timezone"],  # Time zone for the event
         },
+        "extendedProperties": {"private": {SOURCE_PROPERTY: source_key(event_details)}},
     }
+    return event, start_dt.replace(tzinfo=zone).timestamp(), end_dt.replace(tzinfo=zone).timestamp()
+
+
+def _find_duplicate(event, start_ts, end_ts):
+    """
+    Returns the id of an existing event for the same meeting: created earlier by the
+    assistant from the same details, or with the same title at the same time.
+    """
+    existing = get_calendar_event_by_source(event["extendedProperties"]["private"][SOURCE_PROPERTY])
+    if existing:
+        return existing
+    title = " ".join(event["summary"].lower().split())
+    for cached in get_calendar_events_between(start_ts, end_ts):
+        if cached["start_ts"] == start_ts and " ".join((cached["summary"] or "").lower().split()) == title:
+            return cached["event_id"]
+    return None
+
+
+def _find_conflicts(start_ts, end_ts):
+    return [e for e in get_calendar_events_between(start_ts, end_ts) if not e["all_day"] and not e["transparent"]]
+
+
+def create_calendar_events(events_details, service=None):
+    """
+    Creates calendar events for a list of extracted meetings.
+
+    The local event cache is synced first (at most every SYNC_INTERVAL seconds);
+    meetings that already exist are skipped, and meetings that overlap a busy
+    event are created as tentative (with the clashing events named in the
+    description) or skipped when CALENDAR_SKIP_CONFLICTS=1. All remaining
+    inserts go out in batch requests, so the meetings of one email cost a
+    single round-trip.
+
+    Returns:
+        list: One dict per meeting with 'title', 'status' ('created', 'duplicate',
+        'conflict_skipped', 'invalid' or 'failed'), and 'event_id' / 'link' / 'conflicts' where known.
+
+    Raises:
+        HttpError: The first failed insert, after the others have been created (a retry
+        then skips the created ones as duplicates).
+    """
+    if service is None:
+        service = get_calendar_service()
+    sync_calendar(service, max_age=SYNC_INTERVAL)
 
-    # Insert the event into the calendar
-    event_result = service.events().insert(calendarId="primary", body=event).execute()
+    outcomes = []
+    to_insert = []
+    seen = set()
 
-    # Print success message and event details
-    print("✅ Event created successfully.")
-    print("📅 Summary:", event_result['summary'])
-    print("🔗 Link:", event_result.get('htmlLink'))
+    for details in events_details:
+        built = _build_event(details)
+        if built is None:
+            outcomes.append({"title": details.get("title") if isinstance(details, dict) else None, "status": "invalid"})
+            continue
 
+        event, start_ts, end_ts = built
+        outcome = {"title": event["summary"]}
+        outcomes.append(outcome)
 
+        key = event["extendedProperties"]["private"][SOURCE_PROPERTY]
+        duplicate = _find_duplicate(event, start_ts, end_ts)
+        if key in seen or duplicate:
+            outcome.update(status="duplicate", event_id=duplicate)
+            logger.info("Skipping duplicate meeting", extra={"title": event["summary"], "event_id": duplicate})
+            continue
+        seen.add(key)
+
+        conflicts = _find_conflicts(start_ts, end_ts)
+        if conflicts:
+            names = ", ".join(c["summary"] or "(busy)" for c in conflicts)
+            outcome["conflicts"] = [c["event_id"] for c in conflicts]
+            if SKIP_CONFLICTS:
+                outcome["status"] = "conflict_skipped"
+                logger.warning("Skipping overlapping meeting", extra={"title": event["summary"], "overlaps": names})
+                continue
+            logger.warning("Meeting overlaps, creating it as tentative",
+                           extra={"title": event["summary"], "overlaps": names})
+            event["status"] = "tentative"
+            event["description"] += f"\n\nOverlaps with: {names}"
+
+        to_insert.append((event, outcome))
+
+    errors = []
+    for i in range(0, len(to_insert), INSERT_BATCH_SIZE):
+        errors.extend(_insert_batch(service, to_insert[i:i + INSERT_BATCH_SIZE]))
+    if errors:
+        raise errors[0]
+    return outcomes
+
+
+def _insert_batch(service, chunk):
+    """
+    Inserts a chunk of events in one batch request and records them in the cache. Returns the errors.
+    """
+    created = {}
+    errors = []
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+            chunk[int(request_id)][1].update(status="failed", error=str(exception))
+            return
+        created[int(request_id)] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for index, (event, _) in enumerate(chunk):
+        batch.add(service.events().insert(calendarId=CALENDAR_ID, body=event), request_id=str(index))
+
+    # Each insert in the batch counts against the quota on its own
+    with throttled("calendar", cost=len(chunk)):
+        batch.execute()
+
+    for index, event_result in created.items():
+        chunk[index][1].update(status="created", event_id=event_result["id"], link=event_result.get("htmlLink"))
+        logger.info("Event created", extra={"title": event_result["summary"], "link": event_result.get("htmlLink")})
+
+    upsert_calendar_events([_cache_row(event_result) for event_result in created.values()])
+    return errors
+
+
+def create_calender_event(event_details):
+    """
+    Creates a calendar event based on the provided event details.
+    Single-meeting form of `create_calendar_events`; returns its outcome dict.
+    """
+    logger.debug("Event details", extra={"details": event_details})
+    return create_calendar_events([event_details])[0]
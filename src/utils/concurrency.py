@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.utils.rate_limiter import acquire, throttle, record_success, is_rate_limit_error, retry_after_seconds
+from src.utils.metrics import EXTERNAL_CALL_SECONDS, EXTERNAL_CALLS, RATE_WAIT_SECONDS
+
+# Maximum number of calls allowed in flight at once for each external service.
+# Override with e.g. CONCURRENCY_OPENAI=8 in the environment.
+SERVICE_LIMITS = {
+    "openai": int(os.getenv("CONCURRENCY_OPENAI", "4")),
+    "gmail": int(os.getenv("CONCURRENCY_GMAIL", "8")),
+    "people": int(os.getenv("CONCURRENCY_PEOPLE", "1")),
+    "calendar": int(os.getenv("CONCURRENCY_CALENDAR", "2")),
+    "slack": int(os.getenv("CONCURRENCY_SLACK", "2")),
+    "search": int(os.getenv("CONCURRENCY_SEARCH", "4")),
+}
+
+_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in SERVICE_LIMITS.items()}
+
+
+@contextmanager
+def service_slot(service):
+    """
+    Blocks until a concurrency slot for `service` is free and holds it for the `with` block.
+
+    Args:
+        service (str): One of the keys of SERVICE_LIMITS.
+    """
+    semaphore = _semaphores[service]
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+@contextmanager
+def throttled(service, cost=1, timeout=None):
+    """
+    Waits for `cost` units of the service's rate budget (see `rate_limiter`), then
+    for a concurrency slot, and holds the slot for the `with` block.
+
+    A rate-limit error raised inside the block pauses the service's bucket for
+    its Retry-After and lowers the rate; a clean exit lets the rate recover.
+
+    The wait and the call itself are recorded in the `metrics` histograms, and
+    the call is counted as ok, error or rate_limited.
+
+    Raises:
+        TimeoutError: If the rate budget isn't available within `timeout` seconds.
+    """
+    queued = time.perf_counter()
+    if not acquire(service, cost, timeout=timeout):
+        EXTERNAL_CALLS.inc(service=service, outcome="rate_limited")
+        raise TimeoutError(f"No {service} rate budget within {timeout:.1f}s")
+
+    with service_slot(service):
+        start = time.perf_counter()
+        RATE_WAIT_SECONDS.observe(start - queued, service=service)
+        try:
+            yield
+        except Exception as e:
+            EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, service=service)
+            if is_rate_limit_error(e):
+                EXTERNAL_CALLS.inc(service=service, outcome="rate_limited")
+                throttle(service, retry_after_seconds(e))
+            else:
+                EXTERNAL_CALLS.inc(service=service, outcome="error")
+            raise
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, service=service)
+        EXTERNAL_CALLS.inc(service=service, outcome="ok")
+        record_success(service)
+
+
+def limited(service, cost=1):
+    """
+    Decorator that runs the wrapped function inside `throttled(service, cost)`.
+
+    Calls made from any thread (the one-shot loop, the daemon's workers) share
+    the same per-service limits.
+    """
+    if service not in _semaphores:
+        raise ValueError(f"Unknown service '{service}', expected one of {sorted(_semaphores)}")
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with throttled(service, cost):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+import re
+from html import unescape
+from html.parser import HTMLParser
+
+# Tags whose text never belongs in the readable body
+_SKIPPED_TAGS = {"script", "style", "head", "title", "noscript"}
+# Tags that start a new line when rendered
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "blockquote",
+               "h1", "h2", "h3", "h4", "h5", "h6", "hr", "pre", "section", "article"}
+
+# Lines that introduce quoted reply history (everything from there on is dropped),
+# each with whether the lines around it must confirm it (see `_is_reply_header`)
+_REPLY_HEADER_PATTERNS = [
+    (re.compile(r"^\s*On\s.{0,200}\bwrote:\s*$", re.IGNORECASE), False),  # Gmail / Apple Mail
+    (re.compile(r"^\s*-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE), False),  # Outlook (plain)
+    (re.compile(r"^\s*From:\s.+$", re.IGNORECASE), True),  # Outlook header block
+    (re.compile(r"^_{10,}\s*$"), False),  # Outlook separator line
+]
+_CONFIRMING_HEADER = re.compile(r"^\s*(Sent|Date):\s", re.IGNORECASE)
+# Forwarded messages are part of the email, so their 'From:'/'Date:' block is kept
+_FORWARD_MARKER = re.compile(r"^\s*(-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:)\s*$",
+                             re.IGNORECASE)
+
+
+class _HTMLToText(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.chunks.append(data)
+
+
+def html_to_text(html):
+    """
+    Converts an HTML email body to plain text: drops scripts/styles, keeps line
+    breaks for block elements and collapses runs of whitespace.
+    """
+    parser = _HTMLToText()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # Badly broken markup: fall back to stripping the tags
+        return unescape(re.sub(r"<[^>]+>", " ", html)).strip()
+
+    text = "".join(parser.chunks)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def strip_quoted_reply(text):
+    """
+    Removes quoted reply history from a plain-text body: '>'-quoted lines and
+    everything after an 'On ... wrote:' / 'Original Message' / Outlook header.
+    """
+    lines = text.splitlines()
+    kept = []
+
+    for i, line in enumerate(lines):
+        if _is_reply_header(lines, i):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+
+    return "\n".join(kept).strip()
+
+
+def _is_reply_header(lines, i):
+    line = lines[i]
+    for pattern, needs_confirmation in _REPLY_HEADER_PATTERNS:
+        if pattern.match(line):
+            if needs_confirmation:
+                # A bare 'From:' line is only a reply header when a 'Sent:'/'Date:' line follows it
+                # and it doesn't open a forwarded message
+                previous = [p for p in lines[max(0, i - 2):i] if p.strip()]
+                if previous and _FORWARD_MARKER.match(previous[-1]):
+                    return False
+                return any(_CONFIRMING_HEADER.match(f) for f in lines[i + 1:i + 3])
+            return True
+    return False
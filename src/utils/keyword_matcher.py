@@ -0,0 +1,147 @@
+import json
+import os
+import re
+import threading
+
+# Rule file: {"<rule>": {"threshold": <score>, "include_subject": <bool>, "keywords": {"<phrase>": <weight>}}}
+RULES_PATH = os.getenv("KEYWORD_RULES_PATH", os.path.join(os.path.dirname(__file__), "keyword_rules.json"))
+
+# Marks a space inside a phrase while building the trie; rendered as \s+
+_SPACE = object()
+
+
+def _trie_regex(phrases):
+    """
+    Builds one regex matching any of `phrases`, with shared prefixes factored out
+    ("deadline|deal" -> "dea(?:dline|l)"), so matching cost stays flat as the list grows.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for token in (_SPACE if char == " " else char for char in phrase):
+            node = node.setdefault(token, {})
+        node[""] = {}  # end of phrase
+
+    def render(node):
+        if list(node) == [""]:
+            return ""
+
+        optional = "" in node
+        branches = []
+        for token in sorted((t for t in node if t != ""), key=lambda t: "" if t is _SPACE else t):
+            prefix = r"\s+" if token is _SPACE else re.escape(token)
+            branches.append(prefix + render(node[token]))
+
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            body = "(?:" + body + ")?"
+        return body
+
+    return render(trie)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def _word_prefixes(phrase, phrases):
+    """
+    The keywords among `phrases` that start `phrase` and end on a word boundary in it, `phrase` included
+    ("urgent" and "urgent invoice" for "urgent invoice").
+    """
+    return [phrase[:end] for end in range(1, len(phrase) + 1)
+            if phrase[:end] in phrases
+            and (end == len(phrase) or _is_word_char(phrase[end - 1]) != _is_word_char(phrase[end]))]
+
+
+class KeywordMatcher:
+    """
+    Classifies text against weighted keyword rules in a single regex pass.
+
+    Every keyword of every rule is compiled into one trie-shaped pattern with
+    word boundaries, so "received" doesn't match inside "unreceived" and the
+    cost of a scan depends on the text length, not on the number of rules.
+    The pattern is a lookahead tried at every word start, so keywords that
+    overlap ("urgent", "urgent invoice", "invoice due") are all found.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.thresholds = {name: rule.get("threshold", 1) for name, rule in rules.items()}
+        self.subject_rules = {name for name, rule in rules.items() if rule.get("include_subject")}
+
+        # normalized phrase -> [(rule, weight), ...]
+        self.phrases = {}
+        for name, rule in rules.items():
+            for phrase, weight in rule["keywords"].items():
+                key = " ".join(phrase.lower().split())
+                self.phrases.setdefault(key, []).append((name, weight))
+
+        # The trie finds the longest keyword at a word start; the shorter ones starting there are its prefixes
+        self.prefixes = {phrase: _word_prefixes(phrase, self.phrases) for phrase in self.phrases}
+
+        self.pattern = None
+        if self.phrases:
+            # The first-character lookahead lets the regex engine skip most word starts without entering the trie
+            first_chars = "".join(re.escape(c) for c in sorted({phrase[0] for phrase in self.phrases}))
+            self.pattern = re.compile(r"\b(?=[" + first_chars + r"])(?=(" + _trie_regex(self.phrases) + r")\b)")
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def matched_phrases(self, text):
+        """
+        Returns the set of distinct (normalized) keywords found in `text`, in one scan.
+        """
+        if not text or self.pattern is None:
+            return set()
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            found.update(self.prefixes[" ".join(match.group(1).split())])
+        return found
+
+    def scores(self, body, subject=""):
+        """
+        Returns {rule: score}. Each distinct keyword counts once; keywords found only
+        in the subject count just for rules with "include_subject".
+        """
+        scores = dict.fromkeys(self.rules, 0)
+        body_phrases = self.matched_phrases(body)
+
+        for phrase in body_phrases:
+            for rule, weight in self.phrases[phrase]:
+                scores[rule] += weight
+
+        if subject and self.subject_rules:
+            for phrase in self.matched_phrases(subject) - body_phrases:
+                for rule, weight in self.phrases[phrase]:
+                    if rule in self.subject_rules:
+                        scores[rule] += weight
+        return scores
+
+    def classify(self, body, subject=""):
+        """
+        Returns the set of rules whose score reaches their threshold.
+        """
+        scores = self.scores(body, subject)
+        return {rule for rule, score in scores.items() if score >= self.thresholds[rule]}
+
+    def matches(self, rule, body, subject=""):
+        return rule in self.classify(body, subject)
+
+
+_default_matcher = None
+_default_lock = threading.Lock()
+
+
+def get_matcher():
+    """
+    Returns the matcher compiled from RULES_PATH, loading it on first use.
+    """
+    global _default_matcher
+    with _default_lock:
+        if _default_matcher is None:
+            _default_matcher = KeywordMatcher.from_file()
+        return _default_matcher
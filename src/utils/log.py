@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import sys
+import time
+
+# DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for key=value lines meant for a terminal, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Added to every record as the 'mailbox' field, so logs of several mailbox workers can be told apart
+MAILBOX_NAME = os.getenv("MAILBOX_NAME", "")
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is a structured field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def get_logger(name):
+    """
+    Returns the logger for a module; pass `__name__`.
+
+    Structured fields go in `extra`, e.g.
+    `logger.info("Triage route", extra={"route": route, "reason": reason})`.
+    """
+    return logging.getLogger(name)
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, the `extra` fields and any exception.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    `time LEVEL logger: message key=value ...` for reading in a terminal.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            pairs = " ".join(f"{key}={json.dumps(value, default=str, ensure_ascii=False)}"
+                             for key, value in fields.items())
+            head, sep, tail = line.partition("\n")
+            line = f"{head} {pairs}{sep}{tail}"
+        return line
+
+
+def _tag_mailbox(record):
+    record.mailbox = MAILBOX_NAME
+    return True
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """
+    Installs the assistant's log handler on the root logger (once; later calls
+    just update the level and format).
+
+    Args:
+        level (str, optional): Defaults to LOG_LEVEL.
+        fmt (str, optional): "text" or "json"; defaults to LOG_FORMAT.
+        stream (file, optional): Defaults to stderr, so logs stay apart from the interactive prompts on stdout.
+    """
+    root = logging.getLogger()
+    handler = next((h for h in root.handlers if getattr(h, "_email_assistant", False)), None)
+    if handler is None:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler._email_assistant = True
+        if MAILBOX_NAME:
+            handler.addFilter(_tag_mailbox)
+        root.addHandler(handler)
+    handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else KeyValueFormatter())
+    root.setLevel(level or LOG_LEVEL)
+    # Client libraries log every request at INFO
+    for noisy in ("httpx", "openai", "googleapiclient.discovery_cache", "urllib3"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    return root
@@ -0,0 +1,356 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port of the local /metrics endpoint; 0 (the default) leaves it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Interface the endpoint binds to; keep it on loopback unless a scraper runs elsewhere
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Prefix of every exported metric name
+METRICS_PREFIX = "email_assistant_"
+
+# Histogram bucket bounds in seconds, from a cache lookup to a full LLM deadline
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent observations kept per histogram series for the run report's percentiles
+SAMPLE_WINDOW = 2048
+
+# USD per million (prompt, completion) tokens, for the cost estimate in the run report
+MODEL_PRICES = {
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4": (30.0, 60.0),
+}
+
+
+class _Metric:
+    def __init__(self, name, help, labels=()):
+        self.name = METRICS_PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, one series per combination of label values.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def total(self):
+        with self._lock:
+            return sum(self._series.values())
+
+    def expose(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in series]
+
+    def snapshot(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [{"labels": dict(zip(self.labels, key)), "value": value} for key, value in series]
+
+
+class Histogram(_Metric):
+    """
+    Observed durations (or sizes) bucketed Prometheus-style, with a window of
+    recent samples kept for percentiles.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0,
+                    "samples": deque(maxlen=SAMPLE_WINDOW),
+                }
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+            series["samples"].append(value)
+
+    def time(self, **labels):
+        """
+        Context manager that observes how long its `with` block took, even if it raised.
+        """
+        return _Timer(self, labels)
+
+    def expose(self):
+        lines = []
+        with self._lock:
+            series = sorted((key, dict(s, counts=list(s["counts"]))) for key, s in self._series.items())
+        for key, s in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), s["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(s['sum'])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {s['count']}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            series = sorted((key, s["sum"], s["count"], sorted(s["samples"])) for key, s in self._series.items())
+        return [
+            {
+                "labels": dict(zip(self.labels, key)),
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else 0.0,
+                "p50": _percentile(samples, 0.50),
+                "p95": _percentile(samples, 0.95),
+                "p99": _percentile(samples, 0.99),
+                "max": samples[-1] if samples else 0.0,
+            }
+            for key, total, count, samples in series
+        ]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    return round(sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))], 6)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+_started_at = time.time()
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, help, labels=()):
+    """
+    Returns the counter `name`, creating it on first use.
+    """
+    return _register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    """
+    Returns the histogram `name`, creating it on first use.
+    """
+    return _register(Histogram(name, help, labels, buckets))
+
+
+# Every call to Gmail, People, Calendar, Slack, Custom Search and OpenAI (see `concurrency.throttled`)
+EXTERNAL_CALL_SECONDS = histogram("external_call_seconds", "Duration of external API calls", ["service"])
+EXTERNAL_CALLS = counter("external_calls_total", "External API calls by outcome (ok, error, rate_limited)",
+                         ["service", "outcome"])
+RATE_WAIT_SECONDS = histogram("rate_limit_wait_seconds", "Time spent waiting for rate budget and a slot",
+                              ["service"])
+
+# Gmail messages downloaded, by format (metadata or full)
+GMAIL_FETCHED = counter("gmail_messages_fetched_total", "Gmail messages fetched, by format", ["format"])
+GMAIL_FETCH_BYTES = counter("gmail_fetch_bytes_total", "Bytes of Gmail message resources fetched, by format",
+                            ["format"])
+
+# Pipeline stages of one email (see `StageTimer`) and the email as a whole
+STAGE_SECONDS = histogram("stage_seconds", "Duration of pipeline stages", ["stage"])
+EMAIL_SECONDS = histogram("email_seconds", "End-to-end processing time per email", ["route"])
+EMAILS = counter("emails_total", "Emails processed by triage route", ["route"])
+EMAIL_ERRORS = counter("email_errors_total", "Emails whose processing raised", ["stage"])
+
+# LLM usage
+LLM_TOKENS = counter("llm_tokens_total", "LLM tokens used", ["model", "kind"])
+LLM_COST = counter("llm_cost_usd_total", "Estimated LLM spend in USD", ["model"])
+LLM_REQUESTS = counter("llm_requests_total", "LLM requests by outcome", ["model", "outcome"])
+CACHE_LOOKUPS = counter("cache_lookups_total", "Local cache lookups (llm, search, thread, reply_index)",
+                        ["cache", "outcome"])
+
+# Drafted replies of complex emails
+REVIEWS = counter("reviews_total", "Drafted replies by review outcome (queued, approved, rejected)", ["outcome"])
+
+# Outbound actions (replies, alerts, calendar events)
+OUTBOUND_ACTIONS = counter("outbound_actions_total", "Outbound actions by kind and outcome (sent, retry, dead)",
+                           ["kind", "outcome"])
+
+
+def record_llm_usage(model, prompt_tokens, completion_tokens):
+    """
+    Counts the tokens of one LLM response and adds its estimated cost.
+    """
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    prices = _price(model)
+    if prices:
+        LLM_COST.inc((prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000, model=model)
+
+
+def _price(model):
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") are priced like their family
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            return MODEL_PRICES[name]
+    return None
+
+
+def render_prometheus():
+    """
+    Returns every metric in the Prometheus text exposition format (version 0.0.4).
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+def run_report(extra=None):
+    """
+    Builds the JSON-serialisable run report: every metric plus a summary of
+    throughput, per-service error rates, stage percentiles and LLM spend.
+
+    Args:
+        extra (dict, optional): Additional top-level fields (e.g. the mode the run used).
+    """
+    with _registry_lock:
+        metrics = list(_registry.values())
+    elapsed = time.time() - _started_at
+    emails = EMAILS.total()
+
+    services = {}
+    for entry in EXTERNAL_CALLS.snapshot():
+        service = services.setdefault(entry["labels"]["service"], {"calls": 0, "errors": 0, "rate_limited": 0})
+        service["calls"] += entry["value"]
+        if entry["labels"]["outcome"] == "error":
+            service["errors"] += entry["value"]
+        elif entry["labels"]["outcome"] == "rate_limited":
+            service["rate_limited"] += entry["value"]
+    for service in services.values():
+        failed = service["errors"] + service["rate_limited"]
+        service["error_rate"] = round(failed / service["calls"], 4) if service["calls"] else 0.0
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(_started_at)),
+        "duration_seconds": round(elapsed, 3),
+        "summary": {
+            "emails": emails,
+            "emails_per_second": round(emails / elapsed, 3) if elapsed else 0.0,
+            "services": services,
+            "stages": {e["labels"]["stage"]: {k: e[k] for k in ("count", "p50", "p95", "p99")}
+                       for e in STAGE_SECONDS.snapshot()},
+            "llm_tokens": LLM_TOKENS.total(),
+            "llm_cost_usd": round(LLM_COST.total(), 6),
+        },
+        "metrics": {metric.name: {"type": metric.kind, "series": metric.snapshot()} for metric in metrics},
+    }
+    report.update(extra or {})
+    return report
+
+
+def write_run_report(path, extra=None):
+    """
+    Writes `run_report(extra)` to `path` as JSON and returns the report.
+    """
+    report = run_report(extra)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = render_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/report":
+            body, content_type = json.dumps(run_report(), indent=2), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_metrics_server(port=None, host=None):
+    """
+    Serves `/metrics` (Prometheus text) and `/report` (the JSON run report) from a background thread.
+
+    Args:
+        port (int, optional): Defaults to METRICS_PORT; 0 picks a free port.
+        host (str, optional): Defaults to METRICS_HOST.
+
+    Returns:
+        ThreadingHTTPServer: Call `shutdown()` to stop it; the bound port is `server_address[1]`.
+    """
+    server = ThreadingHTTPServer((host or METRICS_HOST, METRICS_PORT if port is None else port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
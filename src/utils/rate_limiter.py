@@ -0,0 +1,255 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Priority lanes. A waiting call is queued as if it had arrived LANE_OFFSET seconds
+# earlier per lane above it, so urgent calls jump ahead without starving the rest.
+URGENT = 0
+NORMAL = 1
+BULK = 2
+LANE_OFFSET = float(os.getenv("RATE_LANE_OFFSET", "2.0"))
+
+# Fraction of each published quota the buckets aim for, so bursts from other
+# clients of the same account still fit under the limit
+RATE_HEADROOM = float(os.getenv("RATE_HEADROOM", "0.9"))
+
+# Published per-user quotas as (refill per second, burst in seconds of refill).
+# Gmail is metered in quota units (messages.get = 5, send = 100, ...), see GMAIL_COSTS.
+RATE_LIMITS = {
+    "gmail": (float(os.getenv("RATE_GMAIL_UNITS", "250")), 1.0),
+    "calendar": (float(os.getenv("RATE_CALENDAR", "10")), 1.0),
+    "people": (float(os.getenv("RATE_PEOPLE", "1.5")), 2.0),
+    "slack": (float(os.getenv("RATE_SLACK", "1")), 1.0),
+    "search": (float(os.getenv("RATE_SEARCH", "1.6")), 1.0),
+    "openai": (float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")) / 60, 2.0),
+    "openai_tokens": (float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000")) / 60, 10.0),
+}
+
+# Gmail API quota units per method
+GMAIL_COSTS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.send": 100,
+    "history.list": 2,
+    "getProfile": 1,
+    "threads.get": 10,
+    "drafts.create": 10,
+    "drafts.update": 15,
+    "drafts.send": 100,
+    "drafts.delete": 10,
+}
+
+# After a throttle the rate drops to this share and climbs back by RECOVERY_STEP of the quota per success
+THROTTLE_FACTOR = 0.7
+RECOVERY_STEP = 0.02
+# Pause after a rate-limit response that carries no Retry-After
+DEFAULT_PAUSE = 1.0
+
+_lane = contextvars.ContextVar("rate_lane", default=NORMAL)
+
+
+def set_lane(priority):
+    """
+    Sets the priority lane for rate-limited calls made from the current context.
+    Work submitted with `contextvars.copy_context().run` (and `asyncio.to_thread`) inherits it.
+    """
+    _lane.set(priority)
+
+
+def current_lane():
+    return _lane.get()
+
+
+@contextmanager
+def lane(priority):
+    """
+    Runs the `with` block's rate-limited calls in the given priority lane.
+    """
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """
+    A token bucket with priority-ordered waiters and an adaptive rate.
+
+    The bucket refills at `rate` tokens per second up to `capacity`. Throttle
+    responses pause it and cut the rate; each success raises the rate again
+    by a small step, so it settles just under the real limit.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._last = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.stats = {"acquired": 0, "waited": 0.0, "throttled": 0, "timeouts": 0}
+
+    def _refill(self, now):
+        if now > self.paused_until:
+            elapsed = now - max(self._last, self.paused_until)
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self._last = now
+
+    def acquire(self, cost=1, priority=None, timeout=None):
+        """
+        Blocks until `cost` tokens are available and this caller is first in line.
+
+        Returns:
+            bool: False if `timeout` seconds passed first.
+        """
+        cost = min(cost, self.capacity)
+        priority = current_lane() if priority is None else priority
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        with self._cond:
+            ticket = (start + priority * LANE_OFFSET, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = None  # Not first in line: sleep until the line moves
+                    if self._waiters[0] == ticket:
+                        wait = max(self.paused_until - now, (cost - self.tokens) / self.rate, 0.0)
+                        if wait == 0.0:
+                            self.tokens -= cost
+                            self.stats["acquired"] += 1
+                            self.stats["waited"] += now - start
+                            return True
+                    if deadline is not None:
+                        if now >= deadline:
+                            self.stats["timeouts"] += 1
+                            return False
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                if self._waiters[0] == ticket:
+                    heapq.heappop(self._waiters)
+                else:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def refund(self, amount):
+        """
+        Returns over-estimated tokens (e.g. an LLM call that used fewer than reserved).
+        """
+        with self._cond:
+            self.tokens = min(self.capacity, self.tokens + amount)
+            self._cond.notify_all()
+
+    def throttle(self, retry_after=None):
+        """
+        Records a rate-limit response: pauses the bucket and lowers its rate.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.paused_until = max(self.paused_until, now + (retry_after if retry_after is not None else DEFAULT_PAUSE))
+            self.tokens = 0.0
+            self.rate = max(self.max_rate * 0.1, self.rate * THROTTLE_FACTOR)
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def record_success(self):
+        with self._cond:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+
+
+_buckets = {
+    name: TokenBucket(name, rate * RATE_HEADROOM, max(1.0, rate * RATE_HEADROOM * burst))
+    for name, (rate, burst) in RATE_LIMITS.items()
+}
+
+
+def get_bucket(name):
+    return _buckets[name]
+
+
+def acquire(name, cost=1, priority=None, timeout=None):
+    """
+    Takes `cost` tokens from bucket `name`, waiting in the caller's priority lane.
+
+    Returns:
+        bool: False if `timeout` seconds passed before the tokens were available.
+    """
+    return _buckets[name].acquire(cost, priority, timeout)
+
+
+def throttle(name, retry_after=None):
+    _buckets[name].throttle(retry_after)
+
+
+def record_success(name):
+    _buckets[name].record_success()
+
+
+def _status_and_headers(error):
+    """
+    Pulls the HTTP status and response headers out of googleapiclient, Slack, OpenAI and requests errors.
+    """
+    resp = getattr(error, "resp", None)  # googleapiclient HttpError: resp is a dict-like httplib2 response
+    if resp is not None:
+        return getattr(resp, "status", None), resp
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status, getattr(response, "headers", None) or {}
+
+
+def is_rate_limit_error(error):
+    """
+    True for 429 responses and Google's 403 rateLimitExceeded / userRateLimitExceeded.
+    """
+    status, _ = _status_and_headers(error)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    if status == 429:
+        return True
+    return status == 403 and "ratelimitexceeded" in str(error).lower().replace(" ", "")
+
+
+def retry_after_seconds(error):
+    """
+    The Retry-After of a rate-limit response in seconds, or None when it has none.
+    """
+    _, headers = _status_and_headers(error)
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return max(0.0, float(value))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def get_rate_stats():
+    """
+    Returns per-bucket counters: calls let through, seconds spent waiting, throttles seen, current rate.
+    """
+    stats = {}
+    for name, bucket in _buckets.items():
+        with bucket._cond:
+            stats[name] = dict(bucket.stats, rate=bucket.rate, max_rate=bucket.max_rate)
+    return stats
+
+
+def format_rate_stats(stats):
+    used = [f"{name} {s['acquired']} call(s), waited {s['waited']:.1f}s, {s['throttled']} throttle(s)"
+            for name, s in stats.items() if s["acquired"] or s["throttled"]]
+    return "Rate limits: " + ("; ".join(used) if used else "no calls")
@@ -1,27 +1,184 @@
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 import os
-from dotenv import load_dotenv
+import threading
+import time
 
-load_dotenv()
+from src.utils.concurrency import limited
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 # Load from environment variable or store directly (secure way recommended)
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID")
+# Point at a local stub of the Slack Web API for testing (e.g. http://127.0.0.1:8809/api/)
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+
+# Seconds urgent alerts are collected before they go out as one digest message
+SLACK_DIGEST_WINDOW = float(os.getenv("SLACK_DIGEST_WINDOW", "30"))
+# Entries listed in one digest (Slack allows 50 blocks per message); the rest are counted
+DIGEST_MAX_ENTRIES = 20
+
+# The Slack client, built on first use by `get_client`; assign a client here to replace it
+client = None
+_client_lock = threading.Lock()
 
-client = WebClient(token=SLACK_BOT_TOKEN)
 
+def get_client():
+    """
+    Returns the process-wide Slack WebClient, building it on first use (runs that
+    send no alert never import `slack_sdk`).
+    """
+    global client
+    with _client_lock:
+        if client is None:
+            from slack_sdk import WebClient
+
+            client = WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL)
+        return client
+
+@limited("slack")
 def send_slack_notification(subject, sender, body):
     """
     Sends a formatted Slack message with email info.
     """
+    from slack_sdk.errors import SlackApiError
+
     message = f":rotating_light: *URGENT EMAIL*\n*From:* {sender}\n*Subject:* {subject}\n\n{body[:1000]}"  # Truncate if too long
 
     try:
-        response = client.chat_postMessage(
+        response = get_client().chat_postMessage(
             channel=SLACK_CHANNEL_ID,
             text=message
         )
-        print("Slack message sent:", response["ts"])
+        logger.info("Slack message sent", extra={"ts": response["ts"]})
+    except SlackApiError as e:
+        logger.warning("Slack API error", extra={"error": e.response["error"]})
+        raise  # Let the outbound queue retry or dead-letter the alert
+
+
+@limited("slack")
+def send_slack_digest(text, blocks):
+    """
+    Posts one digest message; `text` is the notification fallback for the Block Kit `blocks`.
+    """
+    from slack_sdk.errors import SlackApiError
+
+    try:
+        response = get_client().chat_postMessage(channel=SLACK_CHANNEL_ID, text=text, blocks=blocks)
+        logger.info("Slack digest sent", extra={"ts": response["ts"]})
     except SlackApiError as e:
-        print("Slack API Error:", e.response["error"])
+        logger.warning("Slack API error", extra={"error": e.response["error"]})
+        raise
+
+
+def build_digest(alerts, window):
+    """
+    Renders collected alerts as a Block Kit digest.
+
+    Args:
+        alerts (list): Alert dicts from `SlackAlertAggregator`, oldest first.
+        window (float): Length of the collection window in seconds, for the header.
+
+    Returns:
+        tuple: (fallback text, list of blocks).
+    """
+    emails = sum(alert["count"] for alert in alerts)
+    text = f":rotating_light: {emails} urgent email(s) in {len(alerts)} conversation(s)"
+    blocks = [
+        {"type": "header", "text": {"type": "plain_text", "text": f"🚨 {emails} urgent email(s)"}},
+        {"type": "context", "elements": [
+            {"type": "mrkdwn", "text": f"{len(alerts)} conversation(s) in the last {window:.0f}s"}
+        ]},
+    ]
+
+    for alert in alerts[:DIGEST_MAX_ENTRIES]:
+        repeat = f" (×{alert['count']})" if alert["count"] > 1 else ""
+        snippet = " ".join(alert["body"].split())[:200]
+        blocks.append({"type": "section", "text": {
+            "type": "mrkdwn",
+            "text": f"*{alert['subject'] or '(no subject)'}*{repeat}\n*From:* {alert['sender']}\n>{snippet}",
+        }})
+
+    hidden = len(alerts) - DIGEST_MAX_ENTRIES
+    if hidden > 0:
+        blocks.append({"type": "context", "elements": [
+            {"type": "mrkdwn", "text": f"…and {hidden} more conversation(s)"}
+        ]})
+    return text, blocks
+
+
+class SlackAlertAggregator:
+    """
+    Collects urgent-email alerts and hands them over in windows.
+
+    Alerts for the same thread (or, without a thread id, the same sender) are
+    merged into one entry with a count. A background thread calls
+    `on_flush(alerts)` at most once per `window` seconds, only when something
+    was collected.
+    """
+
+    def __init__(self, on_flush, window=SLACK_DIGEST_WINDOW):
+        self.on_flush = on_flush
+        self.window = window
+        self._alerts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, alert):
+        """
+        Adds an alert dict with 'subject', 'sender', 'body' and optionally 'thread_id'.
+        """
+        key = alert.get("thread_id") or alert["sender"].lower()
+        with self._lock:
+            entry = self._alerts.get(key)
+            if entry is None:
+                self._alerts[key] = dict(alert, count=1, first_seen=time.time())
+            else:
+                # Keep the latest message of the conversation, counted once per email
+                entry.update(subject=alert["subject"], body=alert["body"], count=entry["count"] + 1)
+
+    def pending(self):
+        with self._lock:
+            return len(self._alerts)
+
+    def flush(self):
+        """
+        Hands over everything collected so far. On failure the alerts are put back for the next window.
+        """
+        with self._lock:
+            alerts, self._alerts = self._alerts, {}
+        if not alerts:
+            return 0
+
+        ordered = sorted(alerts.values(), key=lambda alert: alert["first_seen"])
+        try:
+            self.on_flush(ordered)
+        except Exception as e:
+            logger.warning("Could not flush Slack digest", extra={"alerts": len(ordered), "error": str(e)})
+            with self._lock:
+                for key, alert in alerts.items():
+                    self._alerts.setdefault(key, alert)
+            return 0
+        return len(ordered)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="slack-digest", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the background thread and flushes what is left.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            self.flush()
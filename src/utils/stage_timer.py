@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.utils.metrics import STAGE_SECONDS
+
+
+class StageTimer:
+    """
+    Records when each pipeline stage of one email starts and finishes.
+
+    Times are seconds relative to the creation of the timer, so stages that ran
+    in parallel show overlapping intervals. Every stage is also observed in the
+    `stage_seconds` histogram. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the body of a `with` block as stage `name`.
+        """
+        start = time.perf_counter() - self.origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self.origin
+            STAGE_SECONDS.observe(end - start, stage=name)
+            with self._lock:
+                self.stages[name] = (start, end)
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Calls `func(*args, **kwargs)` as stage `name` and returns its result.
+        """
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+    def critical_path(self, dependencies):
+        """
+        Returns the chain of stages that determined the total latency.
+
+        Starting from the stage that finished last, repeatedly steps back to the
+        dependency that finished last.
+
+        Args:
+            dependencies (dict): Maps a stage name to the names of the stages it waits for.
+
+        Returns:
+            list: Stage names, from first to last.
+        """
+        if not self.stages:
+            return []
+
+        current = max(self.stages, key=lambda name: self.stages[name][1])
+        path = [current]
+        while True:
+            upstream = [dep for dep in dependencies.get(current, []) if dep in self.stages]
+            if not upstream:
+                break
+            current = max(upstream, key=lambda name: self.stages[name][1])
+            path.append(current)
+        return list(reversed(path))
+
+    def report(self, dependencies):
+        """
+        Formats the stage intervals and the critical path on one line.
+        """
+        intervals = ", ".join(
+            f"{name} {start:.2f}-{end:.2f}s"
+            for name, (start, end) in sorted(self.stages.items(), key=lambda item: item[1][0])
+        )
+        return f"{intervals} (critical path: {' -> '.join(self.critical_path(dependencies))})"
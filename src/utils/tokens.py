@@ -0,0 +1,39 @@
+try:
+    import tiktoken
+except ImportError:  # listed in requirements.txt; without it budgets are only estimated
+    tiktoken = None
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Number of model tokens in `text`: exact with tiktoken (a requirement), or
+    estimated at about four characters per token in an install that lacks it.
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_get_encoding().encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cuts `text` down to at most `max_tokens` tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if tiktoken is not None:
+        encoding = _get_encoding()
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:max_tokens * 4]
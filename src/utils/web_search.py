@@ -1,25 +1,176 @@
-import requests
+import json
 import os
-from dotenv import load_dotenv
+import re
+import sys
+import threading
 
-load_dotenv()
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.db.database import get_cached_search, put_cached_search
+from src.utils.concurrency import throttled, SERVICE_LIMITS
+from src.utils.keyword_matcher import get_matcher
+from src.utils.log import get_logger
+from src.utils.metrics import CACHE_LOOKUPS
+
+logger = get_logger(__name__)
 
 # Your API key from Google Custom Search
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 # Your custom search engine ID
 SEARCH_ENGINE_ID = os.getenv('SEARCH_ENGINE_ID')
 
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+
+# (connect, read) timeouts in seconds, so a slow search never holds up a reply for long
+SEARCH_TIMEOUT = (3.05, float(os.getenv("SEARCH_TIMEOUT", "5")))
+# Longest wait for the search rate budget before going without a snippet
+SEARCH_QUEUE_TIMEOUT = 5.0
+# How long a query's results are reused, and how many of them are kept
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+SEARCH_RESULTS = 3
+# Upper bound on the words sent as the search query
+MAX_QUERY_WORDS = 12
+
+# Keyword rule whose cues ("what is", "how to", ...) mark the sentence holding the question
+QUESTION_RULE = "web_search"
+
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "but", "to", "of", "in", "on", "for", "with", "at", "by", "from",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "can", "could", "would", "should",
+    "will", "i", "you", "we", "me", "my", "your", "our", "us", "it", "this", "that", "these", "those",
+    "please", "kindly", "hi", "hello", "dear", "thanks", "thank", "regards", "let", "know", "tell",
+    "explain", "define", "wondering", "if", "so", "just", "also", "any", "some", "about", "need", "want",
+}
+
+# Sentence ends: terminal punctuation followed by whitespace (so "3.13" stays whole), or a line break
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_SALUTATION_RE = re.compile(r"^(hi|hello|hey|dear|good (morning|afternoon|evening))\b[^,]*,\s*", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9+#.'-]*")
+
+search_stats = {"hits": 0, "misses": 0, "errors": 0}
+_stats_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """
+    Returns the process-wide `requests.Session`, whose keep-alive connection pool
+    is sized to the search concurrency limit.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported on the first search: most runs never search
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SERVICE_LIMITS["search"])
+            _session.mount("https://", adapter)
+        return _session
+
+
+def extract_search_query(email_body):
+    """
+    Builds a short search query from the question in an email.
+
+    Picks the first sentence that ends in a question mark or contains a
+    keyword of the QUESTION_RULE rule ("what is", "how to", ...), falling back
+    to the first sentence, and keeps its first MAX_QUERY_WORDS content words.
+    """
+    sentences = [_SALUTATION_RE.sub("", s.strip()) for s in _SENTENCE_SPLIT_RE.split(email_body)]
+    sentences = [s for s in sentences if s]
+    if not sentences:
+        return ""
+
+    chosen = next((s for s in sentences if s.endswith("?")), None)
+    if chosen is None:
+        matcher = get_matcher()
+        chosen = next((s for s in sentences if matcher.scores(s)[QUESTION_RULE] > 0), sentences[0])
+
+    words = [w.strip(".'-") for w in _WORD_RE.findall(chosen)]
+    words = [w for w in words if w and w.lower() not in STOP_WORDS]
+    return " ".join(words[:MAX_QUERY_WORDS])
+
+
+def normalize_query(query):
+    """
+    Cache key of a query: lower-cased, punctuation-free, whitespace-collapsed.
+    """
+    # Dots inside a token ("3.13", "node.js") are kept, other punctuation is dropped
+    return " ".join(re.sub(r"[^\w\s+#.]|\.(?!\w)", " ", query.lower()).split())
+
+
 def search_web(query):
     """
     Search the web using Google Custom Search API.
-    
-    :param query: The search query.
-    :return: The snippet of the first search result or a fallback message.
-    """
-    url = f"https://www.googleapis.com/customsearch/v1?q={query}&key={GOOGLE_API_KEY}&cx={SEARCH_ENGINE_ID}"
-    response = requests.get(url).json()
-    
-    if "items" in response:
-        return response["items"][0]["snippet"]  # Return the snippet of the first result
-    else:
-        return "No results found."
+
+    Results are cached in SQLite by normalized query for SEARCH_CACHE_TTL
+    seconds, so the same question asked again costs no network call.
+
+    :param query: The search query (see `extract_search_query` for turning an email into one).
+    :return: The snippets of the top results, one per line, or None if there are none or the search failed.
+    """
+    key = normalize_query(query)
+    if not key:
+        return None
+
+    cached = get_cached_search(key)
+    if cached is not None:
+        _count("hits")
+        return format_results(json.loads(cached))
+
+    _count("misses")
+    import requests
+
+    try:
+        results = _fetch_results(key)
+    except (requests.RequestException, ValueError, TimeoutError) as e:
+        # Timeouts and API errors only cost the reply its web snippet; they aren't cached
+        _count("errors")
+        logger.warning("Web search failed", extra={"query": key, "error": str(e)})
+        return None
+
+    put_cached_search(key, json.dumps(results), SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES)
+    return format_results(results)
+
+
+def _fetch_results(query):
+    """
+    Calls the Custom Search API and returns the top results as dicts with 'title', 'snippet' and 'link'.
+    """
+    params = {"q": query, "key": GOOGLE_API_KEY, "cx": SEARCH_ENGINE_ID, "num": SEARCH_RESULTS}
+    with throttled("search", timeout=SEARCH_QUEUE_TIMEOUT):
+        # requests URL-encodes the parameters
+        response = _get_session().get(SEARCH_URL, params=params, timeout=SEARCH_TIMEOUT)
+        # A 429 raised here pauses the search rate budget (see `throttled`)
+        response.raise_for_status()
+
+    items = response.json().get("items", [])
+    return [
+        {"title": item.get("title", ""), "snippet": item.get("snippet", ""), "link": item.get("link", "")}
+        for item in items[:SEARCH_RESULTS]
+    ]
+
+
+def format_results(results):
+    snippets = [" ".join(result["snippet"].split()) for result in results if result.get("snippet")]
+    return "\n".join(snippets) or None
+
+
+def get_search_stats():
+    """
+    Returns a copy of the search cache hit/miss/error counters for this process.
+    """
+    with _stats_lock:
+        return dict(search_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        search_stats[outcome] += 1
+    if outcome != "errors":
+        CACHE_LOOKUPS.inc(cache="search", outcome="hit" if outcome == "hits" else "miss")
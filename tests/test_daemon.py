@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic_mailbox import FakeMailboxService, SyntheticMailbox
+from src.controllers import email_controller
+from src.db import database
+from src.services import daemon
+
+MAILBOX = SyntheticMailbox(4)
+
+
+@pytest.fixture(autouse=True)
+def fakes(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "emails.db"))
+    service = FakeMailboxService(MAILBOX)
+    monkeypatch.setattr(daemon, "get_service", lambda name, version: service)
+    yield
+    database.close_connection()
+
+
+def deliver(monkeypatch, *indexes):
+    """
+    Makes the next syncs return the messages at `indexes`, then nothing.
+    """
+    ids = [MAILBOX.message_id(index) for index in indexes]
+    batches = [ids]
+
+    def sync_emails(needs_body=None):
+        return email_controller.fetch_emails_by_ids(FakeMailboxService(MAILBOX), batches.pop() if batches else [])
+    monkeypatch.setattr(daemon, "sync_emails", sync_emails)
+    return ids
+
+
+def handle(monkeypatch, emails, failing=()):
+    def process_email(email, user_name, interactive):
+        if email["id"] in failing:
+            raise RuntimeError("LLM unavailable")
+    monkeypatch.setattr(daemon, "process_email", process_email)
+
+    async def run():
+        slots = asyncio.Semaphore(len(emails) or 1)
+        for email in emails:
+            await slots.acquire()
+            await daemon._handle_email(email, "Sam", slots)
+    asyncio.run(run())
+
+
+def test_failed_email_is_processed_again_on_the_next_tick(monkeypatch):
+    first, second = deliver(monkeypatch, 0, 1)
+    emails = daemon._fetch_new_emails()
+    assert [email["id"] for email in emails] == [first, second]
+
+    handle(monkeypatch, emails, failing={first})
+    retried = daemon._fetch_new_emails()
+    assert [email["id"] for email in retried] == [first]
+
+    handle(monkeypatch, retried)
+    assert daemon._fetch_new_emails() == []
+    assert database.get_unprocessed_emails(daemon.MAX_ATTEMPTS) == []
+
+
+def test_email_cut_off_by_a_shutdown_is_processed_by_the_next_run(monkeypatch):
+    first, = deliver(monkeypatch, 2)
+    daemon._fetch_new_emails()  # the process is killed before the email is handled
+
+    assert [email["id"] for email in daemon._fetch_new_emails()] == [first]
+
+
+def test_email_still_in_flight_is_not_fetched_again(monkeypatch):
+    first, = deliver(monkeypatch, 2)
+    daemon._fetch_new_emails()
+
+    assert daemon._fetch_new_emails(in_flight_ids={first}) == []
+
+
+def test_email_is_given_up_on_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(daemon, "MAX_ATTEMPTS", 2)
+    first, = deliver(monkeypatch, 3)
+    handle(monkeypatch, daemon._fetch_new_emails(), failing={first})
+    handle(monkeypatch, daemon._fetch_new_emails(), failing={first})
+
+    assert daemon._fetch_new_emails() == []
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.email_text import strip_quoted_reply
+
+GMAIL_FORWARD = """Can you handle this one?
+
+---------- Forwarded message ---------
+From: Alice Martin <alice@example.com>
+Date: Mon, 6 Oct 2025 at 09:12
+Subject: Invoice 4471
+To: <billing@example.com>
+
+The invoice for September is attached, payment is due on the 30th."""
+
+APPLE_FORWARD = """FYI
+
+Begin forwarded message:
+
+From: Alice Martin <alice@example.com>
+Date: 6 October 2025 at 09:12:00 CEST
+Subject: Invoice 4471
+
+The invoice for September is attached."""
+
+OUTLOOK_REPLY = """Thursday works for me.
+
+From: Alice Martin <alice@example.com>
+Sent: Monday, October 6, 2025 9:12 AM
+To: Bob <bob@example.com>
+Subject: Meeting
+
+Does Thursday work?"""
+
+
+def test_gmail_forwarded_message_is_kept():
+    text = strip_quoted_reply(GMAIL_FORWARD)
+
+    assert text.startswith("Can you handle this one?")
+    assert "From: Alice Martin" in text
+    assert text.endswith("payment is due on the 30th.")
+
+
+def test_apple_mail_forwarded_message_is_kept():
+    assert strip_quoted_reply(APPLE_FORWARD).endswith("The invoice for September is attached.")
+
+
+def test_outlook_reply_header_is_still_stripped():
+    assert strip_quoted_reply(OUTLOOK_REPLY) == "Thursday works for me."
+
+
+def test_from_line_without_sent_line_is_kept():
+    text = "Quick note\nFrom: the finance team, with thanks\nBest"
+
+    assert strip_quoted_reply(text) == text
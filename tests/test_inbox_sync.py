@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic_mailbox import FakeMailboxService, SyntheticMailbox, http_error
+from src.controllers import email_controller, inbox_sync
+from src.controllers.inbox_sync import FAILED_FETCHES_KEY, HISTORY_CHECKPOINT_KEY, sync_emails
+from src.db import database
+
+
+class FlakyMailbox(SyntheticMailbox):
+    """
+    A mailbox whose `failing` messages can't be fetched in full (503), though their headers can.
+    """
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.failing = set()
+
+    def message(self, index, format="full", metadata_headers=None):
+        if format == "full" and self.message_id(index) in self.failing:
+            raise http_error("unavailable")
+        return super().message(index, format, metadata_headers)
+
+
+@pytest.fixture(autouse=True)
+def temporary_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "emails.db"))
+    monkeypatch.setattr(email_controller, "FETCH_RETRY_BASE", 0)
+    yield
+    database.close_connection()
+
+
+def sync(service):
+    return [email["id"] for email in sync_emails(service, needs_body=lambda email: True)]
+
+
+def test_message_that_failed_to_fetch_is_fetched_by_the_next_sync():
+    mailbox = FlakyMailbox(5)
+    service = FakeMailboxService(mailbox)
+    database.set_sync_state(HISTORY_CHECKPOINT_KEY, "2")
+    mailbox.failing.add(mailbox.message_id(3))
+
+    assert sync(service) == [mailbox.message_id(2), mailbox.message_id(4)]
+    assert database.get_sync_state(HISTORY_CHECKPOINT_KEY) == "5"
+    assert json.loads(database.get_sync_state(FAILED_FETCHES_KEY)) == {mailbox.message_id(3): 1}
+
+    mailbox.failing.clear()
+    assert sync(service) == [mailbox.message_id(3)]
+    assert json.loads(database.get_sync_state(FAILED_FETCHES_KEY)) == {}
+
+
+def test_message_is_given_up_on_after_sync_fetch_retries(monkeypatch):
+    monkeypatch.setattr(inbox_sync, "SYNC_FETCH_RETRIES", 2)
+    mailbox = FlakyMailbox(5)
+    service = FakeMailboxService(mailbox)
+    database.set_sync_state(HISTORY_CHECKPOINT_KEY, "4")
+    mailbox.failing.add(mailbox.message_id(4))
+
+    assert sync(service) == []
+    assert sync(service) == []
+    assert json.loads(database.get_sync_state(FAILED_FETCHES_KEY)) == {}
+    mailbox.failing.clear()
+    assert sync(service) == []
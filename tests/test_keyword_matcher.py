@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.keyword_matcher import KeywordMatcher
+
+RULES = {
+    "urgent": {"keywords": {"urgent": 1}},
+    "billing": {"keywords": {"urgent invoice": 1, "invoice due": 1}},
+}
+
+
+def test_keyword_inside_a_longer_keyword_is_scored():
+    assert KeywordMatcher(RULES).scores("URGENT invoice") == {"urgent": 1, "billing": 1}
+
+
+def test_keywords_sharing_words_are_all_scored():
+    matcher = KeywordMatcher(RULES)
+
+    assert matcher.matched_phrases("Urgent invoice  due today") == {"urgent", "urgent invoice", "invoice due"}
+    assert matcher.scores("Urgent invoice due today") == {"urgent": 1, "billing": 2}
+
+
+def test_keywords_only_match_whole_words():
+    assert KeywordMatcher(RULES).matched_phrases("nonurgent invoices") == set()
@@ -0,0 +1,64 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.models import llm_service
+from src.utils import rate_limiter
+from src.utils.rate_limiter import TokenBucket
+
+MESSAGES = [{"role": "user", "content": "Can we move the review to Thursday? " * 20}]
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class FlakyClient:
+    """
+    Fails the first `failures` calls with a 503, then answers using `used` tokens.
+    """
+
+    def __init__(self, failures, used=50):
+        self.failures = failures
+        self.used = used
+        self.chat = SimpleNamespace(completions=self)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, model, messages, **params):
+        if self.failures:
+            self.failures -= 1
+            raise ServerError("Service Unavailable")
+        usage = SimpleNamespace(prompt_tokens=self.used - 10, completion_tokens=10, total_tokens=self.used)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=usage)
+
+
+@pytest.fixture
+def token_bucket(monkeypatch):
+    # No refill during the test, so the level shows exactly what was reserved and handed back
+    bucket = TokenBucket("openai_tokens", 1e-9, 10_000)
+    monkeypatch.setitem(rate_limiter._buckets, "openai_tokens", bucket)
+    monkeypatch.setattr(llm_service, "_retry_delay", lambda error, attempt: 0)
+    return bucket
+
+
+def test_failed_attempts_hand_their_token_reservation_back(monkeypatch, token_bucket):
+    monkeypatch.setattr(llm_service, "client", FlakyClient(failures=2, used=50))
+
+    assert llm_service.complete_with_deadline(MESSAGES, deadline=30, max_tokens=100) == "ok"
+
+    assert token_bucket.tokens == pytest.approx(10_000 - 50, abs=1)
+
+
+def test_exhausted_retries_leave_the_token_budget_untouched(monkeypatch, token_bucket):
+    monkeypatch.setattr(llm_service, "client", FlakyClient(failures=100))
+
+    with pytest.raises(ServerError):
+        llm_service.complete_with_deadline(MESSAGES, deadline=30, max_tokens=100)
+
+    assert token_bucket.tokens == pytest.approx(10_000, abs=1)
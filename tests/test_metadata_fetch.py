@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.bench_metadata_fetch import BULK_KINDS, bulk_heavy_mix
+from benchmarks.synthetic_mailbox import FakeMailboxService, SyntheticMailbox
+from src.controllers.email_controller import fetch_emails_by_ids, get_fetch_stats
+from src.services.triage import ROUTE_SKIP, get_triage_stats, needs_full_body, triage_email
+from src.utils import rate_limiter
+from src.utils.keyword_matcher import get_matcher
+from src.utils.rate_limiter import TokenBucket
+
+
+class RecordingMailbox(SyntheticMailbox):
+    """
+    A fixture mailbox that remembers which messages were fetched with format=full.
+    """
+
+    def __init__(self, size):
+        super().__init__(size, seed=3, mix=bulk_heavy_mix(0.8), bulk_html_kib=10)
+        self.full_fetches = []
+
+    def message(self, index, format="full", metadata_headers=None):
+        if format == "full":
+            self.full_fetches.append(self.message_id(index))
+        return super().message(index, format, metadata_headers)
+
+
+@pytest.fixture(autouse=True)
+def unlimited_gmail_quota(monkeypatch):
+    # Measure the fetch, not the Gmail quota the rate limiter would otherwise enforce
+    monkeypatch.setitem(rate_limiter._buckets, "gmail", TokenBucket("gmail", 1e9, 1e9))
+    get_fetch_stats(reset=True)
+    yield
+    get_triage_stats(reset=True)
+
+
+def fetch(mailbox, needs_body):
+    ids = [mailbox.message_id(index) for index in range(mailbox.size)]
+    emails = list(fetch_emails_by_ids(FakeMailboxService(mailbox), ids, needs_body=needs_body))
+    stats = get_fetch_stats(reset=True)
+    return emails, stats["metadata_bytes"] + stats["full_bytes"]
+
+
+def test_two_phase_fetch_downloads_fewer_bytes_than_full_fetch():
+    _, full_bytes = fetch(RecordingMailbox(120), None)
+    _, two_phase_bytes = fetch(RecordingMailbox(120), needs_full_body)
+
+    assert two_phase_bytes < full_bytes
+
+
+def test_skipped_and_bulk_messages_are_never_fetched_in_full():
+    mailbox = RecordingMailbox(120)
+    full_emails, _ = fetch(mailbox, None)
+    matcher = get_matcher()
+    skipped = {email["id"] for email in full_emails
+               if triage_email(email, matcher.classify(email["body"], email["subject"]))[0] == ROUTE_SKIP}
+    bulk = {mailbox.message_id(index) for index in range(mailbox.size) if mailbox.kind(index) in BULK_KINDS}
+    assert bulk and bulk <= skipped
+
+    mailbox.full_fetches.clear()
+    emails, _ = fetch(mailbox, needs_full_body)
+
+    assert len(emails) == mailbox.size
+    assert mailbox.full_fetches
+    assert not skipped & set(mailbox.full_fetches)
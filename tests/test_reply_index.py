@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.db import database
+from src.services.reply_index import find_similar_reply, remember_reply
+
+ORDER_EMAIL = ("Hello, I placed order #{order} for a standing desk on {day} March and it has not shipped yet. "
+               "The tracking page still says the label was created. Could you tell me when it will be "
+               "dispatched and whether I can still change the delivery address to {street}? Thanks")
+
+
+@pytest.fixture(autouse=True)
+def temporary_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "emails.db"))
+    yield
+    database.close_connection()
+
+
+def order_email(message_id, order, day, street):
+    return {"id": message_id, "subject": "Order status",
+            "body": ORDER_EMAIL.format(order=order, day=day, street=street)}
+
+
+def test_reply_without_details_is_reused_across_variants():
+    remember_reply(order_email("m1", 48213, 3, "12 Baker Street"), "Sorry for the delay, it ships this week.")
+
+    reused = find_similar_reply(order_email("m2", 51877, 9, "77 Elm Road"))
+
+    assert reused is not None
+    assert reused["message_id"] == "m1"
+
+
+def test_reply_quoting_other_numbers_is_not_reused():
+    remember_reply(order_email("m1", 48213, 3, "12 Baker Street"),
+                   "Order 48213 ships tomorrow to 12 Baker Street.")
+
+    assert find_similar_reply(order_email("m2", 51877, 3, "12 Baker Street")) is None
+    assert find_similar_reply(order_email("m3", 48213, 3, "77 Elm Road")) is None
+    assert find_similar_reply(order_email("m4", 48213, 9, "12 Baker Street"))["message_id"] == "m1"
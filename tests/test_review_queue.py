@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.db import database
+from src.services import outbound_queue, review_queue
+from src.services.review_queue import approve_reviews, queue_for_review
+
+
+@pytest.fixture(autouse=True)
+def temporary_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "emails.db"))
+    yield
+    database.close_connection()
+
+
+@pytest.fixture
+def indexed(monkeypatch):
+    replies = []
+    monkeypatch.setattr(review_queue, "remember_reply", lambda email, reply, *args: replies.append(reply))
+    return replies
+
+
+def make_email(message_id):
+    return {"id": message_id, "thread_id": "t1", "sender": "alice@example.com", "subject": "Order", "body": "Hi"}
+
+
+def test_review_reply_whose_review_is_gone_is_dead_lettered_at_once():
+    database.enqueue_action("review_reply", '{"review_id": 42}', "reply:m1")
+
+    outbound_queue.process_action(database.claim_next_action())
+
+    row = database.get_connection().execute("SELECT kind, attempts FROM dead_letters").fetchone()
+    assert row == ("review_reply", 1)
+
+
+def test_approved_reply_reused_from_the_index_is_not_indexed_again(indexed):
+    fresh = queue_for_review(make_email("m1"), "Written for m1")
+    reused = queue_for_review(make_email("m2"), "Reused from m0", analysis={"reused_from": "m0"})
+    edited = queue_for_review(make_email("m3"), "Reused from m0", analysis={"reused_from": "m0"})
+
+    approve_reviews([fresh, reused, edited], edits={edited: "Rewritten for m3"})
+
+    assert indexed == ["Written for m1", "Rewritten for m3"]
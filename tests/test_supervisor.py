@@ -0,0 +1,28 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.services.supervisor import WORKER_FLAG, Supervisor, load_accounts
+
+
+def test_workers_serve_their_mailbox_when_accounts_file_is_set(tmp_path, monkeypatch):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps({"mailboxes": [{"name": "support"}, {"name": "sales"}]}))
+    config = load_accounts(str(path))
+    for mailbox in config["mailboxes"]:
+        os.makedirs(mailbox["directory"])
+        with open(mailbox["token_file"], "w") as f:
+            f.write("{}")
+    # What a worker inherits from the supervisor's environment (or reads again from .env)
+    monkeypatch.setenv("ACCOUNTS_FILE", str(path))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    # `--approve all` needs no Google account: each worker approves the (empty) review queue of its mailbox
+    supervisor = Supervisor(config, worker_args=["--approve", "all"])
+    summary = supervisor.run()
+
+    assert WORKER_FLAG in supervisor.command
+    assert {name: entry["status"] for name, entry in summary.items()} == {"support": "done", "sales": "done"}
+    assert all(os.path.exists(mailbox["db_path"]) for mailbox in config["mailboxes"])
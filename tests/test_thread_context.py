@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.services import thread_context
+from src.services.thread_context import TURN_SEPARATOR, build_thread_context
+from src.utils.tokens import count_tokens
+
+
+def make_turn(index):
+    return {"id": f"m{index}", "sender": "Al <al@example.com>", "received_at": index,
+            "body": f"Turn {index} " + "x" * 24}
+
+
+def test_history_and_body_stay_within_budget_including_separators(monkeypatch):
+    turns = [make_turn(index) for index in range(3)]
+    monkeypatch.setattr(thread_context, "get_thread_turns", lambda email: (turns, 0))
+    email = {"id": "m3", "thread_id": "t1", "subject": "Re: notes", "headers": {}, "body": "y" * 80}
+
+    body, history = build_thread_context(email, budget=50)
+
+    assert body == email["body"]
+    assert history
+    assert count_tokens(body) + count_tokens(history) <= 50
+
+
+def test_single_turn_pays_no_separator():
+    turn = make_turn(0)
+    tokens = count_tokens(thread_context._format_turn(turn))
+
+    assert thread_context.pack_turns([turn], "", tokens) == [thread_context._format_turn(turn)]
+    assert count_tokens(TURN_SEPARATOR) > 0
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.db import database
+from src.services import gmail_service
+from src.services.triage import ROUTE_LLM, ROUTE_TEMPLATE, triage_email
+
+
+@pytest.fixture(autouse=True)
+def temporary_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "emails.db"))
+    yield
+    database.close_connection()
+
+
+def make_email(sender, subject, body, headers=None):
+    return {"id": "m1", "thread_id": "t1", "sender": sender, "subject": subject, "body": body,
+            "headers": headers or {}}
+
+
+def test_skipped_email_with_urgent_subject_still_alerts(monkeypatch):
+    alerts = []
+    monkeypatch.setattr(gmail_service, "queue_slack_alert", lambda email, immediate=False: alerts.append(email))
+    email = make_email("Monitoring <noreply@monitoring.example.com>", "CRITICAL outage", "Service api-1 is down.")
+
+    gmail_service.process_email(email, user_name="Sam", interactive=False)
+
+    assert [alert["subject"] for alert in alerts] == ["CRITICAL outage"]
+    assert database.get_connection().execute("SELECT status FROM emails").fetchone()[0] == "skipped"
+
+
+def test_skipped_email_without_urgent_keywords_does_not_alert(monkeypatch):
+    alerts = []
+    monkeypatch.setattr(gmail_service, "queue_slack_alert", lambda email, immediate=False: alerts.append(email))
+    email = make_email("Shop <news@shop.example.com>", "Weekly deals", "New arrivals this week.",
+                       {"list-unsubscribe": "<mailto:unsubscribe@shop.example.com>"})
+
+    gmail_service.process_email(email, user_name="Sam", interactive=False)
+
+    assert alerts == []
+
+
+def test_short_simple_email_gets_the_template_unless_it_mentions_a_meeting():
+    thanks = make_email("alice@example.com", "Thanks", "Thank you, I received the files.")
+    meeting = make_email("alice@example.com", "Thanks", "Thank you, I received the files. Can we meet Friday at 3pm?")
+
+    assert triage_email(thanks, gmail_service.classify_email(thanks["body"], thanks["subject"]))[0] == ROUTE_TEMPLATE
+    assert triage_email(meeting, gmail_service.classify_email(meeting["body"], meeting["subject"]))[0] == ROUTE_LLM
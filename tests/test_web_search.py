@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils import keyword_matcher
+from src.utils.keyword_matcher import KeywordMatcher
+from src.utils.web_search import extract_search_query
+
+
+def test_question_sentence_is_found_by_the_web_search_rule():
+    body = "Hi Sam,\n\nHope you are well. Could you explain the difference between SPF and DKIM. Thanks"
+
+    assert extract_search_query(body) == "difference between SPF DKIM"
+
+
+def test_question_cues_follow_the_keyword_rules(monkeypatch):
+    rules = {"web_search": {"threshold": 1, "keywords": {"pricing": 1}}}
+    monkeypatch.setattr(keyword_matcher, "_default_matcher", KeywordMatcher(rules))
+    body = "We are comparing vendors. Send the enterprise pricing for storage."
+
+    assert extract_search_query(body) == "Send enterprise pricing storage"